@@ -1,4 +1,4 @@
-from . import query, documents, config, health
+from . import query, documents, config, health, stats
 
-__all__ = ["query", "documents", "config", "health"]
+__all__ = ["query", "documents", "config", "health", "stats"]
 
@@ -1,17 +1,21 @@
+import copy
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from RAG_API.app.models.schemas import ConfigUpdate, PromptUpdate
-from RAG_API.app.core.prompt import load_prompt, save_prompt
+from RAG_API.app.core.prompt import load_prompt
+from RAG_API.app.core.executors import ExecutorSaturated
 from RAG_API.app.services.rag_service import rag_service
 
 router = APIRouter(prefix="/config", tags=["config"])
 
+CHUNKING_STRATEGIES = ("recursive", "markdown_tokens")
+
 
 @router.put("/prompt")
 async def update_prompt(request: PromptUpdate):
     """Обновление системного промпта"""
     try:
-        save_prompt(request.prompt)
+        rag_service.update_prompt(request.prompt)
         return JSONResponse({
             "status": "success",
             "message": "Промпт обновлен"
@@ -30,14 +34,25 @@ async def get_prompt():
 @router.put("/settings")
 async def update_settings(config: ConfigUpdate):
     """Обновление базовых настроек"""
+    if config.chunking_strategy is not None and config.chunking_strategy not in CHUNKING_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестная стратегия разбиения: {config.chunking_strategy}, допустимы {', '.join(CHUNKING_STRATEGIES)}"
+        )
+    
     try:
-        current_config = rag_service.config
+        # Изменяем копию: текущая конфигурация нужна для сравнения в update_config
+        current_config = copy.deepcopy(rag_service.config)
         
         # Обновляем конфигурацию
         if config.chunk_size is not None:
             current_config.chunking.chunk_size = config.chunk_size
         if config.chunk_overlap is not None:
             current_config.chunking.chunk_overlap = config.chunk_overlap
+        if config.chunking_strategy is not None:
+            current_config.chunking.strategy = config.chunking_strategy
+        if config.max_tokens is not None:
+            current_config.chunking.max_tokens = config.max_tokens
         if config.n_results is not None:
             current_config.retrieval.n_results = config.n_results
         if config.use_reranking is not None:
@@ -45,20 +60,25 @@ async def update_settings(config: ConfigUpdate):
         if config.min_similarity_threshold is not None:
             current_config.retrieval.min_similarity_threshold = config.min_similarity_threshold
         
-        # Обновляем сервис
-        rag_service.update_config(current_config)
+        # Обновляем сервис (при смене разбиения запускается переиндексация)
+        reindex_job = await rag_service.update_config(current_config)
         
         return JSONResponse({
             "status": "success",
-            "message": "Настройки обновлены",
+            "message": "Настройки обновлены" + (", запущена переиндексация" if reindex_job else ""),
+            "reindex_job_id": reindex_job["job_id"] if reindex_job else None,
             "config": {
                 "chunk_size": current_config.chunking.chunk_size,
                 "chunk_overlap": current_config.chunking.chunk_overlap,
+                "chunking_strategy": current_config.chunking.strategy,
+                "max_tokens": current_config.chunking.max_tokens,
                 "n_results": current_config.retrieval.n_results,
                 "use_reranking": current_config.retrieval.use_reranking,
                 "min_similarity_threshold": current_config.retrieval.min_similarity_threshold
             }
         })
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обновлении настроек: {str(e)}")
 
@@ -70,6 +90,8 @@ async def get_settings():
     return JSONResponse({
         "chunk_size": config.chunking.chunk_size,
         "chunk_overlap": config.chunking.chunk_overlap,
+        "chunking_strategy": config.chunking.strategy,
+        "max_tokens": config.chunking.max_tokens,
         "n_results": config.retrieval.n_results,
         "use_reranking": config.retrieval.use_reranking,
         "min_similarity_threshold": config.retrieval.min_similarity_threshold
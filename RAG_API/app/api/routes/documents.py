@@ -1,7 +1,13 @@
+import shutil
+import time
+from pathlib import Path
 from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from RAG_API.app.core.config import UPLOAD_DIR
+from RAG_API.app.core.config import UPLOAD_CHUNK_SIZE
+from RAG_API.app.core.executors import ExecutorSaturated
 from RAG_API.app.services.rag_service import rag_service
+from RAG_API.app.services.ingest_jobs import JobQueueFull
 from RAG_API.app.models.schemas import DocumentsListResponse
 
 router = APIRouter(prefix="/documents", tags=["documents"])
@@ -13,59 +19,141 @@ async def get_all_documents():
     try:
         result = await rag_service.get_all_documents()
         return DocumentsListResponse(**result)
+    except ExecutorSaturated:
+        raise
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при получении списка документов: {str(e)}")
 
 
-@router.post("")
-async def add_document(file: UploadFile = File(...)):
-    """Добавление документа в базу знаний"""
+def _upload_filename(file: UploadFile) -> str:
+    """Имя загружаемого файла без каталогов (оно же id документа); 400, если имени нет"""
+    name = Path(file.filename or "").name
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Не указано имя файла")
+    return name
+
+
+async def _save_upload(file: UploadFile, file_path) -> dict:
+    """Сохраняет загружаемый файл потоково блоками фиксированного размера
+    
+    Запись на диск выполняется в пуле потоков, чтобы не блокировать event loop.
+    """
+    started = time.monotonic()
+    bytes_written = 0
+    f = await run_in_threadpool(open, file_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(f.write, chunk)
+            bytes_written += len(chunk)
+    finally:
+        await run_in_threadpool(f.close)
+    return {"bytes": bytes_written, "seconds": round(time.monotonic() - started, 3)}
+
+
+async def _submit_upload(file: UploadFile, kind: str, message: str):
+    """Сохраняет файл задачи (он хранится до ее завершения) и ставит задачу в очередь"""
     import logging
     logger = logging.getLogger(__name__)
     
-    file_path = UPLOAD_DIR / file.filename
+    filename = _upload_filename(file)
+    job_id = rag_service.ingest_jobs.new_job_id()
+    file_path = rag_service.ingest_jobs.job_file_path(job_id, filename)
     
     try:
         logger.info(f"Получен файл: {file.filename}, размер: {file.size}")
+        upload = await _save_upload(file, file_path)
+        logger.info(f"Файл сохранен: {file_path}, {upload['bytes']} байт за {upload['seconds']:.2f} с")
         
-        # Убеждаемся, что директория существует
-        UPLOAD_DIR.mkdir(exist_ok=True)
-        logger.info(f"Директория для загрузки: {UPLOAD_DIR}, существует: {UPLOAD_DIR.exists()}")
+        job = rag_service.ingest_jobs.submit(job_id, file_path, kind=kind)
+        logger.info(f"Создана задача загрузки {job_id} ({kind})")
         
-        # Сохраняем файл
-        content = await file.read()
-        logger.info(f"Прочитано байт: {len(content)}")
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        logger.info(f"Файл сохранен: {file_path}")
-        
-        # Обрабатываем документ
-        count = await rag_service.ingest_document(str(file_path))
-        logger.info(f"Документ обработан, создано чанков: {count}")
-        
-        return JSONResponse({
-            "status": "success",
-            "message": f"Документ добавлен. Создано {count} чанков",
-            "chunks_count": count
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "message": message,
+            "job_id": job_id,
+            "job": job,
+            "upload": upload
         })
-    except RuntimeError as e:
-        logger.error(f"RuntimeError при обработке документа: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    except JobQueueFull as e:
+        shutil.rmtree(file_path.parent, ignore_errors=True)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
-        logger.error(f"Ошибка при обработке документа: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Ошибка при обработке документа: {str(e)}")
-    finally:
-        # Удаляем временный файл
-        if file_path.exists():
-            try:
-                file_path.unlink()
-                logger.info(f"Временный файл удален: {file_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить временный файл: {e}")
+        shutil.rmtree(file_path.parent, ignore_errors=True)
+        logger.error(f"Ошибка при сохранении документа: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Ошибка при сохранении документа: {str(e)}")
+
+
+@router.post("", status_code=202)
+async def add_document(file: UploadFile = File(...)):
+    """Добавление документа в базу знаний (фоновая задача)"""
+    return await _submit_upload(
+        file, "document", f"Документ {file.filename} поставлен в очередь на загрузку"
+    )
+
+
+@router.post("/bulk", status_code=202)
+async def add_documents_bulk(file: UploadFile = File(...)):
+    """Массовая загрузка документов из zip архива (фоновая задача)
+    
+    Отчет по файлам доступен в поле report задачи после ее завершения.
+    """
+    if not (file.filename or "").lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Для массовой загрузки нужен zip архив")
+    return await _submit_upload(
+        file, "bulk", f"Архив {file.filename} поставлен в очередь на массовую загрузку"
+    )
+
+
+@router.post("/reindex", status_code=202)
+async def reindex_documents():
+    """Переиндексация базы знаний с текущими настройками разбиения (фоновая задача)
+    
+    Новая коллекция собирается в фоне, запросы обслуживает текущая до
+    атомарного переключения.
+    """
+    try:
+        job = rag_service.start_reindex()
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content={
+        "status": "accepted",
+        "message": "Переиндексация поставлена в очередь",
+        "job_id": job["job_id"],
+        "job": job
+    })
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """Список задач загрузки документов"""
+    return JSONResponse({"jobs": rag_service.ingest_jobs.list()})
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Статус задачи загрузки: этап, количество эмбеддингов и скорость"""
+    job = rag_service.ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return JSONResponse(job)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Отмена задачи загрузки"""
+    job = rag_service.ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return JSONResponse({
+        "status": "success",
+        "message": f"Отмена задачи {job_id} запрошена",
+        "job": job
+    })
 
 
 @router.delete("/{doc_id}")
@@ -81,7 +169,7 @@ async def delete_document(doc_id: str):
             })
         else:
             raise HTTPException(status_code=404, detail=f"Документ {doc_id} не найден")
-    except HTTPException:
+    except (HTTPException, ExecutorSaturated):
         raise
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,13 +180,15 @@ async def delete_document(doc_id: str):
 @router.put("/{doc_id}")
 async def update_document(doc_id: str, file: UploadFile = File(...)):
     """Обновление документа в базе знаний"""
-    try:
-        # Сначала удаляем старый документ
-        await delete_document(doc_id)
-    except HTTPException as e:
-        # Если документ не найден, продолжаем (может быть новый документ)
-        if e.status_code != 404:
-            raise
+    # Документ с тем же именем обновляется инкрементально при загрузке,
+    # удалять заранее нужно только документ под другим именем
+    if doc_id != _upload_filename(file):
+        try:
+            await delete_document(doc_id)
+        except HTTPException as e:
+            # Если документ не найден, продолжаем (может быть новый документ)
+            if e.status_code != 404:
+                raise
     
     # Затем добавляем новый
     return await add_document(file)
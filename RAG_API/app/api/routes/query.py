@@ -1,13 +1,27 @@
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from RAG_API.app.core.deadline import (
+    DEADLINE_HEADER, ClientDisconnected, DeadlineExceeded, parse_deadline, run_until_disconnect
+)
+from RAG_API.app.core.executors import ExecutorSaturated
 from RAG_API.app.models.schemas import QueryRequest, QueryResponse
 from RAG_API.app.services.rag_service import rag_service
 
 router = APIRouter(prefix="/query", tags=["query"])
 
+# Нестандартный код nginx "client closed request": ответ никто не получит
+CLIENT_CLOSED_REQUEST = 499
+
 
 @router.post("", response_model=QueryResponse)
-async def query(request: QueryRequest):
-    """Запрос к RAG системе"""
+async def query(request: QueryRequest, http_request: Request):
+    """Запрос к RAG системе
+    
+    Заголовок X-Request-Timeout - сколько секунд клиент ждет ответ: этапы,
+    которые не успеют, пропускаются, по истечении срока - 504. Если клиент
+    отключился, обработка запроса отменяется.
+    """
     import logging
     logger = logging.getLogger(__name__)
     
@@ -17,11 +31,13 @@ async def query(request: QueryRequest):
         rag_service.initialize()
         logger.info(f"После инициализации: LLM provider = {rag_service.llm_provider is not None}")
     
+    deadline = parse_deadline(http_request.headers.get(DEADLINE_HEADER))
     try:
-        result = await rag_service.query(
+        result = await run_until_disconnect(http_request, rag_service.query(
             request.question,
-            request.n_results or 3
-        )
+            request.n_results or 3,
+            deadline=deadline
+        ))
         
         # Логируем, используется ли LLM
         if "llm_answer" in result:
@@ -34,11 +50,69 @@ async def query(request: QueryRequest):
             answer=result.get("llm_answer", result.get("answer", "")),
             similarity_scores=result.get("similarity_scores", []),
             avg_similarity=result.get("avg_similarity", 0.0),
-            num_results=result.get("num_results", 0)
+            num_results=result.get("num_results", 0),
+            cached=result.get("cached", False),
+            degraded=result.get("degraded", False)
         )
+    except ClientDisconnected:
+        logger.info("Клиент отключился, запрос отменен")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except (ExecutorSaturated, DeadlineExceeded):
+        raise
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при выполнении запроса: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ошибка при выполнении запроса: {str(e)}")
 
+
+
+@router.post("/stream")
+async def query_stream(request: QueryRequest, http_request: Request):
+    """Потоковый запрос к RAG системе (Server-Sent Events)
+    
+    События: context (оценки релевантности найденного контекста), delta
+    (очередной фрагмент ответа), done (полный ответ) или error.
+    При перегрузке отвечает 429 до начала потока. Срок ответа задается
+    заголовком X-Request-Timeout, как в /query.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    # Первое событие (context) получаем до ответа: места в очередях занимаются
+    # до него, поэтому перегрузка превращается в 429, а не в событие error
+    deadline = parse_deadline(http_request.headers.get(DEADLINE_HEADER))
+    events = rag_service.query_stream(request.question, request.n_results or 3, deadline=deadline)
+    try:
+        first_event = await run_until_disconnect(http_request, events.__anext__())
+    except StopAsyncIteration:
+        first_event = None
+    except ClientDisconnected:
+        logger.info("Клиент отключился, запрос отменен")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except (ExecutorSaturated, DeadlineExceeded):
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при потоковом выполнении запроса: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Ошибка при выполнении запроса: {str(e)}")
+    
+    def _format(event: dict) -> str:
+        name = event.pop("event")
+        return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    async def _events():
+        try:
+            if first_event is not None:
+                yield _format(first_event)
+            async for event in events:
+                yield _format(event)
+        except Exception as e:
+            logger.error(f"Ошибка при потоковом выполнении запроса: {e}", exc_info=True)
+            detail = json.dumps({"detail": f"Ошибка при выполнении запроса: {str(e)}"}, ensure_ascii=False)
+            yield f"event: error\ndata: {detail}\n\n"
+    
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from RAG_API.app.services.rag_service import rag_service
+
+router = APIRouter(tags=["stats"])
+
+
+@router.get("/stats")
+async def stats():
+    """Метрики кэшей и производительности RAG сервиса"""
+    return JSONResponse(rag_service.get_stats())
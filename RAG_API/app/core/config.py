@@ -8,19 +8,66 @@ load_dotenv()
 BASE_DIR = Path(__file__).parent.parent.parent
 PROMPT_FILE = BASE_DIR / ".prompt.txt"
 UPLOAD_DIR = BASE_DIR / "uploads"
+JOBS_DIR = UPLOAD_DIR / "jobs"  # Файлы и состояние фоновых задач загрузки
 CHROMA_DB_PATH = BASE_DIR / os.getenv("CHROMA_DB_PATH", "chroma_db")
+NUMPY_INDEX_PATH = BASE_DIR / os.getenv("NUMPY_INDEX_PATH", "numpy_index")
+ONNX_MODEL_DIR = BASE_DIR / os.getenv("ONNX_MODEL_DIR", "onnx_model")
 
 # Создаем директории если их нет
 UPLOAD_DIR.mkdir(exist_ok=True)
+JOBS_DIR.mkdir(exist_ok=True)
 CHROMA_DB_PATH.mkdir(exist_ok=True)
 
 # Настройки сервера
 PORT = int(os.getenv("PORT", 8000))
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+# Бэкенды RAG (передаются в RAGConfig, см. rag_config)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")  # "chroma" или "numpy"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" или "onnx" (int8, onnxruntime)
+EMBEDDING_MEMORY_LIMIT_MB = int(os.getenv("EMBEDDING_MEMORY_LIMIT_MB", 1536))  # RSS, выше которого бюджет батча загрузки уменьшается
+
+# Фоновая загрузка документов
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))  # Размер блока записи загружаемого файла
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+INGEST_MAX_QUEUED = int(os.getenv("INGEST_MAX_QUEUED", 20))
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", 1000))  # Предел числа файлов в zip архиве массовой загрузки
+BULK_MAX_UNCOMPRESSED_MB = int(os.getenv("BULK_MAX_UNCOMPRESSED_MB", 500))  # Предел суммарного размера архива после распаковки
+JOBS_SAVE_INTERVAL = float(os.getenv("JOBS_SAVE_INTERVAL", 2))  # Прогресс задачи пишется в jobs.json не чаще раза за столько секунд
+JOBS_KEEP_FINISHED = int(os.getenv("JOBS_KEEP_FINISHED", 100))  # Сколько последних завершенных задач хранить
+
 # GigaChat
 GIGACHAT_CREDENTIALS = os.getenv("GIGACHAT_CREDENTIALS", "")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # Одновременных генераций, остальные ждут в очереди
+LLM_MAX_QUEUED = int(os.getenv("LLM_MAX_QUEUED", 16))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))  # Предел ожидания ответа (для потока - очередного фрагмента), затем ответ без LLM
+LLM_SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", 10))  # Ответ дольше считается неудачным для автомата
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))  # Неудач подряд до отключения GigaChat
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))  # Через сколько секунд пробовать снова
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))  # Повторный запрос, если нет ответа за столько секунд (0 - выключен)
+
+# Пулы обработки запросов: сверх workers + max_queued задач запрос получает 429
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 4))  # Прямые проходы модели по запросам объединяет EmbeddingDispatcher
+INFERENCE_MAX_QUEUED = int(os.getenv("INFERENCE_MAX_QUEUED", 16))
+VECTOR_STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", 4))
+VECTOR_STORE_MAX_QUEUED = int(os.getenv("VECTOR_STORE_MAX_QUEUED", 32))
+OVERLOAD_RETRY_AFTER = int(os.getenv("OVERLOAD_RETRY_AFTER", 2))  # Значение заголовка Retry-After, с
+LIMIT_CONCURRENCY = int(os.getenv("LIMIT_CONCURRENCY", 64))  # Предел соединений uvicorn (503 сверх него)
+
+# Срок ответа клиента (заголовок X-Request-Timeout): этапы, которые не успеют, пропускаются
+DEADLINE_MIN_RERANK_SECONDS = float(os.getenv("DEADLINE_MIN_RERANK_SECONDS", 2))  # Меньше - поиск без re-ranking
+DEADLINE_MIN_LLM_SECONDS = float(os.getenv("DEADLINE_MIN_LLM_SECONDS", 5))  # Меньше - ответ найденным контекстом без GigaChat
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.5))  # Как часто проверять, не отключился ли клиент
 
 # ChromaDB
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "k1_about")
 
+
+
+def rag_config():
+    """Конфигурация RAG по умолчанию с бэкендами из окружения"""
+    from RAG_API.rag.config import RAGConfig, EmbeddingConfig, RetrievalConfig
+    return RAGConfig(
+        embedding=EmbeddingConfig(backend=EMBEDDING_BACKEND, memory_limit_mb=EMBEDDING_MEMORY_LIMIT_MB),
+        retrieval=RetrievalConfig(vector_store_backend=VECTOR_STORE_BACKEND),
+    )
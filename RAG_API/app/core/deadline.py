@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Optional
+from fastapi import HTTPException, Request
+from RAG_API.app.core.config import DISCONNECT_POLL_INTERVAL
+
+# Заголовок запроса: сколько секунд клиент еще готов ждать ответ
+DEADLINE_HEADER = "X-Request-Timeout"
+# Запас на отправку ответа после прерванного по сроку этапа, с
+RESPONSE_MARGIN = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """Ответ не успевает к сроку клиента - запрос завершается с 504"""
+
+
+def parse_deadline(header_value: Optional[str]) -> Optional[float]:
+    """Срок ответа по времени event loop или None, если клиент его не передал"""
+    if header_value is None:
+        return None
+    try:
+        timeout = float(header_value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} должен быть числом секунд")
+    if timeout <= 0:
+        raise DeadlineExceeded("Срок ответа истек до начала обработки")
+    return asyncio.get_running_loop().time() + timeout
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """Сколько секунд осталось до срока (None - срока нет)"""
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def check_deadline(deadline: Optional[float], stage: str):
+    """Прерывает запрос, если срок уже истек"""
+    left = time_left(deadline)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Срок ответа истек до этапа {stage}")
+
+
+class ClientDisconnected(Exception):
+    """Клиент закрыл соединение, не дождавшись ответа"""
+
+
+async def run_until_disconnect(request: Request, awaitable: Awaitable):
+    """Выполняет awaitable, отменяя его, если HTTP клиент отключился
+
+    Отмена освобождает места в очередях и прерывает генерацию GigaChat;
+    уже запущенный в пуле этап дорабатывает, но его результат не ждут.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict
+from RAG_API.app.core.config import (
+    INFERENCE_WORKERS, INFERENCE_MAX_QUEUED,
+    VECTOR_STORE_WORKERS, VECTOR_STORE_MAX_QUEUED,
+    LLM_MAX_CONCURRENCY, LLM_MAX_QUEUED,
+    OVERLOAD_RETRY_AFTER,
+)
+
+
+class ExecutorSaturated(Exception):
+    """Очередь пула переполнена - запрос отклоняется с 429"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"Сервис перегружен ({name}), повторите через {retry_after} с")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class AdmissionLimit:
+    """Ограничение числа одновременных задач: max_active выполняются, max_queued ждут
+
+    Сверх этого новые задачи сразу отклоняются, а не копятся в очереди,
+    увеличивая задержку всех остальных запросов.
+    """
+
+    def __init__(self, name: str, max_active: int, max_queued: int, retry_after: int = OVERLOAD_RETRY_AFTER):
+        self.name = name
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_active + self.max_queued:
+                self.rejected += 1
+                raise ExecutorSaturated(self.name, self.retry_after)
+            self._pending += 1
+
+    def _release(self, *_):
+        with self._lock:
+            self._pending -= 1
+
+    @contextmanager
+    def admit(self):
+        """Занимает место в очереди на время блока или отклоняет запрос"""
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> Dict:
+        return {
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+class BoundedExecutor(AdmissionLimit):
+    """Отдельный пул потоков с ограниченной очередью"""
+
+    def __init__(self, name: str, max_workers: int, max_queued: int, retry_after: int = OVERLOAD_RETRY_AFTER):
+        super().__init__(name, max_workers, max_queued, retry_after)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    async def run(self, fn: Callable, *args):
+        """Выполняет fn(*args) в пуле; место освобождается, когда поток закончит работу,
+        даже если ожидающий запрос был отменен"""
+        self._acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Эмбеддинги, поиск и re-ranking (CPU)
+inference = BoundedExecutor("inference", INFERENCE_WORKERS, INFERENCE_MAX_QUEUED)
+# Блокирующие операции с векторной БД
+vector_store = BoundedExecutor("vector_store", VECTOR_STORE_WORKERS, VECTOR_STORE_MAX_QUEUED)
+# Генерации GigaChat выполняются корутинами, поэтому пул не нужен - только лимит очереди
+llm = AdmissionLimit("llm", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUED)
+
+
+def stats() -> Dict:
+    return {limit.name: limit.stats() for limit in (inference, vector_store, llm)}
+
+
+def shutdown():
+    inference.shutdown()
+    vector_store.shutdown()
@@ -2,11 +2,14 @@ import uvicorn
 import logging
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from RAG_API.app.core import executors
+from RAG_API.app.core.deadline import DeadlineExceeded
 from RAG_API.app.core.config import PORT, DEBUG
 from RAG_API.app.services.rag_service import rag_service
 from RAG_API.app.api.routes import documents, config
-from RAG_API.app.api.routes import query, health
+from RAG_API.app.api.routes import query, health, stats
 
 # Оптимизация памяти для Python перед импортом других модулей
 os.environ.setdefault('PYTHONHASHSEED', '0')
@@ -40,7 +43,10 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # Очистка (если нужна)
+    # Очистка: незавершенные задачи загрузки продолжатся после перезапуска
+    rag_service.ingest_jobs.shutdown()
+    await rag_service.aclose()
+    executors.shutdown()
     print("🛑 Завершение работы приложения", flush=True)
     logger.info("🛑 Завершение работы приложения")
 
@@ -52,11 +58,28 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(executors.ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: executors.ExecutorSaturated):
+    """Перегрузка пула: клиент повторяет запрос позже, а не ждет в очереди"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """Ответ не успел к сроку из заголовка X-Request-Timeout"""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
 # Подключаем роутеры
 app.include_router(query.router)
 app.include_router(documents.router)
 app.include_router(config.router)
 app.include_router(health.router)
+app.include_router(stats.router)
 
 
 if __name__ == "__main__":
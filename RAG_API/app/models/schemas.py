@@ -15,12 +15,16 @@ class QueryResponse(BaseModel):
     similarity_scores: List[float]
     avg_similarity: float
     num_results: int
+    cached: bool = False
+    degraded: bool = Field(False, description="GigaChat недоступен или не успел: ответ - выжимка из найденного чанка")
 
 
 class ConfigUpdate(BaseModel):
     """Обновление конфигурации"""
     chunk_size: Optional[int] = None
     chunk_overlap: Optional[int] = None
+    chunking_strategy: Optional[str] = Field(None, description='"recursive" или "markdown_tokens"')
+    max_tokens: Optional[int] = Field(None, description="Предел длины чанка в токенах для markdown_tokens")
     n_results: Optional[int] = None
     use_reranking: Optional[bool] = None
     min_similarity_threshold: Optional[float] = None
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class IngestCancelled(Exception):
+    """Загрузка отменена пользователем"""
+
+
+class JobQueueFull(Exception):
+    """Очередь загрузки переполнена"""
+
+
+class IngestJobManager:
+    """Очередь фоновой загрузки документов
+
+    Задачи выполняются на отдельном ограниченном пуле потоков, а их состояние
+    сохраняется в JSON файл, чтобы незавершенные задачи продолжились после
+    перезапуска API. Смена статуса или этапа записывается сразу, прогресс
+    внутри этапа - не чаще раза в save_interval секунд. Хранятся только
+    keep_finished последних завершенных задач.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: Path,
+        runner: Callable[[Dict, Callable], Dict],
+        max_workers: int = 1,
+        max_queued: int = 20,
+        save_interval: float = 2.0,
+        keep_finished: int = 100
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.files_dir = self.jobs_dir / "files"
+        self.state_file = self.jobs_dir / "jobs.json"
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+
+        self._runner = runner
+        self._max_queued = max_queued
+        self._save_interval = save_interval
+        self._keep_finished = keep_finished
+        self._last_save = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._lock = threading.RLock()
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._jobs: Dict[str, Dict] = {}
+        if self.state_file.exists():
+            self._jobs = json.loads(self.state_file.read_text(encoding="utf-8"))
+        self._prune()
+        # Каталоги файлов без активной задачи (например, загрузка прервана перезапуском)
+        for job_dir in self.files_dir.iterdir():
+            job = self._jobs.get(job_dir.name)
+            if job is None or job["status"] not in ACTIVE_STATUSES:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def _save(self):
+        with self._lock:
+            tmp_file = self.state_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(self._jobs, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_file, self.state_file)
+            self._last_save = time.monotonic()
+
+    def _update(self, job_id: str, **fields):
+        """Обновляет задачу; прогресс без смены статуса и этапа пишется на диск с троттлингом"""
+        with self._lock:
+            job = self._jobs[job_id]
+            changed = any(
+                key in fields and fields[key] != job[key]
+                for key in ("status", "stage")
+            )
+            job.update(fields)
+            if changed or time.monotonic() - self._last_save >= self._save_interval:
+                if fields.get("status") in FINISHED_STATUSES:
+                    self._prune()
+                self._save()
+
+    def _prune(self):
+        """Удаляет самые старые завершенные задачи сверх keep_finished вместе с их файлами"""
+        with self._lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job["status"] in FINISHED_STATUSES),
+                key=lambda j: j["created_at"]
+            )
+            for job in finished[:max(0, len(finished) - self._keep_finished)]:
+                del self._jobs[job["job_id"]]
+                shutil.rmtree(self.files_dir / job["job_id"], ignore_errors=True)
+
+    def job_file_path(self, job_id: str, filename: str) -> Path:
+        """Путь для файла задачи (имя файла сохраняется - оно же id документа)"""
+        job_dir = self.files_dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        return job_dir / Path(filename).name
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex[:12]
+
+    def submit(self, job_id: str, file_path: Optional[Path], kind: str = "document") -> Dict:
+        """Ставит задачу в очередь и сразу возвращает ее (file_path - None для задач без файла)"""
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES)
+            if queued >= self._max_queued:
+                raise JobQueueFull(f"В очереди уже {queued} задач, повторите позже")
+
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "filename": Path(file_path).name if file_path else None,
+                "file_path": str(file_path) if file_path else None,
+                "status": "queued",
+                "stage": "queued",
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "chunks_count": None,
+                "throughput_chunks_per_s": None,
+                "error": None,
+                "created_at": self._now(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._save()
+            self._enqueue(job_id)
+            return dict(self._jobs[job_id])
+
+    def _enqueue(self, job_id: str):
+        self._cancel_events[job_id] = threading.Event()
+        self._executor.submit(self._run, job_id)
+
+    def resume(self):
+        """Возобновляет задачи, не завершенные до перезапуска"""
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job["status"] not in ACTIVE_STATUSES or job_id in self._cancel_events:
+                    continue
+                if job["file_path"] is None or Path(job["file_path"]).exists():
+                    logger.info(f"Возобновление задачи загрузки {job_id} ({job['filename']})")
+                    job.update(status="queued", stage="queued", chunks_embedded=0)
+                    self._enqueue(job_id)
+                else:
+                    job.update(status="failed", error="Файл задачи потерян при перезапуске", finished_at=self._now())
+            self._save()
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Запрашивает отмену задачи; None, если задачи нет"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] in ACTIVE_STATUSES:
+                self._cancel_events[job_id].set()
+                if job["status"] == "queued":
+                    self._update(job_id, status="cancelled", stage="cancelled", finished_at=self._now())
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda j: j["created_at"], reverse=True)
+
+    def _run(self, job_id: str):
+        cancel_event = self._cancel_events[job_id]
+        if cancel_event.is_set():
+            self._cleanup(job_id)
+            return
+
+        job = self.get(job_id)
+        started = time.monotonic()
+        embedding_started = None
+        self._update(job_id, status="running", stage="starting", started_at=self._now())
+
+        def progress(stage: str, **info):
+            nonlocal embedding_started
+            if cancel_event.is_set():
+                raise IngestCancelled()
+            fields = {"stage": stage, **info}
+            if stage == "embedding":
+                if embedding_started is None:
+                    embedding_started = time.monotonic()
+                elapsed = time.monotonic() - embedding_started
+                if info.get("chunks_embedded") and elapsed > 0:
+                    fields["throughput_chunks_per_s"] = round(info["chunks_embedded"] / elapsed, 2)
+            self._update(job_id, **fields)
+
+        try:
+            result = self._runner(job, progress)
+            self._update(
+                job_id,
+                status="completed",
+                stage="done",
+                duration_s=round(time.monotonic() - started, 2),
+                finished_at=self._now(),
+                **result,
+            )
+            logger.info(f"Задача загрузки {job_id} завершена, чанков: {result.get('chunks_count')}")
+        except IngestCancelled:
+            self._update(job_id, status="cancelled", stage="cancelled", finished_at=self._now())
+            logger.info(f"Задача загрузки {job_id} отменена")
+        except Exception as e:
+            logger.error(f"Ошибка в задаче загрузки {job_id}: {e}", exc_info=True)
+            self._update(job_id, status="failed", error=str(e), finished_at=self._now())
+        finally:
+            self._cleanup(job_id)
+
+    def _cleanup(self, job_id: str):
+        self._cancel_events.pop(job_id, None)
+        job_dir = self.files_dir / job_id
+        if job_dir.exists():
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
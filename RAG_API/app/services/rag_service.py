@@ -1,27 +1,81 @@
 import asyncio
 import os
 import logging
-from typing import Optional, Dict
+import shutil
+import threading
+from dataclasses import asdict
+from contextlib import nullcontext
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Dict
 from RAG_API.rag.rag_pipeline import RAGPipeline
-from RAG_API.rag.config import RAGConfig, DEFAULT_CONFIG
-from RAG_API.rag.giga_chat import LLMProvider
-from RAG_API.app.core.prompt import load_prompt
+from RAG_API.rag.config import RAGConfig
+from RAG_API.rag.giga_chat import LLMProvider, LLMUnavailable
+from RAG_API.rag.extractive_answer import extractive_answer
+from RAG_API.rag.semantic_cache import SemanticCache
+from RAG_API.rag.bulk_ingest import collect_documents
+from RAG_API.rag.vector_store import RETIRED_COLLECTION_GRACE
+from RAG_API.app.core.prompt import load_prompt, save_prompt
+from RAG_API.app.core import executors
+from RAG_API.app.core.config import (
+    JOBS_DIR, INGEST_WORKERS, INGEST_MAX_QUEUED, JOBS_SAVE_INTERVAL, JOBS_KEEP_FINISHED, LLM_MAX_CONCURRENCY,
+    BULK_MAX_FILES, BULK_MAX_UNCOMPRESSED_MB,
+    DEADLINE_MIN_RERANK_SECONDS, DEADLINE_MIN_LLM_SECONDS,
+    LLM_TIMEOUT, LLM_SLOW_CALL_SECONDS, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN, LLM_HEDGE_AFTER,
+    rag_config,
+)
+from RAG_API.app.core.deadline import DeadlineExceeded, RESPONSE_MARGIN, check_deadline, time_left
+from RAG_API.app.services.ingest_jobs import IngestJobManager, JobQueueFull
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_question(question: str) -> str:
+    """Ключ для объединения одинаковых вопросов: регистр, ё/е, пробелы и завершающая пунктуация"""
+    return " ".join(question.lower().replace("ё", "е").split()).rstrip("?!. ")
+
+
+class _Flight:
+    """Выполняющийся запрос, результат которого ждут все клиенты с тем же вопросом"""
+    
+    def __init__(self, key: tuple):
+        self.key = key
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Самый поздний срок ответа среди клиентов (None - хотя бы один готов ждать сколько угодно)
+        self.deadline: Optional[float] = None
+        # Для потокового запроса - уже полученные события, их получает и подключившийся позже
+        self.events: List[Dict] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.updated = asyncio.Condition()
+
+
 class RAGService:
     """Сервис для работы с RAG системой"""
     
     def __init__(self):
         self.rag_pipeline: Optional[RAGPipeline] = None
         self.llm_provider: Optional[LLMProvider] = None
-        self.config: RAGConfig = DEFAULT_CONFIG
+        self.config: RAGConfig = rag_config()
+        self.answer_cache = SemanticCache(self.config.answer_cache)
+        self._flights: Dict[tuple, _Flight] = {}
+        self.coalesced_requests = 0
+        self.ingest_jobs = IngestJobManager(
+            JOBS_DIR,
+            self._run_ingest_job,
+            max_workers=INGEST_WORKERS,
+            max_queued=INGEST_MAX_QUEUED,
+            save_interval=JOBS_SAVE_INTERVAL,
+            keep_finished=JOBS_KEEP_FINISHED
+        )
     
     def initialize(self):
         """Инициализация RAG pipeline и LLM provider"""
         logger.info("🔄 Инициализация RAG pipeline...")
         self.rag_pipeline = RAGPipeline(self.config)
+        # Коллекции пересборок, прерванных перезапуском, и выведенные коллекции
+        dropped = self.rag_pipeline.vector_store.drop_stale_shadows()
+        if dropped:
+            logger.info(f"Удалены неиспользуемые коллекции: {', '.join(dropped)}")
         
         # Ленивая загрузка модели - не загружаем при старте для экономии памяти
         # Модель загрузится автоматически при первом запросе
@@ -35,7 +89,13 @@ class RAGService:
         if gigachat_creds:
             try:
                 logger.info("🤖 Инициализация LLM provider...")
-                self.llm_provider = LLMProvider()
+                self.llm_provider = LLMProvider(
+                    max_concurrency=LLM_MAX_CONCURRENCY,
+                    slow_call_seconds=LLM_SLOW_CALL_SECONDS,
+                    breaker_failures=LLM_BREAKER_FAILURES,
+                    breaker_cooldown=LLM_BREAKER_COOLDOWN,
+                    hedge_after=LLM_HEDGE_AFTER
+                )
                 logger.info("✅ LLM provider инициализирован")
             except Exception as e:
                 logger.error(f"❌ Ошибка при инициализации LLM provider: {e}", exc_info=True)
@@ -44,15 +104,137 @@ class RAGService:
             self.llm_provider = None
             logger.info("ℹ️  LLM provider пропущен (GIGACHAT_CREDENTIALS не задан)")
         
+        # Продолжаем задачи загрузки, прерванные перезапуском
+        self.ingest_jobs.resume()
+        
         logger.info("✅ RAG pipeline инициализирован")
     
-    def update_config(self, new_config: RAGConfig):
-        """Обновление конфигурации"""
+    async def update_config(self, new_config: RAGConfig) -> Optional[Dict]:
+        """Обновление конфигурации без холодного старта
+        
+        Новый пайплайн собирается в пуле inference из уже загруженных
+        компонентов, не меняя текущие (см. RAGPipeline.reconfigure), и
+        подменяет текущий одной операцией; запросы в процессе выполнения
+        дорабатывают со старым. Если изменились настройки
+        разбиения, запускает фоновую переиндексацию и возвращает ее задачу.
+        """
+        chunking_changed = asdict(new_config.chunking) != asdict(self.config.chunking)
+        if self.rag_pipeline:
+            self.rag_pipeline = await executors.inference.run(self.rag_pipeline.reconfigure, new_config)
         self.config = new_config
-        self.rag_pipeline = RAGPipeline(self.config)
+        self.invalidate_answer_cache("settings")
+        if chunking_changed:
+            logger.info("Настройки разбиения изменены, запускается переиндексация")
+            try:
+                return self.start_reindex()
+            except JobQueueFull as e:
+                logger.warning(f"Переиндексация не запущена: {e}")
+        return None
+    
+    def start_reindex(self) -> Dict:
+        """Ставит переиндексацию базы знаний в очередь загрузки"""
+        job_id = self.ingest_jobs.new_job_id()
+        return self.ingest_jobs.submit(job_id, None, kind="reindex")
+    
+    def update_prompt(self, prompt: str):
+        """Сохраняет системный промпт и сбрасывает кэш ответов"""
+        save_prompt(prompt)
+        self.invalidate_answer_cache("prompt")
+    
+    def invalidate_answer_cache(self, reason: str):
+        """Сбрасывает семантический кэш ответов после изменения базы знаний"""
+        self.answer_cache.invalidate()
+        logger.info(f"Кэш ответов сброшен ({reason}), версия базы знаний: {self.answer_cache.version}")
     
-    async def query(self, question: str, n_results: int = 3) -> Dict:
-        """Выполняет запрос к RAG системе"""
+    def _join_flight(
+        self,
+        kind: str,
+        question: str,
+        n_results: int,
+        deadline: Optional[float],
+        start: Callable[[_Flight], Awaitable]
+    ) -> _Flight:
+        """Присоединяет клиента к выполняющемуся запросу с тем же вопросом или запускает новый"""
+        key = (kind, normalize_question(question), n_results)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key)
+            flight.deadline = deadline
+            flight.task = asyncio.ensure_future(start(flight))
+            flight.task.add_done_callback(lambda _: self._forget_flight(flight))
+            self._flights[key] = flight
+        else:
+            self.coalesced_requests += 1
+            logger.info(f"Запрос объединен с выполняющимся (ожидают {flight.waiters + 1})")
+            if deadline is None or flight.deadline is None:
+                flight.deadline = None
+            else:
+                flight.deadline = max(flight.deadline, deadline)
+        flight.waiters += 1
+        return flight
+    
+    def _forget_flight(self, flight: _Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+    
+    def _leave_flight(self, flight: _Flight):
+        """Отключает клиента; запрос без клиентов отменяется"""
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            self._forget_flight(flight)
+            flight.task.cancel()
+    
+    async def query(self, question: str, n_results: int = 3, deadline: Optional[float] = None) -> Dict:
+        """Выполняет запрос к RAG системе
+        
+        Одновременные запросы с одинаковым (после нормализации) вопросом
+        ждут один общий поиск и одну генерацию ответа.
+        deadline - срок ответа по времени event loop: этапы, которые не успеют,
+        пропускаются, а если ответ не готов к сроку - DeadlineExceeded.
+        """
+        flight = self._join_flight(
+            "query", question, n_results, deadline,
+            lambda f: self._query(question, n_results, f)
+        )
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight.task), time_left(deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Ответ не готов к сроку клиента")
+        finally:
+            self._leave_flight(flight)
+        return {**result, "question": question}
+    
+    @staticmethod
+    def _use_reranking(deadline: Optional[float]) -> Optional[bool]:
+        """False, если re-ranking не успеет до срока ответа; None - по настройкам поиска"""
+        left = time_left(deadline)
+        if left is not None and left < DEADLINE_MIN_RERANK_SECONDS:
+            logger.info(f"До срока ответа {left:.1f} с, поиск без re-ranking")
+            return False
+        return None
+    
+    @staticmethod
+    def _llm_fits(deadline: Optional[float]) -> bool:
+        """Успеет ли генерация GigaChat до срока ответа"""
+        left = time_left(deadline)
+        return left is None or left >= DEADLINE_MIN_LLM_SECONDS
+    
+    @staticmethod
+    def _llm_timeout(deadline: Optional[float]) -> float:
+        """Сколько ждать GigaChat: не дольше LLM_TIMEOUT и с запасом на ответ без LLM до срока"""
+        left = time_left(deadline)
+        return LLM_TIMEOUT if left is None else max(min(LLM_TIMEOUT, left - RESPONSE_MARGIN), 0.0)
+    
+    @staticmethod
+    def _degrade(result: Dict, question: str, reason: str):
+        """Ответ без LLM: краткая выжимка из лучшего найденного чанка, помеченная degraded"""
+        sources = result.get("sources")
+        if sources:
+            result["answer"] = extractive_answer(question, sources[0]["content"])
+        result["degraded"] = True
+        logger.warning(f"Ответ без GigaChat ({reason})")
+    
+    async def _query(self, question: str, n_results: int, flight: _Flight) -> Dict:
         # Инициализируем, если еще не инициализировано
         if not self.rag_pipeline:
             print("⚠️  RAG pipeline не инициализирован, выполняю инициализацию...", flush=True)
@@ -60,84 +242,262 @@ class RAGService:
             self.initialize()
             print(f"✅ После инициализации: LLM provider = {self.llm_provider is not None}", flush=True)
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            self.rag_pipeline.query,
-            question,
-            n_results,
-            True
-        )
+        # Семантический кэш: перефразированный вопрос получает сохраненный ответ
+        cache_version = self.answer_cache.version
+        question_embedding = None
+        if self.answer_cache.config.enabled:
+            question_embedding = await executors.inference.run(
+                self.rag_pipeline.embedding_service.encode_query,
+                question
+            )
+            cached = self.answer_cache.lookup(question, question_embedding, n_results)
+            if cached is not None:
+                logger.info(f"Ответ взят из семантического кэша (расстояние {cached['cache_distance']:.4f})")
+                return {**cached, "question": question, "cached": True}
         
-        # Генерируем ответ через LLM
-        print(f"🔍 Проверка LLM: provider={self.llm_provider is not None}, has_answer={bool(result.get('answer'))}", flush=True)
-        if self.llm_provider and result.get("answer"):
-            print("🤖 Использование LLM для генерации ответа...", flush=True)
-            logger.info("Использование LLM для генерации ответа")
-            prompt = load_prompt()
+        # Место в очереди LLM занимается до поиска: при перегрузке запрос
+        # отклоняется сразу, не расходуя CPU на поиск
+        with self._llm_admission():
+            check_deadline(flight.deadline, "поиска")
+            result = await executors.inference.run(
+                self.rag_pipeline.query,
+                question,
+                n_results,
+                True,
+                self._use_reranking(flight.deadline)
+            )
             
-            def _call_llm():
-                return self.llm_provider.answer(
-                    question,
-                    result["answer"],
-                    system_prompt=prompt
-                )
+            # Генерируем ответ через LLM
+            print(f"🔍 Проверка LLM: provider={self.llm_provider is not None}, has_answer={bool(result.get('answer'))}", flush=True)
+            if self.llm_provider and result.get("answer") and not self._llm_fits(flight.deadline):
+                self._degrade(result, question, "не хватает времени до срока ответа")
+            elif self.llm_provider and result.get("answer"):
+                print("🤖 Использование LLM для генерации ответа...", flush=True)
+                logger.info("Использование LLM для генерации ответа")
+                prompt = load_prompt()
             
-            try:
-                llm_answer = await loop.run_in_executor(None, _call_llm)
-                result["llm_answer"] = llm_answer
-                result["answer"] = llm_answer
-                print("✅ LLM ответ успешно сгенерирован", flush=True)
-                logger.info("LLM ответ успешно сгенерирован")
-            except Exception as e:
-                print(f"❌ Ошибка при генерации LLM ответа: {e}", flush=True)
-                logger.error(f"Ошибка при генерации LLM ответа: {e}", exc_info=True)
-                # Оставляем оригинальный ответ, если LLM не сработал
-        else:
-            if not self.llm_provider:
-                print(f"⚠️  LLM provider не инициализирован (is None: {self.llm_provider is None})", flush=True)
-                logger.warning("LLM provider не инициализирован, используется оригинальный ответ")
-            elif not result.get("answer"):
-                print("⚠️  Нет контекста для генерации ответа", flush=True)
-                logger.warning("Нет контекста для генерации ответа")
+                timeout = self._llm_timeout(flight.deadline)
+                try:
+                    llm_answer = await asyncio.wait_for(
+                        self.llm_provider.aanswer(
+                            question,
+                            result["answer"],
+                            system_prompt=prompt
+                        ),
+                        timeout
+                    )
+                    result["llm_answer"] = llm_answer
+                    result["answer"] = llm_answer
+                    if question_embedding is not None:
+                        self.answer_cache.store(question, question_embedding, n_results, result, cache_version)
+                    print("✅ LLM ответ успешно сгенерирован", flush=True)
+                    logger.info("LLM ответ успешно сгенерирован")
+                except asyncio.TimeoutError:
+                    self.llm_provider.record_timeout(timeout)
+                    self._degrade(result, question, "GigaChat не ответил вовремя")
+                except LLMUnavailable as e:
+                    self._degrade(result, question, str(e))
+                except Exception as e:
+                    print(f"❌ Ошибка при генерации LLM ответа: {e}", flush=True)
+                    logger.error(f"Ошибка при генерации LLM ответа: {e}", exc_info=True)
+                    self._degrade(result, question, "ошибка GigaChat")
+            else:
+                if not self.llm_provider:
+                    print(f"⚠️  LLM provider не инициализирован (is None: {self.llm_provider is None})", flush=True)
+                    logger.warning("LLM provider не инициализирован, используется оригинальный ответ")
+                elif not result.get("answer"):
+                    print("⚠️  Нет контекста для генерации ответа", flush=True)
+                    logger.warning("Нет контекста для генерации ответа")
         
         return result
     
-    async def ingest_document(self, document_path: str) -> int:
-        """Загружает документ в базу знаний"""
+    async def query_stream(self, question: str, n_results: int = 3, deadline: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Потоковый вариант query: события context, delta (фрагмент ответа) и done
+        
+        Поиск выполняется как в query, затем фрагменты ответа GigaChat отдаются
+        по мере генерации. Если LLM не подключен, недоступен или упал до первого
+        фрагмента, ответ строится как в query (контекст или выжимка с degraded).
+        Одинаковые вопросы объединяются так же, как в query: все клиенты
+        получают события одной генерации.
+        Срок ответа (deadline) учитывается так же, как в query; генерация,
+        не уложившаяся в срок, прерывается событием error.
+        """
+        flight = self._join_flight(
+            "stream", question, n_results, deadline,
+            lambda f: self._broadcast(f, self._query_stream(question, n_results, f))
+        )
+        try:
+            position = 0
+            while True:
+                async with flight.updated:
+                    try:
+                        await asyncio.wait_for(
+                            flight.updated.wait_for(lambda: len(flight.events) > position or flight.finished),
+                            time_left(deadline)
+                        )
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("Ответ не готов к сроку клиента")
+                while position < len(flight.events):
+                    yield dict(flight.events[position])
+                    position += 1
+                if flight.finished:
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            self._leave_flight(flight)
+    
+    @staticmethod
+    async def _broadcast(flight: _Flight, events: AsyncIterator[Dict]):
+        """Собирает события потокового запроса для всех его клиентов"""
+        try:
+            async for event in events:
+                flight.events.append(event)
+                async with flight.updated:
+                    flight.updated.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Закрываем генератор явно, чтобы при отмене освободилось место в очереди LLM
+            await events.aclose()
+            flight.finished = True
+            async with flight.updated:
+                flight.updated.notify_all()
+    
+    async def _query_stream(self, question: str, n_results: int, flight: _Flight) -> AsyncIterator[Dict]:
+        if not self.rag_pipeline:
+            self.initialize()
+        
+        cache_version = self.answer_cache.version
+        question_embedding = None
+        if self.answer_cache.config.enabled:
+            question_embedding = await executors.inference.run(
+                self.rag_pipeline.embedding_service.encode_query,
+                question
+            )
+            cached = self.answer_cache.lookup(question, question_embedding, n_results)
+            if cached is not None:
+                logger.info(f"Ответ взят из семантического кэша (расстояние {cached['cache_distance']:.4f})")
+                yield {"event": "context", **self._stream_meta(cached)}
+                yield {"event": "delta", "text": cached["answer"]}
+                yield {"event": "done", "answer": cached["answer"], "cached": True, **self._stream_meta(cached)}
+                return
+        
+        # Место в очереди LLM занимается до поиска: при перегрузке запрос
+        # отклоняется сразу, не расходуя CPU на поиск
+        with self._llm_admission():
+            check_deadline(flight.deadline, "поиска")
+            result = await executors.inference.run(
+                self.rag_pipeline.query, question, n_results, True, self._use_reranking(flight.deadline)
+            )
+            yield {"event": "context", **self._stream_meta(result)}
+            
+            answer = result.get("answer", "")
+            if self.llm_provider and answer and not self._llm_fits(flight.deadline):
+                self._degrade(result, question, "не хватает времени до срока ответа")
+            elif self.llm_provider and answer:
+                prompt = load_prompt()
+                parts = []
+                reason = "пустой ответ GigaChat"
+                stream = self.llm_provider.astream_answer(question, answer, system_prompt=prompt)
+                try:
+                    while True:
+                        timeout = self._llm_timeout(flight.deadline)
+                        try:
+                            text = await asyncio.wait_for(stream.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            if not parts:
+                                self.llm_provider.record_timeout(timeout)
+                            raise
+                        parts.append(text)
+                        yield {"event": "delta", "text": text}
+                except LLMUnavailable as e:
+                    reason = str(e)
+                except Exception as e:
+                    reason = "GigaChat не ответил вовремя" if isinstance(e, asyncio.TimeoutError) else str(e)
+                    logger.error(f"Ошибка при потоковой генерации LLM ответа: {reason}", exc_info=True)
+                    if parts:
+                        yield {"event": "error", "detail": f"Генерация ответа прервана: {reason}"}
+                        return
+                finally:
+                    await stream.aclose()
+                if parts:
+                    result["llm_answer"] = result["answer"] = "".join(parts)
+                    if question_embedding is not None:
+                        self.answer_cache.store(question, question_embedding, n_results, result, cache_version)
+                    yield {"event": "done", "answer": result["answer"], "cached": False, **self._stream_meta(result)}
+                    return
+                self._degrade(result, question, reason)
+            
+            # Без LLM отдаем найденный контекст, а если GigaChat подвел - выжимку из лучшего чанка
+            answer = result.get("answer", "")
+            yield {"event": "delta", "text": answer}
+            yield {
+                "event": "done",
+                "answer": answer,
+                "cached": False,
+                "degraded": result.get("degraded", False),
+                **self._stream_meta(result)
+            }
+    
+    def _llm_admission(self):
+        """Место в очереди генераций GigaChat (если LLM подключен)"""
+        return executors.llm.admit() if self.llm_provider else nullcontext()
+    
+    @staticmethod
+    def _stream_meta(result: Dict) -> Dict:
+        return {
+            "similarity_scores": result.get("similarity_scores", []),
+            "avg_similarity": result.get("avg_similarity", 0.0),
+            "num_results": result.get("num_results", 0),
+        }
+    
+    def _run_ingest_job(self, job: Dict, progress) -> Dict:
+        """Выполняет задачу фоновой загрузки (в потоке очереди загрузки)"""
         if not self.rag_pipeline:
             raise RuntimeError("RAG pipeline not initialized")
         
-        loop = asyncio.get_event_loop()
-        count = await loop.run_in_executor(
-            None,
-            self.rag_pipeline.ingest_document,
-            document_path
-        )
-        return count
+        if job.get("kind") == "reindex":
+            pipeline = self.rag_pipeline
+            report = pipeline.reindex(progress=progress)
+            self.invalidate_answer_cache("reindex")
+            # Прежняя коллекция удаляется, когда начатые до swap запросы ее дочитали
+            timer = threading.Timer(RETIRED_COLLECTION_GRACE + 1, pipeline.vector_store.drop_retired)
+            timer.daemon = True
+            timer.start()
+            return {"chunks_count": report["chunks_count"], "report": report}
+        
+        if job.get("kind") == "bulk":
+            files, tmp_dir = collect_documents(
+                job["file_path"],
+                max_files=BULK_MAX_FILES,
+                max_uncompressed_bytes=BULK_MAX_UNCOMPRESSED_MB * 1024 * 1024
+            )
+            try:
+                report = self.rag_pipeline.ingest_documents([str(f) for f in files], progress=progress)
+            finally:
+                if tmp_dir:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.invalidate_answer_cache("bulk ingest")
+            return {"chunks_count": report["chunks_count"], "report": report}
+        
+        count = self.rag_pipeline.ingest_document(job["file_path"], progress=progress)
+        self.invalidate_answer_cache("ingest")
+        return {"chunks_count": count}
     
     async def delete_document(self, doc_id: str) -> int:
         """Удаляет документ из базы знаний"""
         if not self.rag_pipeline:
             raise RuntimeError("RAG pipeline not initialized")
         
-        loop = asyncio.get_event_loop()
-        
         def _delete_doc():
-            collection = self.rag_pipeline.vector_store.collection
-            all_data = collection.get()
-            
-            ids_to_delete = []
-            for i, metadata in enumerate(all_data.get("metadatas", [])):
-                if metadata.get("document") == doc_id:
-                    ids_to_delete.append(all_data["ids"][i])
-            
-            if ids_to_delete:
-                collection.delete(ids=ids_to_delete)
-                return len(ids_to_delete)
-            return None
+            return self.rag_pipeline.vector_store.delete_document(doc_id)
         
-        deleted_count = await loop.run_in_executor(None, _delete_doc)
+        deleted_count = await executors.vector_store.run(_delete_doc)
+        if deleted_count:
+            self.invalidate_answer_cache("delete")
         return deleted_count
     
     async def get_all_documents(self) -> Dict:
@@ -145,17 +505,8 @@ class RAGService:
         if not self.rag_pipeline:
             raise RuntimeError("RAG pipeline not initialized")
         
-        loop = asyncio.get_event_loop()
-        
         def _get_documents():
-            collection = self.rag_pipeline.vector_store.collection
-            all_data = collection.get()
-            
-            # Подсчитываем количество чанков для каждого документа
-            doc_counts = {}
-            for metadata in all_data.get("metadatas", []):
-                doc_id = metadata.get("document", "unknown")
-                doc_counts[doc_id] = doc_counts.get(doc_id, 0) + 1
+            doc_counts = self.rag_pipeline.vector_store.list_documents()
             
             # Формируем список документов
             documents = [
@@ -169,8 +520,30 @@ class RAGService:
                 "total_chunks": sum(doc_counts.values())
             }
         
-        result = await loop.run_in_executor(None, _get_documents)
+        result = await executors.vector_store.run(_get_documents)
         return result
+    
+    def get_stats(self) -> Dict:
+        """Собирает метрики кэшей и производительности"""
+        stats = {"pipeline_initialized": self.rag_pipeline is not None}
+        if self.rag_pipeline:
+            stats["query_embedding_cache"] = self.rag_pipeline.embedding_service.get_cache_stats()
+            stats["query_batching"] = self.rag_pipeline.embedding_service.get_batching_stats()
+            reranker = self.rag_pipeline.reranker
+            if reranker is not None and hasattr(reranker, "skipped"):
+                stats["cross_encoder_skipped"] = reranker.skipped
+        stats["answer_cache"] = self.answer_cache.stats()
+        if self.llm_provider:
+            stats["llm"] = self.llm_provider.stats()
+        stats["executors"] = executors.stats()
+        stats["coalesced_requests"] = self.coalesced_requests
+        stats["in_flight_questions"] = len(self._flights)
+        return stats
+    
+    async def aclose(self):
+        """Освобождает сетевые ресурсы при остановке сервиса"""
+        if self.llm_provider:
+            await self.llm_provider.aclose()
 
 
 # Глобальный экземпляр сервиса
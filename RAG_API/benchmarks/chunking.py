@@ -0,0 +1,107 @@
+"""
+Сравнение стратегий разбиения на чанки: recursive (символы) и markdown_tokens (токены модели).
+
+Для каждой стратегии считается: число чанков, длина в токенах модели, доля
+чанков, обрезаемых моделью (длиннее max_seq_length), скорость эмбеддингов
+и hit rate@k на контрольных вопросах - доля вопросов, у которых среди k
+ближайших чанков есть чанк с ожидаемым фрагментом ответа.
+
+Запуск из корня репозитория:
+    python -m RAG_API.benchmarks.chunking --k 3
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+KNOWLEDGE_BASE = Path(__file__).parent.parent / "базазнаний.txt"
+
+# (вопрос, фрагмент текста, который должен быть в найденном чанке)
+EVAL_SET = [
+    ("Сколько стоит абонемент по акции?", "8 100"),
+    ("Какая обычная стоимость абонемента?", "9 900"),
+    ("Сколько занятий в месяц и какой они длительности?", "4 занятия"),
+    ("Для какого возраста занятия?", "6–14"),
+    ("Сколько детей в группе?", "до 12"),
+    ("Где находится школа?", "Парфёновская"),
+    ("Есть ли лифт или пандус?", "Лифта"),
+    ("Чем занимается ассистент тьютора?", "Ассистент тьютора"),
+    ("Кормят ли детей на перерыве?", "печенье"),
+    ("Можно ли отработать пропущенное занятие?", "Отработки"),
+    ("В каком году основана школа?", "2017"),
+    ("Какие награды у школы?", "WSIS"),
+    ("Нужно ли ребенку уметь читать?", "читать"),
+    ("Есть ли бесплатный пробный урок?", "пробный урок"),
+]
+
+
+def evaluate(strategy: str, content: str, service, k: int, max_tokens: int) -> dict:
+    from RAG_API.rag.config import ChunkingConfig
+    from RAG_API.rag.document_processor import split_document
+
+    config = ChunkingConfig(strategy=strategy, max_tokens=max_tokens)
+    started = time.perf_counter()
+    chunks = [c["content"] for c in split_document({"source": str(KNOWLEDGE_BASE), "content": content}, config)]
+    chunk_seconds = time.perf_counter() - started
+
+    tokenizer = service.model.tokenizer
+    token_counts = np.array([len(tokenizer(c)["input_ids"]) for c in chunks])
+    max_seq_length = service.model.max_seq_length
+
+    started = time.perf_counter()
+    chunk_embeddings = service.encode_batch(chunks)
+    embed_seconds = time.perf_counter() - started
+
+    query_embeddings = service.encode([question for question, _ in EVAL_SET])
+    top_k = np.argsort(-(query_embeddings @ chunk_embeddings.T), axis=1)[:, :k]
+    hits = [
+        any(expected.lower() in chunks[i].lower() for i in top_k[q])
+        for q, (_, expected) in enumerate(EVAL_SET)
+    ]
+
+    return {
+        "strategy": strategy,
+        "chunks": len(chunks),
+        "tokens_mean": float(token_counts.mean()),
+        "tokens_max": int(token_counts.max()),
+        "truncated_share": float((token_counts > max_seq_length).mean()),
+        "chunk_s": chunk_seconds,
+        "chunks_per_s": len(chunks) / embed_seconds,
+        "tokens_per_s": float(np.minimum(token_counts, max_seq_length).sum()) / embed_seconds,
+        f"hit_rate@{k}": sum(hits) / len(hits),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", default=str(KNOWLEDGE_BASE), help="Markdown/текстовый документ для разбиения")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--json", action="store_true", help="Вывести результаты в JSON")
+    args = parser.parse_args()
+
+    from RAG_API.rag.embedding_service import EmbeddingService
+
+    content = Path(args.document).read_text(encoding="utf-8")
+    service = EmbeddingService()
+    service.model  # загрузка модели не входит в замеры
+
+    reports = [
+        evaluate(strategy, content, service, args.k, args.max_tokens)
+        for strategy in ("recursive", "markdown_tokens")
+    ]
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'стратегия':<16} {'чанков':>7} {'ток. ср':>8} {'ток. макс':>10} {'обрезано':>9} "
+          f"{'чанков/с':>9} {'токенов/с':>10} {f'hit@{args.k}':>7}")
+    for r in reports:
+        print(f"{r['strategy']:<16} {r['chunks']:>7} {r['tokens_mean']:>8.1f} {r['tokens_max']:>10} "
+              f"{r['truncated_share']:>9.0%} {r['chunks_per_s']:>9.1f} {r['tokens_per_s']:>10.0f} "
+              f"{r[f'hit_rate@{args.k}']:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
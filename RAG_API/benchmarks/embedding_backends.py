@@ -0,0 +1,115 @@
+"""
+Сравнение бэкендов эмбеддингов (PyTorch vs ONNX int8): задержка, RSS и совместимость.
+
+Каждый бэкенд запускается в отдельном процессе, чтобы RSS не смешивался.
+Запуск из корня репозитория (ONNX модель должна быть экспортирована заранее):
+    python -m RAG_API.benchmarks.embedding_backends
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+KNOWLEDGE_BASE = Path(__file__).parent.parent / "базазнаний.txt"
+
+QUERIES = [
+    "Сколько стоит обучение?",
+    "Где находится школа?",
+    "С какого возраста можно учиться?",
+    "Есть ли бесплатный пробный урок?",
+    "Какие направления программирования есть?",
+]
+
+
+def load_chunks():
+    from RAG_API.rag.document_processor import split_document
+    content = KNOWLEDGE_BASE.read_text(encoding="utf-8")
+    return [c["content"] for c in split_document({"source": str(KNOWLEDGE_BASE), "content": content})]
+
+
+def run_worker(backend: str, output: str, repeats: int):
+    """Замеры для одного бэкенда; результат печатается в stdout как JSON"""
+    from RAG_API.rag.config import EmbeddingConfig
+    from RAG_API.rag.embedding_service import EmbeddingService, rss_mb
+
+    chunks = load_chunks()
+    rss_before = rss_mb()
+
+    started = time.perf_counter()
+    service = EmbeddingService(EmbeddingConfig(backend=backend, query_cache_size=0))
+    service.model
+    load_seconds = time.perf_counter() - started
+
+    query_latencies = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            started = time.perf_counter()
+            service.encode([query])
+            query_latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    embeddings = service.encode_batch(chunks)
+    batch_seconds = time.perf_counter() - started
+
+    np.save(output, np.vstack([embeddings, service.encode(QUERIES)]))
+    query_latencies.sort()
+    print(json.dumps({
+        "backend": backend,
+        "load_s": load_seconds,
+        "rss_model_mb": rss_mb() - rss_before,
+        "rss_total_mb": rss_mb(),
+        "query_p50_ms": statistics.median(query_latencies),
+        "query_p95_ms": query_latencies[int(len(query_latencies) * 0.95) - 1],
+        "chunks": len(chunks),
+        "chunks_per_s": len(chunks) / batch_seconds,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.98, help="Минимальное косинусное сходство с torch")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.output, args.repeats)
+        return
+
+    reports, vectors = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            output = str(Path(tmp) / f"{backend}.npy")
+            completed = subprocess.run(
+                [sys.executable, "-m", "RAG_API.benchmarks.embedding_backends",
+                 "--worker", backend, "--output", output, "--repeats", str(args.repeats)],
+                capture_output=True, text=True, check=True,
+            )
+            reports.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            vectors[backend] = np.load(output)
+
+    print(f"{'backend':<8} {'load, s':>8} {'RSS модели, МБ':>15} {'RSS, МБ':>8} "
+          f"{'p50, мс':>8} {'p95, мс':>8} {'чанков/с':>9}")
+    for r in reports:
+        print(f"{r['backend']:<8} {r['load_s']:>8.1f} {r['rss_model_mb']:>15.0f} {r['rss_total_mb']:>8.0f} "
+              f"{r['query_p50_ms']:>8.1f} {r['query_p95_ms']:>8.1f} {r['chunks_per_s']:>9.1f}")
+
+    if "torch" in vectors:
+        for backend, matrix in vectors.items():
+            if backend == "torch":
+                continue
+            cosines = np.sum(vectors["torch"] * matrix, axis=1)
+            status = "OK" if cosines.min() >= args.tolerance else "НЕСОВМЕСТИМО"
+            print(f"\nСовместимость {backend} с torch: min cos={cosines.min():.4f}, "
+                  f"mean cos={cosines.mean():.4f} (порог {args.tolerance}) - {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Сравнение батчинга при загрузке: фиксированный batch_size против батчей по бюджету токенов.
+
+Корпус - чанки реальных документов: базы знаний, разбитой с разными
+chunk_size (смесь коротких и длинных чанков), либо файлов из --documents.
+Каждый режим запускается в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+Запуск из корня репозитория:
+    python -m RAG_API.benchmarks.embedding_batching --repeat 20
+    python -m RAG_API.benchmarks.embedding_batching --documents path/to/docs_or_archive.zip
+"""
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+KNOWLEDGE_BASE = Path(__file__).parent.parent / "базазнаний.txt"
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса в МБ"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_corpus(documents: str, repeat: int) -> list:
+    from RAG_API.rag.config import ChunkingConfig
+    from RAG_API.rag.document_processor import document_to_markdown, split_document
+
+    if documents:
+        from RAG_API.rag.bulk_ingest import collect_documents
+        files, tmp_dir = collect_documents(documents)
+        try:
+            texts = [
+                c["content"]
+                for f in files
+                for c in split_document(document_to_markdown(str(f)))
+            ]
+        finally:
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    else:
+        content = KNOWLEDGE_BASE.read_text(encoding="utf-8")
+        texts = [
+            c["content"]
+            for chunk_size in (200, 500, 1000)
+            for c in split_document(
+                {"source": str(KNOWLEDGE_BASE), "content": content},
+                ChunkingConfig(chunk_size=chunk_size, chunk_overlap=chunk_size // 5)
+            )
+        ] * repeat
+    random.Random(0).shuffle(texts)
+    return texts
+
+
+def encode_fixed(service, texts: list, batch_size: int) -> tuple:
+    """Прежний алгоритм: батчи фиксированного размера в исходном порядке и gc.collect"""
+    import gc
+
+    lengths = service._token_lengths(texts)
+    padded = 0
+    all_embeddings = []
+    for i in range(0, len(texts), batch_size):
+        all_embeddings.append(service.encode(texts[i:i + batch_size], batch_size=batch_size))
+        padded += len(lengths[i:i + batch_size]) * int(lengths[i:i + batch_size].max())
+        if i % (batch_size * 2) == 0:
+            gc.collect()
+    gc.collect()
+    return np.vstack(all_embeddings), {"padding_efficiency": float(lengths.sum()) / padded}
+
+
+def run_worker(mode: str, output: str, documents: str, repeat: int, batch_size: int):
+    from RAG_API.rag.embedding_service import EmbeddingService
+
+    texts = load_corpus(documents, repeat)
+    service = EmbeddingService()
+    service.model  # загрузка модели не входит в замеры
+    service.encode(texts[:2])  # прогрев
+
+    started = time.perf_counter()
+    if mode == "fixed":
+        embeddings, stats = encode_fixed(service, texts, batch_size)
+    else:
+        embeddings = service.encode_batch(texts)
+        stats = service.last_batch_stats
+    seconds = time.perf_counter() - started
+
+    np.save(output, embeddings)
+    print(json.dumps({
+        "mode": mode,
+        "chunks": len(texts),
+        "seconds": seconds,
+        "chunks_per_s": len(texts) / seconds,
+        "padding_efficiency": stats["padding_efficiency"],
+        "batches": stats.get("batches", -(-len(texts) // batch_size)),
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", help="Каталог или zip архив с документами вместо базы знаний")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов корпуса базы знаний")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch_size фиксированного режима")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.output, args.documents, args.repeat, args.batch_size)
+        return
+
+    reports, vectors = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("fixed", "bucketed"):
+            output = str(Path(tmp) / f"{mode}.npy")
+            command = [sys.executable, "-m", "RAG_API.benchmarks.embedding_batching", "--worker", mode,
+                       "--output", output, "--repeat", str(args.repeat), "--batch-size", str(args.batch_size)]
+            if args.documents:
+                command += ["--documents", args.documents]
+            completed = subprocess.run(command, capture_output=True, text=True, check=True)
+            reports.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            vectors[mode] = np.load(output)
+
+    print(f"{'режим':<10} {'чанков':>7} {'время, с':>9} {'чанков/с':>9} {'батчей':>7} "
+          f"{'полезных токенов':>17} {'пик RSS, МБ':>12}")
+    for r in reports:
+        print(f"{r['mode']:<10} {r['chunks']:>7} {r['seconds']:>9.1f} {r['chunks_per_s']:>9.1f} {r['batches']:>7} "
+              f"{r['padding_efficiency']:>17.0%} {r['peak_rss_mb']:>12.0f}")
+
+    cosines = np.sum(vectors["fixed"] * vectors["bucketed"], axis=1)
+    print(f"\nСовпадение эмбеддингов (порядок восстановлен): min cos={cosines.min():.5f}")
+
+
+if __name__ == "__main__":
+    main()
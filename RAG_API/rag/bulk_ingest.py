@@ -0,0 +1,125 @@
+"""
+Массовая загрузка документов: каталог или zip архив.
+
+Конвертация (MarkItDown) и разбиение на чанки выполняются в пуле процессов,
+эмбеддинги считаются одним потребителем батчами, а все изменения
+записываются в векторную БД одним пакетом после обработки всех файлов.
+
+Запуск из корня репозитория:
+    python -m RAG_API.rag.bulk_ingest path/to/docs_or_archive.zip --workers 2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from RAG_API.rag.config import ChunkingConfig
+
+
+def collect_documents(
+    path: str,
+    max_files: Optional[int] = None,
+    max_uncompressed_bytes: Optional[int] = None
+) -> Tuple[List[Path], str]:
+    """Возвращает список файлов каталога или распакованного архива
+
+    Второй элемент - временный каталог распаковки (его нужно удалить), либо None.
+    Архив проверяется до распаковки: число файлов и их суммарный размер после
+    распаковки (по оглавлению) не должны превышать max_files и max_uncompressed_bytes.
+    """
+    path = Path(path)
+    tmp_dir = None
+    if path.is_file() and zipfile.is_zipfile(path):
+        tmp_dir = tempfile.mkdtemp(prefix="bulk_ingest_")
+        root = Path(tmp_dir).resolve()
+        try:
+            with zipfile.ZipFile(path) as archive:
+                members = [m for m in archive.infolist() if not m.is_dir()]
+                if max_files is not None and len(members) > max_files:
+                    raise ValueError(f"В архиве {len(members)} файлов, допускается не более {max_files}")
+                total_size = sum(m.file_size for m in members)
+                if max_uncompressed_bytes is not None and total_size > max_uncompressed_bytes:
+                    raise ValueError(
+                        f"Размер архива после распаковки {total_size // (1024 * 1024)} МБ, "
+                        f"допускается не более {max_uncompressed_bytes // (1024 * 1024)} МБ"
+                    )
+                for member in archive.infolist():
+                    target = (root / member.filename).resolve()
+                    # Защита от путей вида ../../etc в архиве
+                    if not str(target).startswith(str(root) + os.sep):
+                        raise ValueError(f"Недопустимый путь в архиве: {member.filename}")
+                archive.extractall(root)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        path = root
+    elif path.is_file():
+        return [path], None
+
+    files = sorted(
+        p for p in path.rglob("*")
+        if p.is_file() and not any(part.startswith((".", "__MACOSX")) for part in p.relative_to(path).parts)
+    )
+    return files, tmp_dir
+
+
+def prepare_document(document_path: str, chunking: ChunkingConfig) -> Dict:
+    """Конвертация и разбиение одного файла (выполняется в процессе пула)"""
+    from RAG_API.rag.document_processor import document_to_markdown, split_document
+
+    report = {"file": Path(document_path).name, "path": str(document_path)}
+    try:
+        started = time.perf_counter()
+        document = document_to_markdown(str(document_path))
+        report["convert_s"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        report["chunks"] = split_document(document, chunking)
+        report["content"] = document["content"]
+        report["chunk_s"] = time.perf_counter() - started
+    except Exception as e:
+        report["error"] = str(e)
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Текстовая таблица отчета массовой загрузки"""
+    lines = [
+        f"{'файл':<40} {'статус':<10} {'чанков':>7} {'новых':>6} {'удал.':>6} "
+        f"{'конв, с':>8} {'чанк, с':>8} {'эмб, с':>7}"
+    ]
+    for item in report["files"]:
+        lines.append(
+            f"{item['file'][:40]:<40} {item['status']:<10} {item.get('chunks_count', 0):>7} "
+            f"{item.get('new_chunks', 0):>6} {item.get('removed_chunks', 0):>6} "
+            f"{item.get('convert_s', 0):>8.2f} {item.get('chunk_s', 0):>8.2f} {item.get('embed_s', 0):>7.2f}"
+        )
+        if item.get("error"):
+            lines.append(f"    ошибка: {item['error']}")
+    lines.append(
+        f"\nФайлов: {len(report['files'])}, ошибок: {report['failed_files']}, "
+        f"чанков: {report['chunks_count']}, новых эмбеддингов: {report['new_chunks']}, "
+        f"время: {report['duration_s']:.1f} с"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from RAG_API.app.core.config import rag_config
+    from RAG_API.rag.rag_pipeline import RAGPipeline
+
+    parser = argparse.ArgumentParser(description="Массовая загрузка документов в базу знаний")
+    parser.add_argument("path", help="Каталог с документами или zip архив")
+    parser.add_argument("--workers", type=int, default=None, help="Процессов для конвертации и разбиения")
+    args = parser.parse_args()
+
+    files, tmp_dir = collect_documents(args.path)
+    try:
+        result = RAGPipeline(rag_config()).ingest_documents([str(f) for f in files], max_workers=args.workers)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(format_report(result))
@@ -0,0 +1,56 @@
+import time
+
+
+class CircuitBreaker:
+    """Автомат отключения медленного или недоступного внешнего сервиса
+
+    После failure_threshold неудачных (или слишком медленных) вызовов подряд
+    автомат размыкается: вызовы не выполняются, пока не пройдет cooldown
+    секунд. Затем пропускается один пробный вызов; успех замыкает автомат,
+    неудача размыкает его еще на cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в полуоткрытом состоянии - один пробный за cooldown"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            self._opened_at = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            if self.consecutive_failures == self.failure_threshold:
+                self.times_opened += 1
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -7,6 +7,10 @@ class ChunkingConfig:
     chunk_size: int = 500
     chunk_overlap: int = 100
     separators: List[str] = None
+    strategy: str = "recursive"  # "recursive" (символы) или "markdown_tokens" (токены модели + структура markdown)
+    max_tokens: int = 128  # Предел длины чанка в токенах, включая служебные (max_seq_length модели)
+    overlap_tokens: int = 16
+    tokenizer_name: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"  # Токенизатор модели эмбеддингов
     
     def __post_init__(self):
         if self.separators is None:
@@ -18,15 +22,49 @@ class EmbeddingConfig:
     model_name: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
     normalize_embeddings: bool = True
     batch_size: int = 8  # Уменьшено с 32 для экономии памяти (2GB RAM)
+    batch_token_budget: int = 2048  # encode_batch: токенов с учетом паддинга на батч (начальное значение)
+    max_batch_size: int = 64  # encode_batch: максимум текстов в батче
+    memory_limit_mb: int = 1536  # RSS, выше которого бюджет батча уменьшается
+    query_cache_size: int = 512  # Размер LRU кэша эмбеддингов запросов (0 - выключен)
+    query_batch_max_wait_ms: float = 5.0  # Сколько ждать запросы других пользователей для общего батча (0 - без батчинга)
+    query_batch_max_size: int = 16  # Максимум текстов в общем батче запросов
+    backend: str = "torch"  # "torch" или "onnx" (int8, onnxruntime)
+    onnx_model_dir: str = None  # Каталог экспортированной ONNX модели (по умолчанию ONNX_MODEL_DIR)
 
 @dataclass
 class RetrievalConfig:
     """Конфигурация поиска"""
     n_results: int = 3
     use_reranking: bool = True
-    rerank_top_k: int = 5  # Сколько результатов re-rank
     use_multi_query: bool = True
-    min_similarity_threshold: float = 0.3  # Минимальный порог релевантности
+    # Бюджеты этапов плана поиска
+    candidates_per_query: int = 6  # Этап 1: кандидатов из векторной БД на каждый вариант запроса
+    fusion_top_k: int = 10  # Этап 2: кандидатов после слияния вариантов
+    rerank_top_k: int = 5  # Этап 3: сколько лучших кандидатов re-rank (остальные отбрасываются)
+    reranker_type: str = "bi_encoder"  # "bi_encoder" или "cross_encoder"
+    cross_encoder_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    cross_encoder_max_length: int = 256
+    cross_encoder_quantize: bool = True  # Динамическая int8 квантизация для CPU
+    rerank_skip_margin: float = 0.15  # Не запускать кросс-энкодер, если отрыв лидера по векторной оценке больше (0 - всегда)
+    rrf_k: int = 60  # Сглаживающая константа reciprocal rank fusion
+    use_hybrid_search: bool = True  # Добавлять BM25 кандидатов к векторным
+    lexical_top_k: int = 10  # Кандидатов из BM25 индекса
+    lexical_weight: float = 1.0  # Вес BM25 списка в reciprocal rank fusion
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    lexical_confident_coverage: float = 1.0  # Доля терминов запроса в лучшем BM25 чанке, при которой векторный этап сокращается
+    confident_candidates_per_query: int = 3  # Векторных кандидатов при уверенном BM25 совпадении
+    min_similarity_threshold: float = 0.3  # Минимальное косинусное сходство запроса и чанка
+    vector_store_backend: str = "chroma"  # "chroma" или "numpy"
+    numpy_index_dtype: str = "float32"  # "float32" или "float16" для плоского NumPy индекса
+
+@dataclass
+class SemanticCacheConfig:
+    """Конфигурация семантического кэша ответов"""
+    enabled: bool = True
+    max_distance: float = 0.05  # Максимальное косинусное расстояние между вопросами
+    ttl_seconds: float = 3600.0
+    max_size: int = 256
 
 @dataclass
 class RAGConfig:
@@ -34,6 +72,7 @@ class RAGConfig:
     chunking: ChunkingConfig = None
     embedding: EmbeddingConfig = None
     retrieval: RetrievalConfig = None
+    answer_cache: SemanticCacheConfig = None
     
     def __post_init__(self):
         if self.chunking is None:
@@ -42,6 +81,8 @@ class RAGConfig:
             self.embedding = EmbeddingConfig()
         if self.retrieval is None:
             self.retrieval = RetrievalConfig()
+        if self.answer_cache is None:
+            self.answer_cache = SemanticCacheConfig()
 
 
 DEFAULT_CONFIG = RAGConfig()
@@ -1,5 +1,8 @@
+import hashlib
+import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from RAG_API.rag.config import ChunkingConfig
 from markitdown import MarkItDown
@@ -27,28 +30,158 @@ def split_document(document: Dict[str, str], config: ChunkingConfig = None) -> L
         from RAG_API.rag.config import DEFAULT_CONFIG
         config = DEFAULT_CONFIG.chunking
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=config.chunk_size,
-        chunk_overlap=config.chunk_overlap,
-        separators=config.separators,
-        length_function=len,
-    )
-
-    doc_chunks = text_splitter.split_text(document["content"])
+    if config.strategy == "markdown_tokens":
+        doc_chunks = split_markdown_by_tokens(document["content"], config)
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=config.chunk_size,
+            chunk_overlap=config.chunk_overlap,
+            separators=config.separators,
+            length_function=len,
+        )
+        doc_chunks = [(chunk_text, None) for chunk_text in text_splitter.split_text(document["content"])]
+    document_name = Path(document["source"]).name
 
     chunks = []
-    for i, chunk_text in enumerate(doc_chunks):
+    seen_ids = {}
+    for i, (chunk_text, section_path) in enumerate(doc_chunks):
+        content_hash = hashlib.sha1(chunk_text.encode("utf-8")).hexdigest()
         chunk = {
+            "id": chunk_content_id(document_name, content_hash, seen_ids),
             "content": chunk_text,
             "source": document["source"],
             "chunk_id": i,
             "metadata": {
                 "chunk_index": i,
                 "total_chunks": len(doc_chunks),
-                "document_name": Path(document["source"]).name,
+                "document_name": document_name,
                 "chunk_length": len(chunk_text),
+                "content_hash": content_hash,
             }
         }
+        if section_path is not None:
+            chunk["metadata"]["section_path"] = section_path
         chunks.append(chunk)
 
     return chunks
+
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+•·]|\d+[.)])\s+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…;])\s+")
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(tokenizer_name: str):
+    """Токенизатор модели эмбеддингов (загружается один раз на процесс)"""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(tokenizer_name)
+
+
+def _markdown_sections(text: str) -> List[Tuple[str, List[str]]]:
+    """Делит markdown на секции по заголовкам: (путь заголовков, блоки текста)
+
+    Блок - абзац или отдельный пункт списка; строки-продолжения пункта
+    остаются в нем.
+    """
+    sections = []
+    path: List[Tuple[int, str]] = []
+    heading_line = None
+    blocks: List[str] = []
+    current: List[str] = []
+
+    def close_block():
+        if current:
+            blocks.append("\n".join(current).strip())
+            current.clear()
+
+    def close_section():
+        close_block()
+        content = [b for b in blocks if b]
+        if content:
+            # Заголовок остается в первом чанке секции
+            sections.append((" > ".join(title for _, title in path), ([heading_line] if heading_line else []) + content))
+        blocks.clear()
+
+    for line in text.splitlines():
+        heading = _HEADING_RE.match(line)
+        if heading:
+            close_section()
+            level = len(heading.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, heading.group(2))]
+            heading_line = line.strip()
+        elif not line.strip():
+            close_block()
+        elif _LIST_ITEM_RE.match(line):
+            close_block()
+            current.append(line.rstrip())
+        else:
+            current.append(line.rstrip())
+    close_section()
+    return sections
+
+
+def _split_oversized(block: str, budget: int, tokenizer) -> List[str]:
+    """Делит слишком длинный блок по предложениям, а предложения - по токенам"""
+    pieces = []
+    for sentence in _SENTENCE_RE.split(block):
+        if len(tokenizer.tokenize(sentence)) <= budget:
+            pieces.append(sentence)
+            continue
+        encoded = tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = encoded["offset_mapping"]
+        for start in range(0, len(offsets), budget):
+            window = offsets[start:start + budget]
+            pieces.append(sentence[window[0][0]:window[-1][1]].strip())
+    return [piece for piece in pieces if piece]
+
+
+def split_markdown_by_tokens(text: str, config: ChunkingConfig) -> List[Tuple[str, str]]:
+    """Разбивает markdown на чанки не длиннее max_tokens токенов модели эмбеддингов
+
+    Чанки не пересекают границы секций; внутри секции абзацы и пункты списков
+    собираются жадно, с перекрытием последними блоками до overlap_tokens.
+    Возвращает пары (текст чанка, путь заголовков секции).
+    """
+    tokenizer = get_tokenizer(config.tokenizer_name)
+    budget = config.max_tokens - tokenizer.num_special_tokens_to_add()
+
+    chunks = []
+    for section_path, blocks in _markdown_sections(text):
+        units = []
+        for block in blocks:
+            count = len(tokenizer.tokenize(block))
+            if count <= budget:
+                units.append((block, count))
+            else:
+                units.extend((piece, len(tokenizer.tokenize(piece))) for piece in _split_oversized(block, budget, tokenizer))
+
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        for unit, count in units:
+            if current and current_tokens + count > budget:
+                chunks.append(("\n\n".join(u for u, _ in current), section_path))
+                # Перекрытие: переносим хвостовые блоки, пока они укладываются в overlap_tokens
+                overlap, overlap_tokens = [], 0
+                for prev_unit, prev_count in reversed(current):
+                    if overlap_tokens + prev_count > config.overlap_tokens or overlap_tokens + prev_count + count > budget:
+                        break
+                    overlap.insert(0, (prev_unit, prev_count))
+                    overlap_tokens += prev_count
+                current, current_tokens = overlap, overlap_tokens
+            current.append((unit, count))
+            current_tokens += count
+        if current:
+            chunks.append(("\n\n".join(u for u, _ in current), section_path))
+    return chunks
+
+
+def chunk_content_id(document_name: str, content_hash: str, seen_ids: Dict[str, int]) -> str:
+    """Стабильный id чанка из имени документа и хэша содержимого
+    
+    Одинаковые чанки внутри документа различаются порядковым суффиксом.
+    """
+    base_id = hashlib.sha1(f"{document_name}\0{content_hash}".encode("utf-8")).hexdigest()[:24]
+    occurrence = seen_ids.get(base_id, 0)
+    seen_ids[base_id] = occurrence + 1
+    return base_id if occurrence == 0 else f"{base_id}-{occurrence}"
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, List
+import numpy as np
+
+
+class EmbeddingDispatcher:
+    """Микробатчинг эмбеддингов запросов от одновременных пользователей
+
+    Вызовы encode из разных потоков собираются в течение max_wait_ms (или
+    пока не наберется max_batch текстов) и кодируются одним вызовом модели;
+    результаты раздаются вызывающим в исходном порядке. Поток диспетчера
+    запускается при первом запросе и завершается после idle_timeout секунд
+    простоя.
+
+    Диспетчер сериализует только запросы, прошедшие через него: та же модель
+    одновременно вызывается напрямую из других потоков (encode_batch при
+    загрузке документов, Reranker, запросы при выключенном микробатчинге),
+    поэтому encode_fn должна допускать параллельные вызовы.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_wait_ms: float = 5.0,
+        max_batch: int = 16,
+        idle_timeout: float = 30.0
+    ):
+        self._encode_fn = encode_fn
+        self.max_wait_ms = max_wait_ms
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = False
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._wait_seconds = 0.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Эмбеддинги texts; блокирует вызывающий поток до готовности батча"""
+        future: Future = Future()
+        with self._lock:
+            self._queue.put((list(texts), future, time.monotonic()))
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._loop, name="embedding-dispatcher", daemon=True).start()
+        return future.result()
+
+    def _loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._running = False
+                        return
+                continue
+
+            requests = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            self._run_batch(requests)
+
+    def _run_batch(self, requests: list):
+        texts = [text for request_texts, _, _ in requests for text in request_texts]
+        started = time.monotonic()
+        try:
+            embeddings = self._encode_fn(texts)
+        except Exception as e:
+            for _, future, _ in requests:
+                future.set_exception(e)
+            return
+
+        self._batch_sizes[len(texts)] += 1
+        self._requests += len(requests)
+        offset = 0
+        for request_texts, future, queued_at in requests:
+            self._wait_seconds += started - queued_at
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self) -> dict:
+        """Метрики батчинга: распределение размеров батчей (в текстах) и время ожидания батча"""
+        batches = sum(self._batch_sizes.values())
+        texts = sum(size * count for size, count in self._batch_sizes.items())
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch": self.max_batch,
+            "batches": batches,
+            "requests": self._requests,
+            "avg_batch_size": texts / batches if batches else 0.0,
+            "max_batch_size": max(self._batch_sizes, default=0),
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            "avg_wait_ms": self._wait_seconds / self._requests * 1000 if self._requests else 0.0,
+        }
@@ -1,9 +1,28 @@
-from typing import List
+from typing import Callable, List, Optional
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from RAG_API.rag.config import EmbeddingConfig
+from RAG_API.rag.cache import LRUCache
+from RAG_API.rag.embedding_dispatcher import EmbeddingDispatcher
 import gc
-import os
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса в МБ (0, если /proc недоступен)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def normalize_query(query: str) -> str:
+    """Ключ кэша эмбеддингов запроса: запросы, отличающиеся регистром и пробелами, делят запись"""
+    return " ".join(query.split()).casefold()
+
 
 class EmbeddingService:
     """Сервис для создания эмбеддингов"""
@@ -15,11 +34,25 @@ class EmbeddingService:
         
         self.config = config
         self._model = None
+        self._query_cache = LRUCache(config.query_cache_size) if config.query_cache_size > 0 else None
+        self._token_budget = config.batch_token_budget
+        self.last_batch_stats = None
+        self._dispatcher = EmbeddingDispatcher(
+            lambda texts: self.encode(texts, batch_size=len(texts), show_progress=False),
+            max_wait_ms=config.query_batch_max_wait_ms,
+            max_batch=config.query_batch_max_size
+        )
     
     @property
     def model(self) -> SentenceTransformer:
         """Ленивая загрузка модели с оптимизацией для CPU"""
-        if self._model is None:
+        if self._model is None and self.config.backend == "onnx":
+            from RAG_API.rag.onnx_backend import OnnxEmbeddingModel
+            self._model = OnnxEmbeddingModel(
+                self.config.onnx_model_dir,
+                expected_model_name=self.config.model_name
+            )
+        elif self._model is None:
             # Для версии sentence-transformers==2.2.2 нельзя передавать model_kwargs / encode_kwargs
             # Инициализируем модель в CPU-режиме, остальные параметры задаём при encode()
             self._model = SentenceTransformer(
@@ -32,6 +65,24 @@ class EmbeddingService:
                 self._model.eval()
         return self._model
     
+    def with_config(self, config: EmbeddingConfig) -> "EmbeddingService":
+        """Новый сервис с настройками, не требующими перезагрузки модели
+        
+        Загруженная модель общая, кэш эмбеддингов запросов переносится, если
+        его размер и нормализация не изменились. Текущий сервис не меняется:
+        запросы в процессе выполнения дорабатывают с прежними настройками.
+        """
+        service = EmbeddingService(config)
+        service._model = self._model
+        if (
+            config.query_cache_size == self.config.query_cache_size
+            and config.normalize_embeddings == self.config.normalize_embeddings
+        ):
+            service._query_cache = self._query_cache
+        if config.batch_token_budget == self.config.batch_token_budget:
+            service._token_budget = self._token_budget
+        return service
+    
     def encode(
         self, 
         texts: List[str], 
@@ -56,39 +107,141 @@ class EmbeddingService:
         return embeddings
     
     def encode_query(self, query: str) -> np.ndarray:
-        """Создает эмбеддинг для запроса"""
-        return self.encode([query], show_progress=False)[0]
+        """Создает эмбеддинг для запроса (с кэшированием)"""
+        return self.encode_queries([query])[0]
     
-    def encode_batch(self, texts: List[str], batch_size: int = None) -> np.ndarray:
-        """Создает эмбеддинги батчами для больших объемов данных с оптимизацией памяти"""
-        if batch_size is None:
-            batch_size = self.config.batch_size
+    def _encode_query_texts(self, texts: List[str]) -> np.ndarray:
+        """Кодирует запросы; при включенном микробатчинге - вместе с запросами других потоков"""
+        if self.config.query_batch_max_wait_ms > 0:
+            return self._dispatcher.encode(texts)
+        return self.encode(texts, show_progress=False)
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Создает эмбеддинги для списка запросов
         
-        # Уменьшаем batch_size если тексты очень длинные
-        avg_length = sum(len(t) for t in texts[:min(10, len(texts))]) / min(10, len(texts))
-        if avg_length > 1000:
-            batch_size = max(4, batch_size // 2)
+        Повторяющиеся запросы берутся из LRU кэша, промахи кодируются одним батчем.
+        Нормализованный текст - только ключ кэша: модель кодирует исходный
+        запрос (токенизатор различает регистр).
+        """
+        if self._query_cache is None:
+            return self._encode_query_texts(list(queries))
         
-        all_embeddings = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.encode(batch, show_progress=False)
-            all_embeddings.append(batch_embeddings)
-
-            # Более агрессивная очистка памяти для ограниченных ресурсов
-            if i % (batch_size * 2) == 0:
-                gc.collect()
+        keys = [normalize_query(q) for q in queries]
+        embeddings = [self._query_cache.get((self.config.model_name, key)) for key in keys]
+        # Для каждого отсутствующего ключа кодируется первый запрос с этим ключом
+        missing = {}
+        for key, query, embedding in zip(keys, queries, embeddings):
+            if embedding is None:
+                missing.setdefault(key, query)
+        if missing:
+            encoded = dict(zip(missing, self._encode_query_texts(list(missing.values()))))
+            for key, embedding in encoded.items():
+                embedding.flags.writeable = False
+                self._query_cache.put((self.config.model_name, key), embedding)
+            embeddings = [
+                embedding if embedding is not None else encoded[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
         
-        result = np.vstack(all_embeddings) if len(all_embeddings) > 1 else all_embeddings[0]
-        # Финальная очистка
-        del all_embeddings
-        gc.collect()
+        return np.vstack(embeddings)
+    
+    def get_cache_stats(self) -> dict:
+        """Статистика кэша эмбеддингов запросов"""
+        if self._query_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._query_cache.stats()}
+    
+    def get_batching_stats(self) -> dict:
+        """Метрики микробатчинга эмбеддингов запросов"""
+        return {"enabled": self.config.query_batch_max_wait_ms > 0, **self._dispatcher.stats()}
+    
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Длины текстов в токенах модели (с учетом обрезки по max_seq_length)"""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        max_length = getattr(self.model, "max_seq_length", 128)
+        if tokenizer is None:
+            return np.minimum(np.array([len(t) // 4 + 2 for t in texts]), max_length)
+        encoded = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]])
+    
+    @staticmethod
+    def _next_batch_size(sorted_lengths: np.ndarray, token_budget: int, max_batch_size: int) -> int:
+        """Сколько первых текстов (отсортированных по длине) помещается в бюджет токенов
+        
+        Стоимость батча - число текстов, умноженное на длину самого длинного
+        (до нее дополняются остальные).
+        """
+        head = sorted_lengths[:max_batch_size]
+        cost = np.arange(1, len(head) + 1) * head
+        return max(1, int(np.count_nonzero(cost <= token_budget)))
+    
+    def encode_batch(
+        self,
+        texts: List[str],
+        batch_size: int = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> np.ndarray:
+        """Создает эмбеддинги батчами для больших объемов данных с оптимизацией памяти
+        
+        Тексты сортируются по длине в токенах и группируются в батчи по бюджету
+        токенов, поэтому паддинг внутри батча минимален. Бюджет уменьшается вдвое,
+        если RSS процесса превысил memory_limit_mb, и восстанавливается, когда
+        памяти снова достаточно. Порядок результата совпадает с порядком texts.
+        
+        batch_size - необязательный предел числа текстов в батче.
+        progress_callback(готово, всего) вызывается после каждого батча.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        max_batch_size = batch_size or self.config.max_batch_size
+        token_budget = self._token_budget
+        
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind="stable")
+        sorted_lengths = lengths[order]
+        result = None
+        done = 0
+        stats = {"batches": 0, "tokens": int(lengths.sum()), "padded_tokens": 0, "peak_rss_mb": 0.0}
+        
+        while done < len(texts):
+            size = self._next_batch_size(sorted_lengths[done:], token_budget, max_batch_size)
+            batch_indices = order[done:done + size]
+            
+            embeddings = self.encode(
+                [texts[i] for i in batch_indices],
+                batch_size=len(batch_indices),
+                show_progress=False
+            )
+            if result is None:
+                result = np.empty((len(texts), embeddings.shape[1]), dtype=embeddings.dtype)
+            result[batch_indices] = embeddings
+            
+            done += size
+            stats["batches"] += 1
+            stats["padded_tokens"] += int(size * sorted_lengths[done - 1])
+            
+            rss = rss_mb()
+            stats["peak_rss_mb"] = max(stats["peak_rss_mb"], rss)
+            if rss > self.config.memory_limit_mb:
+                token_budget = max(int(sorted_lengths[done - 1]), token_budget // 2)
+            elif rss < self.config.memory_limit_mb * 0.75:
+                token_budget = min(self.config.batch_token_budget, token_budget * 2)
+            
+            if progress_callback:
+                progress_callback(done, len(texts))
+        
+        self._token_budget = token_budget
+        stats["token_budget"] = token_budget
+        stats["padding_efficiency"] = stats["tokens"] / max(stats["padded_tokens"], 1)
+        self.last_batch_stats = stats
         return result
     
     def clear_cache(self):
-        """Очищает кэш модели"""
+        """Очищает кэш модели и эмбеддингов запросов"""
         if self._model is not None:
             del self._model
             self._model = None
+        if self._query_cache is not None:
+            self._query_cache.clear()
         gc.collect()
 
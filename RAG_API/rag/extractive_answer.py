@@ -0,0 +1,30 @@
+import re
+from RAG_API.rag.lexical_index import tokenize
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+# Разметка markdown в начале строки: списки, цитаты
+_MARKUP_RE = re.compile(r"^[>*\-•\s]+")
+
+
+def extractive_answer(question: str, text: str, max_sentences: int = 2, max_chars: int = 400) -> str:
+    """Краткий ответ без LLM: предложения чанка, в которых больше всего терминов вопроса
+
+    Предложения сохраняют порядок, в котором идут в чанке. Если ни одно
+    предложение не содержит терминов вопроса, берется начало чанка.
+    """
+    # Заголовки markdown не подходят для ответа
+    parts = [p for p in _SENTENCE_SPLIT_RE.split(text) if not p.lstrip().startswith("#")]
+    sentences = [s for s in (_MARKUP_RE.sub("", p).strip() for p in parts) if s]
+    if not sentences:
+        return text.strip()
+
+    terms = set(tokenize(question))
+    scores = [len(terms.intersection(tokenize(s))) for s in sentences]
+    best = [i for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i))[:max_sentences] if scores[i] > 0]
+    if not best:
+        best = list(range(min(max_sentences, len(sentences))))
+
+    answer = " ".join(sentences[i] for i in sorted(best))
+    if len(answer) > max_chars:
+        answer = answer[:max_chars].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+    return answer
@@ -1,8 +1,12 @@
+import asyncio
 import os
 import logging
+import time
+from typing import AsyncIterator, List, Tuple
 from gigachat import GigaChat
 from gigachat.models import Chat, Messages
 from dotenv import load_dotenv
+from RAG_API.rag.circuit_breaker import CircuitBreaker
 
 load_dotenv()
 
@@ -15,8 +19,36 @@ def _get_credentials() -> str:
     return os.getenv("GIGACHAT_CREDENTIALS", "").strip()
 
 
+class LLMUnavailable(Exception):
+    """GigaChat отключен автоматом после серии медленных или неудачных вызовов"""
+
+
 class LLMProvider:
-    def __init__(self, system_prompt: str = None):
+    """Клиент GigaChat
+    
+    Один клиент живет все время работы сервиса: aanswer и astream_answer
+    используют его общий пул HTTP соединений и токен доступа.
+    Число одновременных генераций ограничено max_concurrency, остальные
+    запросы ждут в очереди корутинами, не занимая потоков.
+    
+    Вызовы защищены автоматом (CircuitBreaker): вызов дольше
+    slow_call_seconds (до ответа или первого фрагмента) или с ошибкой считается
+    неудачным, после breaker_failures неудач подряд вызовы сразу завершаются
+    LLMUnavailable. Если hedge_after > 0, aanswer без ответа за hedge_after
+    секунд отправляет повторный запрос и берет тот, что ответит первым.
+    Отмененный вызов автомат не учитывает: о прерывании по таймауту
+    вызывающий сообщает через record_timeout.
+    """
+    
+    def __init__(
+        self,
+        system_prompt: str = None,
+        max_concurrency: int = 8,
+        slow_call_seconds: float = 10.0,
+        breaker_failures: int = 3,
+        breaker_cooldown: float = 30.0,
+        hedge_after: float = 0.0
+    ):
         credentials = _get_credentials()
         if not credentials:
             raise ValueError("GIGACHAT_CREDENTIALS is not set")
@@ -31,23 +63,141 @@ class LLMProvider:
             logger.error(f"❌ Ошибка при инициализации GigaChat клиента: {e}", exc_info=True)
             raise
         self._system_prompt = system_prompt or self._get_default_prompt()
+        self.max_concurrency = max_concurrency
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self.slow_call_seconds = slow_call_seconds
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self.slow_calls = 0
+        self.failed_calls = 0
+        self.hedged_calls = 0
 
-    def _ask_ai(self, user_prompt: str, system_prompt: str = None) -> str:
+    @staticmethod
+    def _messages(user_prompt: str, system_prompt: str = None) -> List[Messages]:
         messages_list = []
         if system_prompt:
             messages_list.append(Messages(role="system", content=system_prompt))
         messages_list.append(Messages(role="user", content=user_prompt))
+        return messages_list
+
+    async def _acquire(self):
+        self._waiting += 1
+        try:
+            await self._limit.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+
+    def _release(self):
+        self._in_flight -= 1
+        self._limit.release()
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise LLMUnavailable("GigaChat временно отключен после серии медленных или неудачных ответов")
+
+    def _record_latency(self, seconds: float):
+        """Учитывает время ответа: дольше slow_call_seconds - неудача для автомата"""
+        if seconds > self.slow_call_seconds:
+            self.slow_calls += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _record_failure(self):
+        self.failed_calls += 1
+        self.breaker.record_failure()
+
+    def record_timeout(self, timeout: float):
+        """Вызов прерван по таймауту вызывающего
+        
+        Отмененный вызов сам на автомат не влияет; прерванный таймаутом не
+        короче slow_call_seconds засчитывается как медленный.
+        """
+        if timeout >= self.slow_call_seconds:
+            self.slow_calls += 1
+            self.breaker.record_failure()
+
+    async def _aask_ai(self, user_prompt: str, system_prompt: str = None) -> Tuple[str, float]:
+        """Один запрос в GigaChat: ответ и время его ожидания (исход учитывает вызывающий)"""
+        chat_request = Chat(messages=self._messages(user_prompt, system_prompt))
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            logger.debug("Асинхронный запрос в GigaChat")
+            response = await self.giga.achat(chat_request)
+        finally:
+            self._release()
+        return response.choices[0].message.content, time.monotonic() - started
+
+    async def _ahedged(self, user_prompt: str, system_prompt: str = None) -> str:
+        """Запрос с повтором: если ответа нет за hedge_after секунд, параллельно отправляется второй
+        
+        Автомат учитывает только использованный ответ либо, если не удался ни
+        один запрос, последнюю ошибку; отмененные запросы на него не влияют.
+        """
+        pending = {asyncio.ensure_future(self._aask_ai(user_prompt, system_prompt))}
         try:
-            logger.debug(f"Отправка запроса в GigaChat с {len(messages_list)} сообщениями")
-            # Создаем объект Chat с сообщениями
-            chat_request = Chat(messages=messages_list)
-            prompt = self.giga.chat(chat_request)
-            response_content = prompt.choices[0].message.content
-            logger.debug(f"✅ Получен ответ от GigaChat (длина: {len(response_content)})")
-            return response_content
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after or None)
+            if not done:
+                self.hedged_calls += 1
+                logger.info(f"GigaChat не ответил за {self.hedge_after} с, отправлен повторный запрос")
+                pending.add(asyncio.ensure_future(self._aask_ai(user_prompt, system_prompt)))
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        content, seconds = task.result()
+                        self._record_latency(seconds)
+                        return content
+                    error = task.exception()
+                if not pending:
+                    self._record_failure()
+                    logger.error(f"❌ Ошибка при запросе к GigaChat: {error}", exc_info=error)
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _astream_ai(self, user_prompt: str, system_prompt: str = None) -> AsyncIterator[str]:
+        self._check_breaker()
+        chat_request = Chat(messages=self._messages(user_prompt, system_prompt))
+        await self._acquire()
+        started = time.monotonic()
+        first_chunk = True
+        try:
+            logger.debug("Асинхронный потоковый запрос в GigaChat")
+            async for chunk in self.giga.astream(chat_request):
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    if first_chunk:
+                        # Для потока медленным считается долгое ожидание первого фрагмента
+                        first_chunk = False
+                        self._record_latency(time.monotonic() - started)
+                    yield content
         except Exception as e:
-            logger.error(f"❌ Ошибка при запросе к GigaChat: {e}", exc_info=True)
+            self._record_failure()
+            logger.error(f"❌ Ошибка при потоковом запросе к GigaChat: {e}", exc_info=True)
             raise
+        finally:
+            self._release()
+
+    async def aclose(self):
+        """Закрывает пул соединений клиента"""
+        await self.giga.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "slow_calls": self.slow_calls,
+            "failed_calls": self.failed_calls,
+            "hedged_calls": self.hedged_calls,
+            "circuit_breaker": self.breaker.stats(),
+        }
 
     def _get_default_prompt(self) -> str:
         """Возвращает дефолтный промпт"""
@@ -81,12 +231,24 @@ class LLMProvider:
    - Если информации НЕТ: "К сожалению, в базе знаний школы программирования KiberOne нет информации по этому вопросу."
     """
     
-    def answer(self, question: str, context: str, system_prompt: str = None) -> str:
-        """Генерирует ответ на вопрос с использованием контекста"""
+    async def aanswer(self, question: str, context: str, system_prompt: str = None) -> str:
+        """Генерирует ответ на вопрос с использованием контекста (с автоматом и повтором запроса, см. описание класса)"""
         if system_prompt is None:
             system_prompt = self._system_prompt
 
-        user_prompt = f"""ИНФОРМАЦИОННЫЙ КОНТЕКСТ:
+        self._check_breaker()
+        return await self._ahedged(self._build_user_prompt(question, context), system_prompt)
+
+    def astream_answer(self, question: str, context: str, system_prompt: str = None) -> AsyncIterator[str]:
+        """Генерирует ответ потоково (фрагменты текста по мере готовности)"""
+        if system_prompt is None:
+            system_prompt = self._system_prompt
+
+        return self._astream_ai(self._build_user_prompt(question, context), system_prompt)
+
+    @staticmethod
+    def _build_user_prompt(question: str, context: str) -> str:
+        return f"""ИНФОРМАЦИОННЫЙ КОНТЕКСТ:
     {context}
 
     ЗАПРОС ПОЛЬЗОВАТЕЛЯ:
@@ -105,7 +267,4 @@ class LLMProvider:
     - Отвечай строго только на вопрос клиента
     - Если информации нет в контексте, прямо скажи об этом
 
-    СГЕНЕРИРУЙ ОТВЕТ КАК АССИТСТЕНТ В ПЕРЕПИСКЕ С КЛИЕНТОМ:"""
-
-        answer = self._ask_ai(user_prompt, system_prompt)
-        return answer
\ No newline at end of file
+    СГЕНЕРИРУЙ ОТВЕТ КАК АССИТСТЕНТ В ПЕРЕПИСКЕ С КЛИЕНТОМ:"""
\ No newline at end of file
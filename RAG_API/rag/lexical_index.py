@@ -0,0 +1,247 @@
+"""
+Лексический (BM25) индекс чанков для гибридного поиска.
+
+Тексты нормализуются (нижний регистр, ё -> е, склейка разрядов чисел
+"8 100" -> "8100"), стоп-слова отбрасываются, русские слова приводятся
+к основе легким отсечением окончаний.
+
+Постинги хранятся массивами (CSR): для каждого термина - непрерывный срез
+номеров документов и частот, поэтому поиск по короткому запросу - несколько
+срезов и один bincount. Индекс хранится в npz файле рядом с векторной БД.
+"""
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+STOP_WORDS = {
+    "а", "без", "бы", "в", "во", "где", "да", "для", "до", "если", "есть", "же", "за", "и", "из",
+    "или", "как", "какая", "какие", "какой", "какое", "каким", "когда", "ко", "ли", "на", "над",
+    "не", "нет", "но", "о", "об", "от", "по", "под", "при", "с", "сколько", "со", "то", "у",
+    "что", "это", "я", "мы", "вы", "они", "он", "она", "оно", "мне", "нам", "вам",
+}
+
+# Окончания в порядке убывания длины: отсекается самое длинное подходящее
+SUFFIXES = sorted({
+    "иями", "ями", "ами", "иях", "ией", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ишь",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ых", "их", "ую", "юю", "ом",
+    "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ью", "ия", "ии", "ть", "ти", "ет", "ют", "ут",
+    "ит", "ат", "ят", "им", "ел", "ла", "ло", "ли",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+}, key=len, reverse=True)
+
+# Глагольные окончания отсекаются только от длинных слов: иначе короткие
+# глаголы совпадают с другими словами ("стоит" -> "сто")
+VERB_SUFFIXES = {"ешь", "ишь", "ть", "ти", "ет", "ют", "ут", "ит", "ат", "ят"}
+
+MIN_STEM_LENGTH = 3
+MIN_VERB_STEM_LENGTH = 4
+
+# Версия нормализации: индекс, построенный другой версией stem/tokenize, пересобирается
+TOKENIZER_VERSION = 2
+
+_NUMBER_GROUP_RE = re.compile(r"(?<=\d)[ \u00a0\u202f](?=\d{3}(?!\d))")
+_TOKEN_RE = re.compile(r"[a-zа-я]+|\d+(?:[.,]\d+)?")
+_CYRILLIC_RE = re.compile(r"^[а-я]+$")
+
+
+def stem(word: str) -> str:
+    """Легкий стемминг русского слова (латиница и числа не меняются)"""
+    if not _CYRILLIC_RE.match(word):
+        return word
+    for reflexive in ("ся", "сь"):
+        if word.endswith(reflexive) and len(word) - 2 >= MIN_STEM_LENGTH + 1:
+            word = word[:-2]
+            break
+    for suffix in SUFFIXES:
+        min_length = MIN_VERB_STEM_LENGTH if suffix in VERB_SUFFIXES else MIN_STEM_LENGTH
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_length:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Нормализованные термины текста для индексации и поиска"""
+    text = _NUMBER_GROUP_RE.sub("", text.lower().replace("ё", "е"))
+    terms = []
+    for token in _TOKEN_RE.findall(text):
+        if token in STOP_WORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        terms.append(stem(token))
+    return terms
+
+
+class LexicalIndex:
+    """BM25 индекс с постингами в массивах NumPy"""
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._terms: List[str] = []
+        self._doc_ids: List[str] = []
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._post_term = np.zeros(0, dtype=np.int32)
+        self._post_doc = np.zeros(0, dtype=np.int32)
+        self._post_tf = np.zeros(0, dtype=np.float32)
+        self._outdated = False
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self._outdated = "version" not in data or int(data["version"]) != TOKENIZER_VERSION
+        if self.exists():
+            with np.load(self.path) as data:
+                self._terms = data["terms"].tolist()
+                self._doc_ids = data["doc_ids"].tolist()
+                self._doc_len = data["doc_len"]
+                self._post_term = data["post_term"]
+                self._post_doc = data["post_doc"]
+                self._post_tf = data["post_tf"]
+        self._reindex()
+
+    def exists(self) -> bool:
+        """Есть ли на диске индекс текущей версии нормализации"""
+        return self.path.exists() and not self._outdated
+
+    def _reindex(self):
+        """Пересчитывает словари и границы постингов (постинги отсортированы по термину)"""
+        self._vocab = {term: i for i, term in enumerate(self._terms)}
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        self._indptr = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._post_term, minlength=len(self._terms)), out=self._indptr[1:])
+
+    def save(self):
+        """Атомарно записывает индекс на диск"""
+        with self._lock:
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(TOKENIZER_VERSION),
+                    terms=np.array(self._terms, dtype=str),
+                    doc_ids=np.array(self._doc_ids, dtype=str),
+                    doc_len=self._doc_len,
+                    post_term=self._post_term,
+                    post_doc=self._post_doc,
+                    post_tf=self._post_tf,
+                )
+            os.replace(tmp_path, self.path)
+            self._outdated = False
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Индексирует чанки (повторный id заменяет старый текст), без записи на диск"""
+        with self._lock:
+            self.remove([doc_id for doc_id in ids if doc_id in self._doc_index])
+
+            new_terms, new_docs, new_tfs, new_len = [], [], [], []
+            for offset, text in enumerate(texts):
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    term_id = self._vocab.get(term)
+                    if term_id is None:
+                        term_id = self._vocab[term] = len(self._terms)
+                        self._terms.append(term)
+                    new_terms.append(term_id)
+                    new_docs.append(len(self._doc_ids) + offset)
+                    new_tfs.append(tf)
+                new_len.append(sum(counts.values()))
+
+            post_term = np.concatenate([self._post_term, np.asarray(new_terms, dtype=np.int32)])
+            post_doc = np.concatenate([self._post_doc, np.asarray(new_docs, dtype=np.int32)])
+            order = np.lexsort((post_doc, post_term))
+            self._post_term = post_term[order]
+            self._post_doc = post_doc[order]
+            self._post_tf = np.concatenate([self._post_tf, np.asarray(new_tfs, dtype=np.float32)])[order]
+            self._doc_len = np.concatenate([self._doc_len, np.asarray(new_len, dtype=np.float32)])
+            self._doc_ids.extend(ids)
+            self._reindex()
+
+    def remove(self, ids: List[str]):
+        """Удаляет чанки из индекса, без записи на диск"""
+        with self._lock:
+            rows = [self._doc_index[doc_id] for doc_id in ids if doc_id in self._doc_index]
+            if not rows:
+                return
+            keep = np.ones(len(self._doc_ids), dtype=bool)
+            keep[rows] = False
+            remap = np.cumsum(keep, dtype=np.int64) - 1
+
+            keep_postings = keep[self._post_doc]
+            self._post_term = self._post_term[keep_postings]
+            self._post_doc = remap[self._post_doc[keep_postings]].astype(np.int32)
+            self._post_tf = self._post_tf[keep_postings]
+            self._doc_len = self._doc_len[keep]
+            self._doc_ids = [doc_id for doc_id, k in zip(self._doc_ids, keep) if k]
+            self._reindex()
+
+    def rebuild(self, ids: List[str], texts: List[str]):
+        """Строит индекс заново по содержимому коллекции"""
+        with self._lock:
+            self.clear()
+            self.add(ids, texts)
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._terms = []
+            self._doc_ids = []
+            self._doc_len = np.zeros(0, dtype=np.float32)
+            self._post_term = np.zeros(0, dtype=np.int32)
+            self._post_doc = np.zeros(0, dtype=np.int32)
+            self._post_tf = np.zeros(0, dtype=np.float32)
+            self._reindex()
+
+    def search(self, query: str, top_k: int = 10, k1: float = None, b: float = None) -> List[Dict]:
+        """BM25 поиск
+
+        Для каждого результата возвращает id, score и coverage - долю терминов
+        запроса, встречающихся в чанке. k1 и b по умолчанию берутся из индекса.
+        """
+        k1 = self.k1 if k1 is None else k1
+        b = self.b if b is None else b
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n_docs = len(self._doc_ids)
+            term_ids = [self._vocab[t] for t in query_terms if t in self._vocab]
+            if not n_docs or not term_ids:
+                return []
+            avg_len = float(self._doc_len.mean()) or 1.0
+            doc_norm = k1 * (1 - b + b * self._doc_len / avg_len)
+
+            docs, contributions = [], []
+            for term_id in term_ids:
+                start, end = self._indptr[term_id], self._indptr[term_id + 1]
+                if start == end:
+                    continue
+                term_docs = self._post_doc[start:end]
+                tf = self._post_tf[start:end]
+                df = end - start
+                idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+                docs.append(term_docs)
+                contributions.append(idf * tf * (k1 + 1) / (tf + doc_norm[term_docs]))
+            if not docs:
+                return []
+
+            docs = np.concatenate(docs)
+            scores = np.bincount(docs, weights=np.concatenate(contributions), minlength=n_docs)
+            matched = np.bincount(docs, minlength=n_docs)
+
+            candidates = np.flatnonzero(matched)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [
+                {
+                    "id": self._doc_ids[row],
+                    "score": float(scores[row]),
+                    "coverage": float(matched[row]) / len(query_terms),
+                }
+                for row in candidates
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"documents": len(self._doc_ids), "terms": len(self._terms), "postings": int(len(self._post_doc))}
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+class DocumentManifest:
+    """Манифест документов коллекции: id чанков каждого документа в sidecar JSON файле
+
+    Позволяет получать список документов и удалять документ без полного
+    сканирования коллекции: стоимость операций пропорциональна одному документу.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._documents: Dict[str, Dict] = {}
+        self._owner: Dict[str, str] = {}
+        if self.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._documents = data.get("documents", {})
+            self._reindex()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _reindex(self):
+        self._owner = {
+            chunk_id: name
+            for name, entry in self._documents.items()
+            for chunk_id in entry["chunk_ids"]
+        }
+
+    def save(self):
+        """Атомарно записывает манифест на диск"""
+        with self._lock:
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp_path.write_text(
+                json.dumps({"version": 1, "documents": self._documents}, ensure_ascii=False),
+                encoding="utf-8"
+            )
+            os.replace(tmp_path, self.path)
+
+    def rebuild(self, ids: List[str], metadatas: List[Dict]):
+        """Строит манифест заново по содержимому коллекции"""
+        with self._lock:
+            self._documents = {}
+            for chunk_id, metadata in zip(ids, metadatas):
+                name = (metadata or {}).get("document", "unknown")
+                entry = self._documents.setdefault(name, {"chunk_ids": [], "chunks_count": 0})
+                entry["chunk_ids"].append(chunk_id)
+                entry["chunks_count"] += 1
+            now = datetime.now().isoformat(timespec="seconds")
+            for entry in self._documents.values():
+                entry["updated_at"] = now
+            self._reindex()
+            self.save()
+
+    def documents(self) -> Dict[str, int]:
+        """Количество чанков для каждого документа"""
+        with self._lock:
+            return {name: entry["chunks_count"] for name, entry in self._documents.items()}
+
+    def chunk_ids(self, document_name: str) -> Optional[List[str]]:
+        """id чанков документа или None, если документа нет"""
+        with self._lock:
+            entry = self._documents.get(document_name)
+            return list(entry["chunk_ids"]) if entry else None
+
+    def content_hash(self, document_name: str) -> Optional[str]:
+        """Хэш содержимого документа или None, если документа нет
+
+        id чанков адресуются содержимым (см. split_document), поэтому хэш их
+        набора меняется при любом изменении записанных чанков документа.
+        """
+        with self._lock:
+            entry = self._documents.get(document_name)
+            if not entry:
+                return None
+            return hashlib.sha1("\n".join(sorted(entry["chunk_ids"])).encode("utf-8")).hexdigest()
+
+    def add_chunks(self, document_name: str, chunk_ids: Iterable[str]):
+        """Регистрирует чанки документа (без записи на диск)"""
+        with self._lock:
+            entry = self._documents.setdefault(document_name, {"chunk_ids": [], "chunks_count": 0})
+            known = set(entry["chunk_ids"])
+            for chunk_id in chunk_ids:
+                if chunk_id not in known:
+                    entry["chunk_ids"].append(chunk_id)
+                    known.add(chunk_id)
+                    self._owner[chunk_id] = document_name
+            entry["chunks_count"] = len(entry["chunk_ids"])
+            entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+
+    def remove_chunks(self, chunk_ids: Iterable[str]):
+        """Удаляет чанки из манифеста (без записи на диск)"""
+        with self._lock:
+            removed: Dict[str, set] = {}
+            for chunk_id in chunk_ids:
+                name = self._owner.pop(chunk_id, None)
+                if name is not None:
+                    removed.setdefault(name, set()).add(chunk_id)
+            for name, ids in removed.items():
+                entry = self._documents[name]
+                entry["chunk_ids"] = [i for i in entry["chunk_ids"] if i not in ids]
+                entry["chunks_count"] = len(entry["chunk_ids"])
+                entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+                if not entry["chunk_ids"]:
+                    del self._documents[name]
+
+    def remove_document(self, document_name: str):
+        """Удаляет документ из манифеста (без записи на диск)"""
+        with self._lock:
+            entry = self._documents.pop(document_name, None)
+            if entry:
+                for chunk_id in entry["chunk_ids"]:
+                    self._owner.pop(chunk_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._documents = {}
+            self._owner = {}
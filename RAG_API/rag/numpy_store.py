@@ -0,0 +1,423 @@
+"""
+Плоский NumPy индекс как альтернатива ChromaDB для небольших баз знаний.
+
+Все эмбеддинги коллекции хранятся одной непрерывной матрицей (float32 или
+float16), отображаемой в память с диска. Поиск точный: одно матричное
+умножение и argpartition. Метаданные хранятся по колонкам в numpy массивах,
+фильтры where вычисляются векторно.
+
+Каждое изменение сохраняется новым поколением файлов целиком (O(N) на
+запись), поэтому изменения одной операции группируются блоком deferred
+(VectorStore.bulk_write): одна запись на загрузку, а не на каждый батч.
+
+NumpyClient и NumpyCollection повторяют используемую часть API ChromaDB,
+поэтому VectorStore работает с ними так же, как с PersistentClient.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+CURRENT_FILE = "CURRENT"
+
+
+class NumpyCollection:
+    """Коллекция с точным поиском по матрице эмбеддингов"""
+
+    def __init__(self, path: Path, name: str, dtype: str = "float32", metadata: Optional[Dict] = None):
+        self.path = path
+        self.name = name
+        self.metadata = metadata or {}
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._deferred = 0
+        self._dirty = False
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ---------- хранение ----------
+
+    def _load(self):
+        current = self.path / CURRENT_FILE
+        ids, documents, columns = [], [], {}
+        embeddings = np.zeros((0, 0), dtype=self.dtype)
+
+        if current.exists():
+            generation = self.path / current.read_text().strip()
+            embeddings = np.load(generation / "embeddings.npy", mmap_mode="r")
+            ids = json.loads((generation / "ids.json").read_text(encoding="utf-8"))
+            documents = json.loads((generation / "documents.json").read_text(encoding="utf-8"))
+            with np.load(generation / "metadata.npz") as arrays:
+                columns = {key: arrays[key] for key in arrays.files}
+
+        self._set_state(ids, embeddings, documents, columns)
+
+    def _set_state(self, ids: List[str], embeddings: np.ndarray, documents: List[str], columns: Dict[str, np.ndarray]):
+        self._ids: List[str] = ids
+        self._documents: List[str] = documents
+        self._embeddings = embeddings
+        self._columns: Dict[str, np.ndarray] = {}
+        self._present: Dict[str, np.ndarray] = {}
+        for key, values in columns.items():
+            kind, column = key.split("__", 1)
+            target = self._columns if kind == "col" else self._present
+            target[column] = values
+
+        self._id_index = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._sq_norms = np.einsum("ij,ij->i", self._embeddings, self._embeddings, dtype=np.float32)
+
+    def _persist(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        """Атомарно записывает новое поколение индекса и переключает указатель CURRENT
+
+        Внутри deferred изменения остаются в памяти и записываются при выходе из блока.
+        """
+        if self._deferred:
+            self._set_state(
+                ids, np.ascontiguousarray(embeddings, dtype=self.dtype), documents, self._build_columns(metadatas)
+            )
+            self._dirty = True
+            return
+
+        generation = f"gen-{uuid.uuid4().hex[:12]}"
+        target = self.path / generation
+        target.mkdir()
+
+        np.save(target / "embeddings.npy", np.ascontiguousarray(embeddings, dtype=self.dtype))
+        (target / "ids.json").write_text(json.dumps(ids, ensure_ascii=False), encoding="utf-8")
+        (target / "documents.json").write_text(json.dumps(documents, ensure_ascii=False), encoding="utf-8")
+        np.savez(target / "metadata.npz", **self._build_columns(metadatas))
+
+        tmp_current = self.path / f"{CURRENT_FILE}.tmp"
+        tmp_current.write_text(generation)
+        os.replace(tmp_current, self.path / CURRENT_FILE)
+
+        for old in self.path.glob("gen-*"):
+            if old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+        self._dirty = False
+        self._load()
+
+    @contextmanager
+    def deferred(self):
+        """Откладывает запись на диск до конца блока: серия upsert пишет одно поколение
+
+        Без этого каждый upsert переписывает всю матрицу и метаданные.
+        """
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self._persist(list(self._ids), self._embeddings, list(self._documents), self._all_metadatas())
+
+    @staticmethod
+    def _build_columns(metadatas: List[Dict]) -> Dict[str, np.ndarray]:
+        """Раскладывает список словарей метаданных в колонки и маски присутствия"""
+        names = sorted({key for metadata in metadatas for key in metadata})
+        arrays = {}
+        for name in names:
+            values = [metadata.get(name) for metadata in metadatas]
+            present = np.array([v is not None for v in values], dtype=bool)
+            kinds = {type(v) for v in values if v is not None}
+            if kinds <= {bool}:
+                column = np.array([bool(v) if v is not None else False for v in values], dtype=bool)
+            elif kinds <= {int}:
+                column = np.array([v if v is not None else 0 for v in values], dtype=np.int64)
+            elif kinds <= {int, float}:
+                column = np.array([v if v is not None else 0.0 for v in values], dtype=np.float64)
+            else:
+                column = np.array([str(v) if v is not None else "" for v in values], dtype=str)
+            arrays[f"col__{name}"] = column
+            arrays[f"mask__{name}"] = present
+        return arrays
+
+    def _metadata(self, row: int) -> Dict:
+        metadata = {}
+        for name, column in self._columns.items():
+            if self._present[name][row]:
+                metadata[name] = column[row].item()
+        return metadata
+
+    def _all_metadatas(self) -> List[Dict]:
+        return [self._metadata(i) for i in range(len(self._ids))]
+
+    # ---------- фильтры ----------
+
+    def _match(self, where: Optional[Dict], where_document: Optional[Dict]) -> Optional[np.ndarray]:
+        mask = None
+        if where:
+            mask = self._eval_where(where)
+        if where_document:
+            doc_mask = self._eval_where_document(where_document)
+            mask = doc_mask if mask is None else mask & doc_mask
+        return mask
+
+    def _eval_where(self, where: Dict) -> np.ndarray:
+        n = len(self._ids)
+        mask = np.ones(n, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._eval_where(sub)
+            elif key == "$or":
+                sub_mask = np.zeros(n, dtype=bool)
+                for sub in condition:
+                    sub_mask |= self._eval_where(sub)
+                mask &= sub_mask
+            else:
+                mask &= self._eval_condition(key, condition)
+        return mask
+
+    def _eval_condition(self, name: str, condition) -> np.ndarray:
+        n = len(self._ids)
+        if name not in self._columns:
+            return np.zeros(n, dtype=bool)
+        column, present = self._columns[name], self._present[name]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = present.copy()
+        for op, value in condition.items():
+            if op == "$eq":
+                mask &= column == value
+            elif op == "$ne":
+                mask &= column != value
+            elif op == "$gt":
+                mask &= column > value
+            elif op == "$gte":
+                mask &= column >= value
+            elif op == "$lt":
+                mask &= column < value
+            elif op == "$lte":
+                mask &= column <= value
+            elif op == "$in":
+                mask &= np.isin(column, list(value))
+            elif op == "$nin":
+                mask &= ~np.isin(column, list(value))
+            else:
+                raise ValueError(f"Неподдерживаемый оператор фильтра: {op}")
+        return mask
+
+    def _eval_where_document(self, where_document: Dict) -> np.ndarray:
+        mask = np.ones(len(self._ids), dtype=bool)
+        for op, value in where_document.items():
+            if op == "$contains":
+                mask &= np.array([value in doc for doc in self._documents], dtype=bool)
+            elif op == "$not_contains":
+                mask &= np.array([value not in doc for doc in self._documents], dtype=bool)
+            elif op == "$and":
+                for sub in value:
+                    mask &= self._eval_where_document(sub)
+            elif op == "$or":
+                sub_mask = np.zeros(len(self._ids), dtype=bool)
+                for sub in value:
+                    sub_mask |= self._eval_where_document(sub)
+                mask &= sub_mask
+            else:
+                raise ValueError(f"Неподдерживаемый оператор фильтра документа: {op}")
+        return mask
+
+    # ---------- API коллекции ----------
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def upsert(
+            self,
+            ids: List[str],
+            embeddings: Optional[List[List[float]]] = None,
+            metadatas: Optional[List[Dict]] = None,
+            documents: Optional[List[str]] = None,
+    ):
+        """Добавляет записи или заменяет существующие с теми же id"""
+        with self._lock:
+            all_ids = list(self._ids)
+            all_documents = list(self._documents)
+            all_metadatas = self._all_metadatas()
+            new_embeddings = np.asarray(embeddings, dtype=np.float32) if embeddings is not None else None
+            if len(self._ids) and new_embeddings is not None:
+                matrix = np.vstack([np.asarray(self._embeddings, dtype=np.float32),
+                                    np.zeros((len(ids), self._embeddings.shape[1]), dtype=np.float32)])
+            elif new_embeddings is not None:
+                matrix = np.zeros((len(ids), new_embeddings.shape[1]), dtype=np.float32)
+            else:
+                matrix = np.asarray(self._embeddings, dtype=np.float32).copy()
+
+            index = dict(self._id_index)
+            appended = 0
+            for i, doc_id in enumerate(ids):
+                row = index.get(doc_id)
+                if row is None:
+                    if new_embeddings is None:
+                        raise ValueError(f"Для новой записи {doc_id} нужен эмбеддинг")
+                    row = len(all_ids)
+                    index[doc_id] = row
+                    all_ids.append(doc_id)
+                    all_documents.append("")
+                    all_metadatas.append({})
+                    appended += 1
+                if new_embeddings is not None:
+                    matrix[row] = new_embeddings[i]
+                if documents is not None:
+                    all_documents[row] = documents[i]
+                if metadatas is not None:
+                    all_metadatas[row] = dict(metadatas[i])
+
+            matrix = matrix[:len(all_ids)]
+            self._persist(all_ids, matrix, all_documents, all_metadatas)
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        with self._lock:
+            known = [i for i, doc_id in enumerate(ids) if doc_id in self._id_index]
+            if not known:
+                return
+            self.upsert(
+                ids=[ids[i] for i in known],
+                embeddings=[embeddings[i] for i in known] if embeddings is not None else None,
+                metadatas=[metadatas[i] for i in known] if metadatas is not None else None,
+                documents=[documents[i] for i in known] if documents is not None else None,
+            )
+
+    def _select(self, ids: Optional[List[str]], where: Optional[Dict], where_document: Optional[Dict]) -> np.ndarray:
+        if ids is not None:
+            rows = np.array([self._id_index[i] for i in ids if i in self._id_index], dtype=np.int64)
+        else:
+            rows = np.arange(len(self._ids))
+        mask = self._match(where, where_document)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows
+
+    def get(
+            self,
+            ids: Optional[List[str]] = None,
+            where: Optional[Dict] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            where_document: Optional[Dict] = None,
+            include: List[str] = ("metadatas", "documents"),
+    ) -> Dict:
+        with self._lock:
+            rows = self._select(ids, where, where_document)
+            if offset:
+                rows = rows[offset:]
+            if limit is not None:
+                rows = rows[:limit]
+            return {
+                "ids": [self._ids[r] for r in rows],
+                "embeddings": [np.asarray(self._embeddings[r], dtype=np.float32) for r in rows]
+                if "embeddings" in include else None,
+                "documents": [self._documents[r] for r in rows] if "documents" in include else None,
+                "metadatas": [self._metadata(r) for r in rows] if "metadatas" in include else None,
+            }
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        with self._lock:
+            if ids is None and where is None:
+                return
+            removed = set(self._select(ids, where, None).tolist())
+            if not removed:
+                return
+            keep = [i for i in range(len(self._ids)) if i not in removed]
+            metadatas = self._all_metadatas()
+            self._persist(
+                [self._ids[i] for i in keep],
+                np.asarray(self._embeddings, dtype=np.float32)[keep],
+                [self._documents[i] for i in keep],
+                [metadatas[i] for i in keep],
+            )
+
+    def query(
+            self,
+            query_embeddings: List[List[float]],
+            n_results: int = 10,
+            where: Optional[Dict] = None,
+            where_document: Optional[Dict] = None,
+            include: List[str] = ("metadatas", "documents", "distances"),
+    ) -> Dict:
+        """Точный top-k поиск по квадрату евклидова расстояния (как l2 в ChromaDB)"""
+        with self._lock:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if queries.ndim == 1:
+                queries = queries[None, :]
+
+            rows = np.arange(len(self._ids))
+            mask = self._match(where, where_document)
+            if mask is not None:
+                rows = rows[mask]
+
+            k = min(n_results, len(rows))
+            result = {key: [] for key in ("ids", "embeddings", "documents", "metadatas", "distances")}
+            if k == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+            else:
+                matrix = self._embeddings if mask is None else self._embeddings[rows]
+                sq_norms = self._sq_norms if mask is None else self._sq_norms[rows]
+                dots = queries @ np.asarray(matrix, dtype=np.float32).T
+                distances = np.einsum("ij,ij->i", queries, queries)[:, None] + sq_norms[None, :] - 2.0 * dots
+                np.maximum(distances, 0.0, out=distances)
+
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                for q in range(len(queries)):
+                    order = top[q][np.argsort(distances[q, top[q]], kind="stable")]
+                    selected = rows[order]
+                    result["ids"].append([self._ids[r] for r in selected])
+                    result["distances"].append(distances[q, order].tolist())
+                    result["documents"].append([self._documents[r] for r in selected])
+                    result["metadatas"].append([self._metadata(r) for r in selected])
+                    result["embeddings"].append(
+                        [np.asarray(self._embeddings[r], dtype=np.float32) for r in selected]
+                    )
+
+            for key in ("embeddings", "documents", "metadatas", "distances"):
+                if key not in include:
+                    result[key] = None
+            return result
+
+
+class NumpyClient:
+    """Клиент с интерфейсом PersistentClient для коллекций NumpyCollection"""
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dtype = dtype
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyCollection(self.path / name, name, self.dtype, metadata)
+            return self._collections[name]
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            collection_path = self.path / name
+            if not collection_path.exists():
+                raise ValueError(f"Коллекция {name} не существует")
+            shutil.rmtree(collection_path)
+
+    def list_collections(self) -> List[NumpyCollection]:
+        """Коллекции каталога: записанные на диск или открытые этим клиентом
+        
+        Другие подкаталоги (например, исходные тексты SourceStore) не коллекции.
+        """
+        return [
+            self.get_or_create_collection(p.name)
+            for p in sorted(self.path.iterdir())
+            if p.is_dir() and ((p / CURRENT_FILE).exists() or p.name in self._collections)
+        ]
@@ -0,0 +1,176 @@
+"""
+ONNX Runtime бэкенд эмбеддингов: динамически квантованная (int8) версия
+sentence-transformers модели для CPU.
+
+Экспорт модели:
+    python -m RAG_API.rag.onnx_backend --output RAG_API/onnx_model
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import List
+import numpy as np
+
+MODEL_FILE = "model_int8.onnx"
+META_FILE = "embedding_meta.json"
+
+
+def default_model_dir() -> str:
+    """Путь к экспортированной модели по умолчанию"""
+    try:
+        from RAG_API.app.core.config import ONNX_MODEL_DIR
+        return str(ONNX_MODEL_DIR)
+    except ImportError:
+        return str(Path(__file__).parent.parent / "onnx_model")
+
+
+class OnnxEmbeddingModel:
+    """Модель эмбеддингов на onnxruntime с интерфейсом SentenceTransformer.encode"""
+
+    def __init__(self, model_dir: str = None, expected_model_name: str = None, num_threads: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir or default_model_dir())
+        meta_path = model_dir / META_FILE
+        if not meta_path.exists():
+            raise FileNotFoundError(
+                f"ONNX модель не найдена в {model_dir}. "
+                f"Выполните экспорт: python -m RAG_API.rag.onnx_backend --output {model_dir}"
+            )
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+
+        # Эмбеддинги должны быть совместимы с уже загруженными в коллекцию
+        if expected_model_name and self.meta["model_name"] != expected_model_name:
+            raise ValueError(
+                f"ONNX модель экспортирована из {self.meta['model_name']}, "
+                f"а в конфигурации указана {expected_model_name}"
+            )
+
+        if num_threads is None:
+            num_threads = int(os.getenv("OMP_NUM_THREADS", "2"))
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            str(model_dir / MODEL_FILE),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_seq_length = self.meta.get("max_seq_length", 128)
+        self.pooling = self.meta.get("pooling", "mean")
+
+    def _pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return token_embeddings[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = True,
+        convert_to_numpy: bool = True,
+    ) -> np.ndarray:
+        """Создает эмбеддинги (совместимо с SentenceTransformer.encode)"""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        all_embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            inputs = {
+                name: encoded[name].astype(np.int64)
+                for name in ("input_ids", "attention_mask", "token_type_ids")
+                if name in self._input_names and name in encoded
+            }
+            token_embeddings = self.session.run(None, inputs)[0]
+            embeddings = self._pool(token_embeddings, encoded["attention_mask"])
+            if normalize_embeddings:
+                embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            all_embeddings.append(embeddings.astype(np.float32))
+
+        if not all_embeddings:
+            return np.zeros((0, self.meta.get("dimension", 0)), dtype=np.float32)
+        return np.vstack(all_embeddings)
+
+
+def export_quantized_model(model_name: str, output_dir: str, opset: int = 14) -> Path:
+    """Экспортирует sentence-transformers модель в ONNX и квантует веса в int8"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    st_model.eval()
+    transformer = st_model[0].auto_model
+    tokenizer = st_model.tokenizer
+    pooling = "cls" if st_model[1].pooling_mode_cls_token else "mean"
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    dummy = tokenizer(["Пример текста для экспорта"], return_tensors="pt")
+    fp32_path = output_dir / "model_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+
+    quantize_dynamic(str(fp32_path), str(output_dir / MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    tokenizer.save_pretrained(str(output_dir))
+    (output_dir / META_FILE).write_text(json.dumps({
+        "model_name": model_name,
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": pooling,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    return output_dir / MODEL_FILE
+
+
+if __name__ == "__main__":
+    from RAG_API.rag.config import DEFAULT_CONFIG
+
+    parser = argparse.ArgumentParser(description="Экспорт модели эмбеддингов в квантованный ONNX")
+    parser.add_argument("--model", default=DEFAULT_CONFIG.embedding.model_name)
+    parser.add_argument("--output", default=default_model_dir())
+    args = parser.parse_args()
+
+    path = export_quantized_model(args.model, args.output)
+    print(f"✅ Модель экспортирована: {path}")
@@ -1,10 +1,20 @@
 from typing import List, Dict
+import numpy as np
 from RAG_API.rag.embedding_service import EmbeddingService
 from RAG_API.rag.vector_store import VectorStore
 from RAG_API.rag.reranker import Reranker
 from RAG_API.rag.config import RetrievalConfig
 
 
+def cosine_from_distance(distance: float) -> float:
+    """Косинусное сходство по квадрату L2 дистанции (как в ChromaDB и NumpyCollection)
+
+    Эмбеддинги нормализованы (EmbeddingConfig.normalize_embeddings), поэтому
+    d = |q - x|^2 = 2 - 2 cos.
+    """
+    return 1.0 - distance / 2.0
+
+
 class QueryProcessor:
     """Обработка запросов с использованием лучших практик RAG"""
     
@@ -50,121 +60,178 @@ class QueryProcessor:
         
         return unique_variations[:max_variations]
     
-    def multi_query_search(self, query: str, n_results: int = None) -> List[Dict]:
-        """Multi-query поиск: объединяет результаты от разных вариантов запроса"""
-        if n_results is None:
-            n_results = self.config.n_results
+    def multi_query_search(self, query: str, candidates_per_query: int = None, top_k: int = None) -> List[Dict]:
+        """Этапы 1-2 плана поиска: генерация кандидатов и их слияние
         
-        if not self.config.use_multi_query:
-            query_embedding = self.embedding_service.encode_query(query)
-            results = self.vector_store.search(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=n_results
-            )
-            return self._format_search_results(results)
-        
-        # Multi-query поиск
-        query_variations = self.generate_query_variations(query)
-        all_results = []
-        seen_docs = set()
-        
-        # Ищем по каждому варианту запроса
-        for variation in query_variations:
-            query_embedding = self.embedding_service.encode_query(variation)
-            var_results = self.vector_store.search(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=n_results * 2  # Берем больше для объединения
-            )
-            
-            # Добавляем результаты, избегая дубликатов
-            for i, doc in enumerate(var_results["documents"][0]):
-                doc_hash = hash(doc[:100])
-                if doc_hash not in seen_docs:
-                    all_results.append({
-                        "document": doc,
-                        "metadata": var_results["metadatas"][0][i],
-                        "distance": var_results["distances"][0][i],
-                        "query_variation": variation,
-                    })
-                    seen_docs.add(doc_hash)
-        
-        # Re-ranking для объединения результатов
-        if self.reranker and len(all_results) > 1:
-            documents = [r["document"] for r in all_results]
-            distances = [r["distance"] for r in all_results]
-            
-            reranked = self.reranker.rerank(
-                query,
-                documents,
-                distances,
-                top_k=n_results
+        Все варианты запроса кодируются одним батчем и отправляются в векторную БД
+        одним запросом. Кандидаты BM25 индекса добавляются отдельным списком;
+        списки объединяются через reciprocal rank fusion. Если лучший BM25 чанк
+        содержит все термины запроса, варианты запроса не генерируются и векторных
+        кандидатов запрашивается меньше.
+        """
+        if candidates_per_query is None:
+            candidates_per_query = self.config.candidates_per_query
+        if top_k is None:
+            top_k = self.config.fusion_top_k
+        
+        lexical_hits = []
+        if self.config.use_hybrid_search:
+            lexical_hits = self.vector_store.lexical_search(
+                query, self.config.lexical_top_k, k1=self.config.bm25_k1, b=self.config.bm25_b
             )
-            
-            # Обновляем результаты с новыми similarity
-            for i, rerank_result in enumerate(reranked):
-                orig_result = all_results[rerank_result["rank"]]
-                orig_result["similarity"] = rerank_result["similarity"]
-                orig_result["reranked"] = True
-            all_results.sort(key=lambda x: x.get("similarity", 1.0 / (1.0 + x["distance"])), reverse=True)
+        lexical_confident = bool(lexical_hits) and lexical_hits[0]["coverage"] >= self.config.lexical_confident_coverage
+        
+        if self.config.use_multi_query and not lexical_confident:
+            query_variations = self.generate_query_variations(query)
         else:
-            all_results.sort(key=lambda x: x["distance"])
-
-        return all_results[:n_results]
+            query_variations = [query]
+        if lexical_confident:
+            candidates_per_query = min(candidates_per_query, self.config.confident_candidates_per_query)
+        
+        query_embeddings = self.embedding_service.encode_queries(query_variations)
+        var_results = self.vector_store.search(
+            query_embeddings=query_embeddings.tolist(),
+            n_results=candidates_per_query
+        )
+        weights = [1.0] * len(query_variations)
+        
+        if lexical_hits:
+            lexical_results = self._lexical_results(lexical_hits, query_embeddings[0])
+            for key in ("ids", "documents", "metadatas", "distances", "embeddings"):
+                if var_results.get(key) is not None:
+                    var_results[key] = list(var_results[key]) + [lexical_results[key]]
+            query_variations = query_variations + ["bm25"]
+            weights.append(self.config.lexical_weight)
+        
+        return self._fuse_results(var_results, query_variations, weights)[:top_k]
+    
+    def _lexical_results(self, hits: List[Dict], query_embedding: np.ndarray) -> Dict:
+        """Список кандидатов BM25 в формате результата векторного поиска
+        
+        Дистанции считаются по сохранённым эмбеддингам чанков так же, как в
+        векторной БД (квадрат L2), чтобы порог и re-ranking работали одинаково.
+        """
+        fetched = self.vector_store.get_chunks([hit["id"] for hit in hits])
+        position = {doc_id: i for i, doc_id in enumerate(fetched["ids"])}
+        rows = [position[hit["id"]] for hit in hits if hit["id"] in position]
+        
+        embeddings = [np.asarray(fetched["embeddings"][r], dtype=np.float32) for r in rows]
+        if embeddings:
+            diff = np.vstack(embeddings) - np.asarray(query_embedding, dtype=np.float32)
+            distances = np.einsum("ij,ij->i", diff, diff).tolist()
+        else:
+            distances = []
+        return {
+            "ids": [fetched["ids"][r] for r in rows],
+            "documents": [fetched["documents"][r] for r in rows],
+            "metadatas": [fetched["metadatas"][r] for r in rows],
+            "distances": distances,
+            "embeddings": embeddings,
+        }
     
-    def _format_search_results(self, results: Dict) -> List[Dict]:
-        """Форматирует результаты поиска"""
-        formatted = []
-        for i, (doc, metadata, distance) in enumerate(zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0]
-        )):
-            similarity = 1.0 / (1.0 + distance)
-            formatted.append({
-                "document": doc,
-                "metadata": metadata,
-                "distance": distance,
-                "similarity": similarity,
+    def _fuse_results(self, results: Dict, query_variations: List[str], weights: List[float] = None) -> List[Dict]:
+        """Объединяет списки кандидатов через взвешенный reciprocal rank fusion по id чанка"""
+        ids_per_query = results["ids"]
+        flat_ids = [doc_id for ids in ids_per_query for doc_id in ids]
+        if not flat_ids:
+            return []
+        if weights is None:
+            weights = [1.0] * len(ids_per_query)
+        
+        flat_documents = [doc for docs in results["documents"] for doc in docs]
+        flat_metadatas = [meta for metas in results["metadatas"] for meta in metas]
+        flat_distances = np.concatenate([np.asarray(d, dtype=np.float64) for d in results["distances"]])
+        ranks = np.concatenate([np.arange(len(ids)) for ids in ids_per_query])
+        query_index = np.concatenate([np.full(len(ids), q) for q, ids in enumerate(ids_per_query)])
+        flat_weights = np.asarray(weights, dtype=np.float64)[query_index]
+        
+        stored_embeddings = results.get("embeddings")
+        flat_embeddings = None
+        if stored_embeddings is not None and all(e is not None for e in stored_embeddings):
+            flat_embeddings = [emb for embs in stored_embeddings for emb in embs]
+        
+        unique_ids, inverse = np.unique(np.asarray(flat_ids), return_inverse=True)
+        
+        # RRF: score(d) = sum(w_q / (k + rank_q(d))) по всем спискам кандидатов
+        scores = np.zeros(len(unique_ids), dtype=np.float64)
+        np.add.at(scores, inverse, flat_weights / (self.config.rrf_k + ranks + 1))
+        
+        # Для каждого чанка берем вхождение с наименьшей дистанцией
+        order = np.lexsort((flat_distances, inverse))
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = inverse[order][1:] != inverse[order][:-1]
+        best_position = order[group_start]
+        
+        fused = []
+        for u in np.argsort(-scores, kind="stable"):
+            pos = best_position[u]
+            fused.append({
+                "id": flat_ids[pos],
+                "document": flat_documents[pos],
+                "metadata": flat_metadatas[pos],
+                "distance": float(flat_distances[pos]),
+                "embedding": flat_embeddings[pos] if flat_embeddings is not None else None,
+                "query_variation": query_variations[query_index[pos]],
+                "fusion_score": float(scores[u]),
+                "similarity": cosine_from_distance(float(flat_distances[pos])),
             })
-        return formatted
+        return fused
+    
+    @staticmethod
+    def _stored_embeddings(results: List[Dict]):
+        """Возвращает эмбеддинги кандидатов, если они есть у всех результатов"""
+        embeddings = [r.get("embedding") for r in results]
+        if any(e is None for e in embeddings):
+            return None
+        return embeddings
+    
+    def _rerank(self, query: str, candidates: List[Dict]) -> List[Dict]:
+        """Этап 3 плана поиска: однократный re-ranking кандидатов
+        
+        Оценка reranker сохраняется в rerank_score и задает только порядок;
+        similarity остается косинусным сходством запроса и чанка, поэтому порог
+        min_similarity_threshold одинаково работает с re-ranking и без него.
+        """
+        reranked = self.reranker.rerank(
+            query,
+            [c["document"] for c in candidates],
+            [c["distance"] for c in candidates],
+            embeddings=self._stored_embeddings(candidates)
+        )
+        
+        results = []
+        for rerank_result in reranked:
+            candidate = candidates[rerank_result["rank"]]
+            candidate["rerank_score"] = rerank_result["rerank_score"]
+            candidate["reranked"] = True
+            results.append(candidate)
+        return results
     
     def search(self, query: str, n_results: int = None, use_reranking: bool = None) -> List[Dict]:
-        """Основной метод поиска"""
+        """Основной метод поиска
+        
+        План поиска: генерация кандидатов -> слияние -> re-ranking -> порог -> top-k.
+        Размер каждого этапа ограничен бюджетом из RetrievalConfig.
+        """
         if n_results is None:
             n_results = self.config.n_results
         if use_reranking is None:
             use_reranking = self.config.use_reranking
         
-        # Multi-query поиск
-        results = self.multi_query_search(query, n_results * 2 if use_reranking else n_results)
+        # 1-2. Генерация кандидатов и слияние
+        candidates = self.multi_query_search(
+            query,
+            candidates_per_query=max(self.config.candidates_per_query, n_results),
+            top_k=max(self.config.fusion_top_k, n_results)
+        )
         
-        # Дополнительный re-ranking если включен
-        if use_reranking and self.reranker and len(results) > 1:
-            documents = [r["document"] for r in results]
-            distances = [r["distance"] for r in results]
-            
-            reranked = self.reranker.rerank(
-                query,
-                documents,
-                distances,
-                top_k=self.config.rerank_top_k
-            )
-
-            reranked_map = {r["rank"]: r for r in reranked}
-            for i, result in enumerate(results):
-                if i in reranked_map:
-                    result["similarity"] = reranked_map[i]["similarity"]
-                    result["reranked"] = True
-            
-            # Пересортируем
-            results.sort(key=lambda x: x.get("similarity", 1.0 / (1.0 + x["distance"])), reverse=True)
+        # 3. Re-ranking (один раз, на ограниченном наборе кандидатов)
+        if use_reranking and self.reranker and len(candidates) > 1:
+            rerank_budget = max(self.config.rerank_top_k, n_results)
+            candidates = self._rerank(query, candidates[:rerank_budget])
         
-        # Фильтрация по порогу релевантности
-        filtered_results = []
-        for result in results:
-            similarity = result.get("similarity", 1.0 / (1.0 + result["distance"]))
-            if similarity >= self.config.min_similarity_threshold:
-                filtered_results.append(result)
+        # 4. Фильтрация по порогу релевантности
+        candidates = [c for c in candidates if c["similarity"] >= self.config.min_similarity_threshold]
         
-        return filtered_results[:n_results]
-
+        # 5. Top-k
+        return candidates[:n_results]
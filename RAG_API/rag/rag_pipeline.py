@@ -1,10 +1,24 @@
-from typing import Dict
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
 from RAG_API.rag.config import RAGConfig, DEFAULT_CONFIG
 from RAG_API.rag.document_processor import document_to_markdown, split_document
 from RAG_API.rag.embedding_service import EmbeddingService
 from RAG_API.rag.vector_store import VectorStore
 from RAG_API.rag.query_processor import QueryProcessor
-from RAG_API.rag.reranker import Reranker
+from RAG_API.rag.reranker import CrossEncoderReranker, create_reranker
+
+# Настройки, при изменении которых компонент нужно создать заново
+EMBEDDING_MODEL_FIELDS = ("model_name", "backend", "onnx_model_dir")
+VECTOR_STORE_FIELDS = ("vector_store_backend", "numpy_index_dtype")
+RERANKER_FIELDS = (
+    "use_reranking", "reranker_type", "cross_encoder_model",
+    "cross_encoder_max_length", "cross_encoder_quantize",
+)
+
+
+def _changed(old, new, fields) -> bool:
+    return any(getattr(old, field) != getattr(new, field) for field in fields)
 
 
 class RAGPipeline:
@@ -14,69 +28,388 @@ class RAGPipeline:
         if config is None:
             config = DEFAULT_CONFIG
         
+        embedding_service = EmbeddingService(config.embedding)
+        # Путь к БД берется из конфигурации приложения по выбранному бэкенду
+        vector_store = VectorStore(config=config.retrieval)
+        reranker = (
+            create_reranker(config.retrieval, embedding_service)
+            if config.retrieval.use_reranking else None
+        )
+        self._assemble(config, embedding_service, vector_store, reranker)
+    
+    def _assemble(self, config: RAGConfig, embedding_service, vector_store, reranker):
         self.config = config
-        self.embedding_service = EmbeddingService(config.embedding)
-        
-        # Получаем путь к БД из конфигурации
-        try:
-            from RAG_API.app.core.config import CHROMA_DB_PATH
-            db_path = str(CHROMA_DB_PATH)
-        except ImportError:
-            # Fallback на относительный путь
-            from pathlib import Path
-            db_path = str(Path(__file__).parent.parent / "chroma_db")
-        
-        self.vector_store = VectorStore(db_path=db_path, config=config.retrieval)
-        self.reranker = Reranker(self.embedding_service) if config.retrieval.use_reranking else None
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.reranker = reranker
         self.query_processor = QueryProcessor(
-            self.embedding_service,
-            self.vector_store,
-            self.reranker,
+            embedding_service,
+            vector_store,
+            reranker,
             config.retrieval
         )
     
-    def ingest_document(self, document_path: str) -> int:
-        """Загружает документ в векторную БД с оптимизацией памяти"""
+    def reconfigure(self, config: RAGConfig) -> "RAGPipeline":
+        """Возвращает пайплайн с новой конфигурацией, переиспользуя тяжелые компоненты
+        
+        Компоненты текущего пайплайна не меняются: запросы в процессе
+        выполнения дорабатывают со старыми настройками. Новые сервис
+        эмбеддингов и re-ranker делят с текущими уже загруженные модели, если
+        не изменились влияющие на них настройки. Векторная БД - общее
+        хранилище и переиспользуется; параметры поиска по ней (n_results,
+        BM25 k1 и b) QueryProcessor передает из своей конфигурации.
+        Пересозданные модели загружаются здесь, до того как новый пайплайн
+        начнет обслуживать запросы.
+        """
+        if _changed(self.config.embedding, config.embedding, EMBEDDING_MODEL_FIELDS):
+            embedding_service = EmbeddingService(config.embedding)
+            embedding_service.model
+        else:
+            embedding_service = self.embedding_service.with_config(config.embedding)
+        
+        vector_store = self.vector_store
+        if _changed(self.config.retrieval, config.retrieval, VECTOR_STORE_FIELDS):
+            vector_store = VectorStore(config=config.retrieval)
+            vector_store.collection
+            vector_store.manifest
+            vector_store.lexical
+        else:
+            vector_store.apply_config(config.retrieval)
+        
+        if (
+            isinstance(self.reranker, CrossEncoderReranker)
+            and config.retrieval.use_reranking
+            and not _changed(self.config.retrieval, config.retrieval, RERANKER_FIELDS)
+        ):
+            reranker = self.reranker.with_config(config.retrieval)
+        else:
+            reranker = (
+                create_reranker(config.retrieval, embedding_service)
+                if config.retrieval.use_reranking else None
+            )
+            if isinstance(reranker, CrossEncoderReranker):
+                reranker.model
+        
+        pipeline = RAGPipeline.__new__(RAGPipeline)
+        pipeline._assemble(config, embedding_service, vector_store, reranker)
+        return pipeline
+    
+    def ingest_document(self, document_path: str, progress: Optional[Callable] = None) -> int:
+        """Загружает документ в векторную БД с оптимизацией памяти
+        
+        Загрузка инкрементальная: эмбеддинги считаются только для новых
+        или измененных чанков, исчезнувшие чанки документа удаляются.
+        
+        progress(stage, **info) вызывается при смене этапа и после каждого
+        батча эмбеддингов; исключение из него прерывает загрузку до записи в БД.
+        """
         import gc
+        from pathlib import Path
+        
+        def report(stage: str, **info):
+            if progress:
+                progress(stage, **info)
         
         # 1. Конвертация в текст
+        report("converting")
         document = document_to_markdown(document_path)
         
-        # 2. Разбиение на чанки с метаданными
+        # 2. Разбиение на чанки с метаданными и стабильными id
+        report("chunking")
         chunks = split_document(document, self.config.chunking)
+        content = document["content"]
         print(f"Документ разбит на {len(chunks)} чанков")
         
         # Очистка памяти после разбиения
         del document
         gc.collect()
         
-        # 3. Создание эмбеддингов (уже оптимизировано в encode_batch)
-        documents_text = [chunk["content"] for chunk in chunks]
-        embeddings = self.embedding_service.encode_batch(documents_text)
-        print(f"Создано {len(embeddings)} эмбеддингов")
+        # 3. Сравнение с уже сохраненными чанками документа
+        document_name = Path(document_path).name
+        new_chunks, _, _ = self._diff_document_chunks(document_name, chunks)
         
-        # 4. Загрузка в векторную БД
-        count = self.vector_store.upload_documents(documents_text, embeddings, chunks)
-        print(f"Загружено {count} документов в векторную БД")
+        # 4. Эмбеддинги только для новых чанков (уже оптимизировано в encode_batch)
+        report("embedding", chunks_total=len(new_chunks), chunks_embedded=0)
+        embedded = {}
+        if new_chunks:
+            embeddings = self.embedding_service.encode_batch(
+                [chunk["content"] for chunk in new_chunks],
+                progress_callback=lambda done, total: report(
+                    "embedding", chunks_total=total, chunks_embedded=done
+                )
+            )
+            embedded = dict(zip((chunk["id"] for chunk in new_chunks), embeddings))
+            del embeddings
+        report("uploading")
+        
+        # 5. Запись новых чанков, обновление метаданных неизменных и удаление исчезнувших
+        written = self._commit_documents({document_name: (chunks, content)}, embedded)
+        del embedded
+        print(
+            f"Документ {document_name}: новых чанков {written['new_chunks']}, "
+            f"без изменений {written['kept_chunks']}, удалено {written['removed_chunks']}"
+        )
         
         # Финальная очистка памяти
-        del documents_text, embeddings
         gc.collect()
         
-        return count
+        return len(chunks)
+    
+    def _diff_document_chunks(self, document_name: str, chunks: List[Dict]) -> Tuple[List[Dict], List[Dict], set]:
+        """Делит чанки документа на новые и неизменные, находит id исчезнувших"""
+        existing_ids = self.vector_store.get_document_chunk_ids(document_name)
+        new_chunks = [chunk for chunk in chunks if chunk["id"] not in existing_ids]
+        kept_chunks = [chunk for chunk in chunks if chunk["id"] in existing_ids]
+        removed_ids = existing_ids - {chunk["id"] for chunk in chunks}
+        return new_chunks, kept_chunks, removed_ids
+    
+    def _commit_documents(self, documents: Dict[str, Tuple[List[Dict], str]], embedded: Dict[str, np.ndarray]) -> Dict:
+        """Записывает документы в векторную БД под write_lock
+        
+        documents - имя документа -> (чанки, исходный текст), embedded - id
+        чанка -> эмбеддинг. Сохраненные чанки перечитываются под блокировкой:
+        пока считались эмбеддинги, документ могли удалить, загрузить заново
+        или переиндексировать. Недостающие эмбеддинги считаются здесь же.
+        """
+        store = self.vector_store
+        with store.write_lock:
+            upload, kept, removed = [], [], set()
+            for name, (chunks, _) in documents.items():
+                existing_ids = store.get_document_chunk_ids(name)
+                removed |= existing_ids - {chunk["id"] for chunk in chunks}
+                for chunk in chunks:
+                    (kept if chunk["id"] in existing_ids else upload).append(chunk)
+            
+            missing = [chunk for chunk in upload if chunk["id"] not in embedded]
+            if missing:
+                embeddings = self.embedding_service.encode_batch([chunk["content"] for chunk in missing])
+                embedded = {**embedded, **dict(zip((chunk["id"] for chunk in missing), embeddings))}
+            
+            with store.bulk_write():
+                if upload:
+                    store.upload_documents(
+                        [chunk["content"] for chunk in upload],
+                        np.vstack([embedded[chunk["id"]] for chunk in upload]),
+                        upload
+                    )
+                store.update_chunk_metadata(kept)
+                store.delete_chunks(list(removed))
+            # Исходный текст нужен для переиндексации при смене настроек разбиения
+            for name, (_, content) in documents.items():
+                store.sources.save(name, content)
+        return {"new_chunks": len(upload), "kept_chunks": len(kept), "removed_chunks": len(removed)}
+    
+    def ingest_documents(
+        self,
+        document_paths: List[str],
+        max_workers: int = None,
+        progress: Optional[Callable] = None
+    ) -> Dict:
+        """Массовая загрузка документов
+        
+        Конвертация и разбиение выполняются в пуле процессов, эмбеддинги -
+        одним потребителем по мере готовности файлов. Все изменения в векторной
+        БД записываются одним пакетом после обработки всех файлов; файлы с
+        ошибками пропускаются и попадают в отчет.
+        """
+        import multiprocessing
+        import time
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from RAG_API.rag.bulk_ingest import prepare_document
+        
+        def report(stage: str, **info):
+            if progress:
+                progress(stage, **info)
+        
+        started = time.perf_counter()
+        if max_workers is None:
+            max_workers = min(2, os.cpu_count() or 1)
+        
+        files_report = []
+        seen_names = set()
+        documents, embedded = {}, {}
+        embedded_count = 0
+        
+        report("converting", files_total=len(document_paths), files_done=0)
+        # spawn: не наследуем потоки torch родительского процесса
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = [pool.submit(prepare_document, path, self.config.chunking) for path in document_paths]
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    item = future.result()
+                    chunks = item.pop("chunks", None)
+                    content = item.pop("content", None)
+                    item.pop("path", None)
+                    
+                    if "error" not in item and item["file"] in seen_names:
+                        item["error"] = "Документ с таким именем уже есть в пакете"
+                    if "error" in item:
+                        item["status"] = "failed"
+                        files_report.append(item)
+                        report("converting", files_total=len(document_paths), files_done=done)
+                        continue
+                    seen_names.add(item["file"])
+                    
+                    # Эмбеддинги считаются единственным потребителем, батчами
+                    new_chunks, _, removed_ids = self._diff_document_chunks(item["file"], chunks)
+                    embed_started = time.perf_counter()
+                    if new_chunks:
+                        embeddings = self.embedding_service.encode_batch([chunk["content"] for chunk in new_chunks])
+                        embedded.update(zip((chunk["id"] for chunk in new_chunks), embeddings))
+                        embedded_count += len(new_chunks)
+                    documents[item["file"]] = (chunks, content)
+                    
+                    item.update(
+                        status="ok",
+                        chunks_count=len(chunks),
+                        new_chunks=len(new_chunks),
+                        removed_chunks=len(removed_ids),
+                        embed_s=time.perf_counter() - embed_started,
+                    )
+                    files_report.append(item)
+                    report(
+                        "embedding",
+                        files_total=len(document_paths),
+                        files_done=done,
+                        chunks_embedded=embedded_count
+                    )
+            except BaseException:
+                # Отмена или ошибка: незапущенные файлы не обрабатываем
+                for future in futures:
+                    future.cancel()
+                raise
+        
+        # Единая запись всех изменений
+        report("uploading")
+        written = self._commit_documents(documents, embedded)
+        
+        ok_files = [item for item in files_report if item["status"] == "ok"]
+        return {
+            "files": files_report,
+            "failed_files": len(files_report) - len(ok_files),
+            "chunks_count": sum(item["chunks_count"] for item in ok_files),
+            "new_chunks": written["new_chunks"],
+            "removed_chunks": written["removed_chunks"],
+            "duration_s": time.perf_counter() - started,
+        }
+    
+    def reindex(self, progress: Optional[Callable] = None) -> Dict:
+        """Пересобирает базу знаний с текущими настройками разбиения (blue/green)
+        
+        Документы заново разбиваются из сохраненного исходного текста в новую
+        физическую коллекцию, пока запросы обслуживает текущая. Документы без
+        сохраненного текста (загруженные до его появления) копируются как есть.
+        Для каждого документа запоминается хэш содержимого из манифеста, по
+        которому он собран; документы, измененные или удаленные во время
+        сборки, досинхронизируются, последний раз - под write_lock вместе с
+        атомарным переключением псевдонима. Прежняя коллекция удаляется
+        спустя RETIRED_COLLECTION_GRACE секунд (см. VectorStore.drop_retired).
+        """
+        import time
+        
+        def report(stage: str, **info):
+            if progress:
+                progress(stage, **info)
+        
+        started = time.perf_counter()
+        live = self.vector_store
+        with live.reindex_lock:
+            live.drop_retired()
+            names = list(live.list_documents())
+            shadow = live.create_shadow()
+            built: Dict[str, str] = {}
+            outcome: Dict[str, str] = {}
+            
+            try:
+                report("reindexing", documents_total=len(names), documents_done=0)
+                with shadow.bulk_write():
+                    for done, name in enumerate(names, start=1):
+                        self._rebuild_in_shadow(shadow, name, built, outcome)
+                        report("reindexing", documents_total=len(names), documents_done=done)
+                
+                # Изменения за время сборки: сначала без блокировки, затем
+                # оставшиеся - под блокировкой записи непосредственно перед swap
+                report("catching_up")
+                self._reconcile_shadow(shadow, built, outcome)
+                report("swapping")
+                with live.write_lock:
+                    self._reconcile_shadow(shadow, built, outcome)
+                    old_collection = live.swap(shadow)
+            except BaseException:
+                live.drop_collection(shadow.physical_name)
+                raise
+        
+        return {
+            "documents": len(outcome),
+            "rechunked_documents": sorted(name for name, how in outcome.items() if how == "rechunked"),
+            "copied_documents": sorted(name for name, how in outcome.items() if how == "copied"),
+            "chunks_count": shadow.collection.count(),
+            "collection": shadow.physical_name,
+            "retired_collection": old_collection,
+            "duration_s": time.perf_counter() - started,
+        }
+    
+    def _rebuild_in_shadow(self, shadow: VectorStore, name: str, built: Dict[str, str], outcome: Dict[str, str]):
+        """Собирает документ в теневой коллекции заново по текущему состоянию основной
+        
+        Хэш содержимого и исходный текст читаются под write_lock, поэтому
+        соответствуют друг другу; built[name] - хэш, по которому собран документ.
+        """
+        live = self.vector_store
+        with live.write_lock:
+            content_hash = live.manifest.content_hash(name)
+            content = live.sources.load(name)
+        
+        with shadow.bulk_write():
+            stale_ids = shadow.manifest.chunk_ids(name)
+            if stale_ids:
+                shadow.delete_chunks(stale_ids)
+            if content_hash is None:
+                # Документ удален
+                built.pop(name, None)
+                outcome.pop(name, None)
+                return
+            
+            if content is None:
+                shadow.copy_documents_from(live, [name])
+                outcome[name] = "copied"
+            else:
+                chunks = split_document({"source": name, "content": content}, self.config.chunking)
+                if chunks:
+                    texts = [chunk["content"] for chunk in chunks]
+                    shadow.upload_documents(texts, self.embedding_service.encode_batch(texts), chunks)
+                outcome[name] = "rechunked"
+            built[name] = content_hash
+    
+    def _reconcile_shadow(self, shadow: VectorStore, built: Dict[str, str], outcome: Dict[str, str]):
+        """Пересобирает в теневой коллекции документы, чей хэш содержимого в
+        основной изменился после сборки, и удаляет удаленные из основной"""
+        live = self.vector_store
+        with live.write_lock:
+            current = {name: live.manifest.content_hash(name) for name in live.list_documents()}
+        changed = [name for name in built if name not in current]
+        changed += [name for name, content_hash in current.items() if built.get(name) != content_hash]
+        for name in changed:
+            self._rebuild_in_shadow(shadow, name, built, outcome)
     
     def query(
         self, 
         question: str, 
         n_results: int = None,
-        return_full_context: bool = True
+        return_full_context: bool = True,
+        use_reranking: bool = None
     ) -> Dict:
-        """Выполняет запрос к RAG системе"""
+        """Выполняет запрос к RAG системе
+        
+        use_reranking=False пропускает re-ranking (например, когда не хватает
+        времени до срока ответа); None - по настройкам поиска.
+        """
         if n_results is None:
             n_results = self.config.retrieval.n_results
         
         # Поиск релевантных чанков
-        results = self.query_processor.search(question, n_results=n_results)
+        results = self.query_processor.search(question, n_results=n_results, use_reranking=use_reranking)
         
         if not results:
             return {
@@ -91,7 +424,7 @@ class RAGPipeline:
         similarities = []
         
         for i, result in enumerate(results):
-            similarity = result.get("similarity", 1.0 / (1.0 + result["distance"]))
+            similarity = result["similarity"]
             sources.append({
                 "content": result["document"],
                 "metadata": result.get("metadata", {}),
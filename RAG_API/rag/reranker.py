@@ -1,5 +1,6 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import numpy as np
+from RAG_API.rag.config import RetrievalConfig
 
 
 class Reranker:
@@ -13,15 +14,23 @@ class Reranker:
             query: str,
             documents: List[str],
             distances: List[float],
-            top_k: int = None
+            top_k: int = None,
+            embeddings: Optional[List[List[float]]] = None
     ) -> List[Dict]:
-        """Переранжирует результаты по косинусному сходству"""
+        """Переранжирует результаты по косинусному сходству
+
+        Если переданы сохранённые в векторной БД эмбеддинги документов,
+        повторное кодирование документов моделью не выполняется.
+        """
         if not documents:
             return []
 
-        # Кодируем запрос и документы
+        # Кодируем запрос; документы кодируем только если нет готовых векторов
         query_embedding = self.embedding_service.encode_query(query)
-        doc_embeddings = self.embedding_service.encode(documents)
+        if embeddings is not None and len(embeddings) == len(documents):
+            doc_embeddings = np.asarray(embeddings, dtype=np.float32)
+        else:
+            doc_embeddings = self.embedding_service.encode(documents)
 
         # Преобразуем в numpy если нужно
         if not isinstance(query_embedding, np.ndarray):
@@ -38,20 +47,116 @@ class Reranker:
         if similarities.ndim > 1:
             similarities = similarities.flatten()
 
-        # Создаем список результатов с пересчитанными similarity
+        # Косинусное сходство - только для порядка (rerank_score), порог применяется к similarity
         results = []
         for i, (doc, orig_distance, similarity) in enumerate(zip(documents, distances, similarities)):
             results.append({
                 "document": doc,
                 "original_distance": orig_distance,
-                "similarity": float(similarity),
+                "rerank_score": float(similarity),
                 "rank": i,
             })
 
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        results.sort(key=lambda x: x["rerank_score"], reverse=True)
 
         # Возвращаем топ результатов
         if top_k:
             results = results[:top_k]
 
         return results
+
+
+class CrossEncoderReranker:
+    """Re-ranking кросс-энкодером: все пары (запрос, чанк) оцениваются одним проходом модели"""
+
+    def __init__(self, config: RetrievalConfig = None):
+        if config is None:
+            from RAG_API.rag.config import DEFAULT_CONFIG
+            config = DEFAULT_CONFIG.retrieval
+
+        self.config = config
+        self._model = None
+        self.skipped = 0
+
+    @property
+    def model(self):
+        """Ленивая загрузка кросс-энкодера; Linear слои квантуются в int8 для CPU"""
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(
+                self.config.cross_encoder_model,
+                device="cpu",
+                max_length=self.config.cross_encoder_max_length
+            )
+            if self.config.cross_encoder_quantize:
+                import torch
+                self._model.model = torch.quantization.quantize_dynamic(
+                    self._model.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            self._model.model.eval()
+        return self._model
+
+    def with_config(self, config: RetrievalConfig) -> "CrossEncoderReranker":
+        """Новый reranker с теми же весами модели и другими настройками отбора"""
+        reranker = CrossEncoderReranker(config)
+        reranker._model = self._model
+        reranker.skipped = self.skipped
+        return reranker
+
+    def _has_clear_winner(self, distances: List[float]) -> bool:
+        """Векторные оценки уже однозначно выделяют лучший чанк"""
+        if self.config.rerank_skip_margin <= 0 or len(distances) < 2:
+            return False
+        similarities = sorted((1.0 / (1.0 + d) for d in distances), reverse=True)
+        return similarities[0] - similarities[1] >= self.config.rerank_skip_margin
+
+    def rerank(
+            self,
+            query: str,
+            documents: List[str],
+            distances: List[float],
+            top_k: int = None,
+            embeddings: Optional[List[List[float]]] = None
+    ) -> List[Dict]:
+        """Переранжирует не более rerank_top_k кандидатов по оценке кросс-энкодера
+        
+        Оценка (вероятность релевантности) возвращается в rerank_score и
+        используется только для порядка: ее шкала не совпадает с similarity.
+        """
+        if not documents:
+            return []
+
+        budget = max(self.config.rerank_top_k, top_k or 0)
+        documents = documents[:budget]
+        distances = distances[:budget]
+
+        if self._has_clear_winner(distances):
+            self.skipped += 1
+            scores = [1.0 / (1.0 + d) for d in distances]
+        else:
+            pairs = [[query, doc] for doc in documents]
+            scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+        results = []
+        for i, (doc, orig_distance, score) in enumerate(zip(documents, distances, scores)):
+            results.append({
+                "document": doc,
+                "original_distance": orig_distance,
+                "rerank_score": float(score),
+                "rank": i,
+            })
+
+        results.sort(key=lambda x: x["rerank_score"], reverse=True)
+
+        if top_k:
+            results = results[:top_k]
+
+        return results
+
+
+def create_reranker(config: RetrievalConfig, embedding_service):
+    """Создает reranker выбранного в конфигурации типа"""
+    if config.reranker_type == "cross_encoder":
+        return CrossEncoderReranker(config)
+    return Reranker(embedding_service)
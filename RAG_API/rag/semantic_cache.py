@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from RAG_API.rag.config import SemanticCacheConfig
+from RAG_API.rag.lexical_index import tokenize
+
+
+def numeric_terms(question: str) -> frozenset:
+    """Числа вопроса: вопросы с разными числами не считаются перефразами"""
+    return frozenset(term for term in tokenize(question) if term[0].isdigit())
+
+
+class SemanticCache:
+    """Семантический кэш ответов: перефразированные вопросы получают сохраненный ответ
+
+    Близкий по эмбеддингу вопрос дает попадание, только если числа в нем
+    те же ("5 лет" и "7 лет" почти совпадают по смыслу, но ответы у них
+    разные). Записи привязаны к версии базы знаний. Любое изменение документов, промпта
+    или настроек поиска увеличивает версию и сбрасывает кэш.
+    """
+
+    def __init__(self, config: SemanticCacheConfig = None):
+        if config is None:
+            from RAG_API.rag.config import DEFAULT_CONFIG
+            config = DEFAULT_CONFIG.answer_cache
+
+        self.config = config
+        self.version = 0
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) + 1e-8)
+
+    def _drop_expired(self, now: float):
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry["created_at"] > self.config.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def lookup(self, question: str, embedding, n_results: int) -> Optional[Dict]:
+        """Ищет ответ на вопрос с теми же числами, близкий по косинусному расстоянию"""
+        if not self.config.enabled:
+            return None
+
+        numbers = numeric_terms(question)
+        with self._lock:
+            self._drop_expired(time.monotonic())
+            keys = [
+                key for key, entry in self._entries.items()
+                if key[1] == n_results and entry["numbers"] == numbers
+            ]
+            if not keys:
+                self.misses += 1
+                return None
+
+            matrix = np.vstack([self._entries[key]["embedding"] for key in keys])
+            similarities = matrix @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            distance = 1.0 - float(similarities[best])
+            if distance > self.config.max_distance:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            entry = self._entries[keys[best]]
+            return {**entry["result"], "cache_distance": distance}
+
+    def store(self, question: str, embedding, n_results: int, result: Dict, version: int):
+        """Сохраняет ответ, если база знаний не менялась с начала обработки запроса"""
+        if not self.config.enabled:
+            return
+
+        with self._lock:
+            if version != self.version:
+                return
+            key = (" ".join(question.split()).casefold(), n_results)
+            self._entries[key] = {
+                "embedding": self._normalize(embedding),
+                "numbers": numeric_terms(question),
+                "result": dict(result),
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.config.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Сбрасывает кэш и увеличивает версию базы знаний"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Статистика попаданий в кэш ответов"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.config.enabled,
+                "size": len(self._entries),
+                "max_size": self.config.max_size,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,36 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+
+class SourceStore:
+    """Хранилище исходного markdown текста документов
+
+    Нужен для переиндексации: при смене настроек разбиения документы
+    разбиваются заново без повторной загрузки файлов.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, document_name: str) -> Path:
+        # Имя документа может содержать произвольные символы - храним по хэшу
+        digest = hashlib.sha1(document_name.encode("utf-8")).hexdigest()
+        return self.path / f"{digest}.md"
+
+    def save(self, document_name: str, content: str):
+        """Атомарно сохраняет текст документа"""
+        target = self._file(document_name)
+        tmp_path = target.with_suffix(".tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, target)
+
+    def load(self, document_name: str) -> Optional[str]:
+        """Текст документа или None, если он не сохранялся"""
+        target = self._file(document_name)
+        return target.read_text(encoding="utf-8") if target.exists() else None
+
+    def delete(self, document_name: str):
+        self._file(document_name).unlink(missing_ok=True)
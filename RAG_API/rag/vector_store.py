@@ -1,138 +1,415 @@
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import nullcontext
 from typing import List, Dict, Optional
 import chromadb
 from pathlib import Path
 import numpy as np
 from RAG_API.rag.config import RetrievalConfig
+from RAG_API.rag.numpy_store import NumpyClient, NumpyCollection
+from RAG_API.rag.manifest import DocumentManifest
+from RAG_API.rag.lexical_index import LexicalIndex
+from RAG_API.rag.source_store import SourceStore
+
+# Сколько секунд прежняя коллекция хранится после swap: запросы, начатые до
+# переключения, успевают дочитать ее
+RETIRED_COLLECTION_GRACE = 600
+
+
+def default_db_path(backend: str = "chroma") -> str:
+    """Путь к хранилищу выбранного бэкенда из конфигурации приложения"""
+    try:
+        from RAG_API.app.core.config import CHROMA_DB_PATH, NUMPY_INDEX_PATH
+        return str(NUMPY_INDEX_PATH if backend == "numpy" else CHROMA_DB_PATH)
+    except ImportError:
+        # Fallback на относительный путь
+        return str(Path(__file__).parent.parent / ("numpy_index" if backend == "numpy" else "chroma_db"))
 
 
 class VectorStore:
-    """Класс для работы с векторной базой данных"""
+    """Класс для работы с векторной базой данных
+
+    collection_name - псевдоним: физическая коллекция, на которую он указывает,
+    хранится в файле <collection_name>.alias.json и меняется атомарно при
+    переиндексации (см. create_shadow и swap).
+
+    write_lock сериализует изменения документов (загрузку, удаление) с
+    финальной сверкой и swap переиндексации; reindex_lock - переиндексации
+    между собой. Теневые коллекции делят блокировки с основной.
+    """
 
     def __init__(self, db_path: str = None, collection_name: str = "k1_about", config: RetrievalConfig = None):
+        if config is None:
+            from RAG_API.rag.config import DEFAULT_CONFIG
+            config = DEFAULT_CONFIG.retrieval
+        self.config = config
+        
         # Используем абсолютный путь из конфигурации, если не указан
         if db_path is None:
-            try:
-                from RAG_API.app.core.config import CHROMA_DB_PATH
-                db_path = str(CHROMA_DB_PATH)
-            except ImportError:
-                # Fallback на относительный путь
-                db_path = str(Path(__file__).parent.parent.parent / "chroma_db")
+            db_path = default_db_path(config.vector_store_backend)
         
         # Убеждаемся, что путь абсолютный
         db_path = str(Path(db_path).resolve())
         Path(db_path).mkdir(parents=True, exist_ok=True)
         
-        # Оптимизация ChromaDB для ограниченной памяти
-        # Используем настройки для экономии памяти
-        try:
-            # Пытаемся использовать оптимизированные настройки
-            settings = chromadb.Settings(
-                anonymized_telemetry=False,
-                allow_reset=True,
-            )
-            self.client = chromadb.PersistentClient(path=db_path, settings=settings)
-        except Exception:
-            # Fallback на стандартный клиент если настройки не поддерживаются
-            self.client = chromadb.PersistentClient(path=db_path)
+        if config.vector_store_backend == "numpy":
+            # Плоский NumPy индекс: точный поиск без SQLite/HNSW
+            self.client = NumpyClient(db_path, dtype=config.numpy_index_dtype)
+        else:
+            # Оптимизация ChromaDB для ограниченной памяти
+            # Используем настройки для экономии памяти
+            try:
+                # Пытаемся использовать оптимизированные настройки
+                settings = chromadb.Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True,
+                )
+                self.client = chromadb.PersistentClient(path=db_path, settings=settings)
+            except Exception:
+                # Fallback на стандартный клиент если настройки не поддерживаются
+                self.client = chromadb.PersistentClient(path=db_path)
+        self.db_path = db_path
         self.collection_name = collection_name
-        if config is None:
-            from RAG_API.rag.config import DEFAULT_CONFIG
-            config = DEFAULT_CONFIG.retrieval
-        self.config = config
+        self.alias_path = Path(db_path) / f"{collection_name}.alias.json"
+        self.physical_name = self._read_alias()
+        self.sources = SourceStore(Path(db_path) / f"{collection_name}.sources")
         self._collection = None
+        self._manifest = None
+        self._lexical = None
+        self.write_lock = threading.RLock()
+        self.reindex_lock = threading.Lock()
+
+    def _read_alias(self) -> str:
+        """Имя физической коллекции псевдонима (по умолчанию совпадает с ним)"""
+        if self.alias_path.exists():
+            return json.loads(self.alias_path.read_text(encoding="utf-8"))["collection"]
+        return self.collection_name
+
+    def _read_retired(self) -> Dict[str, float]:
+        """Выведенные из псевдонима коллекции и время их вывода"""
+        if self.alias_path.exists():
+            return json.loads(self.alias_path.read_text(encoding="utf-8")).get("retired", {})
+        return {}
+
+    def _write_alias(self, physical_name: str, retired: Dict[str, float]):
+        """Атомарно записывает файл псевдонима"""
+        tmp_path = self.alias_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"collection": physical_name, "retired": retired}), encoding="utf-8")
+        os.replace(tmp_path, self.alias_path)
 
     @property
     def collection(self):
         """Ленивая загрузка коллекции"""
         if self._collection is None:
             self._collection = self.client.get_or_create_collection(
-                name=self.collection_name,
+                name=self.physical_name,
                 metadata={"description": "RAG Knowledge Base"}
             )
         return self._collection
 
+    @property
+    def manifest(self) -> DocumentManifest:
+        """Манифест документов коллекции (строится один раз по коллекции, если его нет)"""
+        if self._manifest is None:
+            manifest = DocumentManifest(Path(self.db_path) / f"{self.physical_name}.manifest.json")
+            if not manifest.exists():
+                all_data = self.collection.get(include=["metadatas"])
+                manifest.rebuild(all_data["ids"], all_data["metadatas"])
+            self._manifest = manifest
+        return self._manifest
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """BM25 индекс коллекции (строится один раз по коллекции, если его нет)"""
+        if self._lexical is None:
+            lexical = LexicalIndex(
+                Path(self.db_path) / f"{self.physical_name}.lexical.npz",
+                k1=self.config.bm25_k1,
+                b=self.config.bm25_b,
+            )
+            if not lexical.exists():
+                all_data = self.collection.get(include=["documents"])
+                lexical.rebuild(all_data["ids"], all_data["documents"])
+            self._lexical = lexical
+        return self._lexical
+
+    def bulk_write(self):
+        """Одна запись numpy коллекции на диск за весь блок (ChromaDB пишет батчи сразу)
+        
+        Каждая запись NumpyCollection - новое поколение всей матрицы, поэтому
+        несколько изменений одной операции загрузки группируются этим блоком.
+        """
+        if isinstance(self.collection, NumpyCollection):
+            return self.collection.deferred()
+        return nullcontext()
+
+    def apply_config(self, config: RetrievalConfig):
+        """Обновляет настройки по умолчанию без переоткрытия хранилища (бэкенд не меняется)
+        
+        Запросы пайплайна передают n_results и параметры BM25 явно, поэтому
+        выполняющийся поиск эти значения не затрагивают.
+        """
+        self.config = config
+        if self._lexical is not None:
+            self._lexical.k1 = config.bm25_k1
+            self._lexical.b = config.bm25_b
+
     def upload_documents(
             self,
             documents: List[str],
             embeddings: np.ndarray,
             chunks: List[Dict],
-            replace_all: bool = True,
+            replace_all: bool = False,
             batch_size: int = 100  # Загружаем батчами для экономии памяти
     ):
         """Загружает документы в векторную БД батчами для оптимизации памяти
         
+        Чанки записываются через upsert по их стабильным id (см. split_document),
+        поэтому повторная загрузка того же чанка не создает дубликатов.
+        Numpy коллекция записывает все батчи на диск один раз, в конце загрузки.
+        
         Args:
             documents: Список текстов документов
             embeddings: Массив эмбеддингов
             chunks: Список чанков с метаданными
-            replace_all: Если True, удаляет всю коллекцию перед добавлением (по умолчанию True)
+            replace_all: Если True, удаляет всю коллекцию перед добавлением (по умолчанию False)
             batch_size: Размер батча для загрузки (по умолчанию 100)
         """
         import gc
         
         if replace_all:
             try:
-                self.client.delete_collection(self.collection_name)
+                self.client.delete_collection(self.physical_name)
                 self._collection = None  # Сбрасываем кэш
             except:
                 pass
+            self.manifest.clear()
+            self.lexical.clear()
 
         self.collection
 
         # Загружаем батчами для экономии памяти
-        total_docs = len(documents)
-        for batch_start in range(0, total_docs, batch_size):
-            batch_end = min(batch_start + batch_size, total_docs)
-            batch_docs = documents[batch_start:batch_end]
-            batch_embeddings = embeddings[batch_start:batch_end]
-            batch_chunks = chunks[batch_start:batch_end]
-            
-            metadatas = []
-            ids = []
-            for i, chunk in enumerate(batch_chunks):
-                metadata = chunk.get("metadata", {})
-                metadata["document"] = Path(chunk["source"]).name
-                metadata["chunk_id"] = chunk.get("chunk_id", batch_start + i)
-                metadatas.append(metadata)
-                ids.append(f"doc_{batch_start + i}")
-
-            # Загрузка батча в БД
-            self.collection.add(
-                documents=batch_docs,
-                embeddings=batch_embeddings.tolist(),
-                metadatas=metadatas,
-                ids=ids,
-            )
-            
-            # Очистка памяти после каждого батча
-            del batch_docs, batch_embeddings, batch_chunks, metadatas, ids
-            if batch_start % (batch_size * 4) == 0:
-                gc.collect()
+        with self.bulk_write():
+            total_docs = len(documents)
+            for batch_start in range(0, total_docs, batch_size):
+                batch_end = min(batch_start + batch_size, total_docs)
+                batch_docs = documents[batch_start:batch_end]
+                batch_embeddings = embeddings[batch_start:batch_end]
+                batch_chunks = chunks[batch_start:batch_end]
+                
+                metadatas = [self._chunk_metadata(chunk) for chunk in batch_chunks]
+                ids = [chunk["id"] for chunk in batch_chunks]
+
+                # Загрузка батча в БД
+                self.collection.upsert(
+                    documents=batch_docs,
+                    embeddings=batch_embeddings.tolist(),
+                    metadatas=metadatas,
+                    ids=ids,
+                )
+                for chunk in batch_chunks:
+                    self.manifest.add_chunks(Path(chunk["source"]).name, [chunk["id"]])
+                self.lexical.add(ids, batch_docs)
+                
+                # Очистка памяти после каждого батча
+                del batch_docs, batch_embeddings, batch_chunks, metadatas, ids
+                if batch_start % (batch_size * 4) == 0:
+                    gc.collect()
 
+        self.manifest.save()
+        self.lexical.save()
         return self.collection.count()
 
+    @staticmethod
+    def _chunk_metadata(chunk: Dict) -> Dict:
+        """Метаданные чанка для записи в БД"""
+        metadata = dict(chunk.get("metadata", {}))
+        metadata["document"] = Path(chunk["source"]).name
+        metadata["chunk_id"] = chunk.get("chunk_id", 0)
+        return metadata
+
+    def get_document_chunk_ids(self, document_name: str) -> set:
+        """Возвращает id всех сохраненных чанков документа"""
+        return set(self.manifest.chunk_ids(document_name) or [])
+
+    def update_chunk_metadata(self, chunks: List[Dict]):
+        """Обновляет метаданные уже сохраненных чанков без пересчета эмбеддингов"""
+        if not chunks:
+            return
+        self.collection.update(
+            ids=[chunk["id"] for chunk in chunks],
+            metadatas=[self._chunk_metadata(chunk) for chunk in chunks],
+        )
+
+    def delete_chunks(self, ids: List[str]):
+        """Удаляет чанки по id"""
+        if ids:
+            self.collection.delete(ids=list(ids))
+            self.manifest.remove_chunks(ids)
+            self.manifest.save()
+            self.lexical.remove(ids)
+            self.lexical.save()
+
     def search(
             self,
             query_embeddings: List[List[float]],
             n_results: int = None,
             where: Optional[Dict] = None,
             where_document: Optional[Dict] = None,
+            include_embeddings: bool = True,
     ) -> Dict:
-        """Поиск в векторной БД"""
+        """Поиск в векторной БД
+
+        Сохранённые эмбеддинги чанков возвращаются вместе с результатами,
+        чтобы re-ranking не прогонял документы через модель повторно.
+        """
         if n_results is None:
             n_results = self.config.n_results
 
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+
         return self.collection.query(
             query_embeddings=query_embeddings,
             n_results=n_results,
             where=where,
             where_document=where_document,
-            include=["documents", "metadatas", "distances"],
+            include=include,
         )
 
+    def lexical_search(self, query: str, top_k: int = 10, k1: float = None, b: float = None) -> List[Dict]:
+        """BM25 поиск по тексту чанков: id, score и coverage для каждого результата"""
+        return self.lexical.search(query, top_k, k1=k1, b=b)
+
+    def get_chunks(self, ids: List[str]) -> Dict:
+        """Получает чанки по id вместе с сохранёнными эмбеддингами"""
+        return self.collection.get(ids=list(ids), include=["documents", "metadatas", "embeddings"])
+
+    def delete_document(self, document_name: str) -> Optional[int]:
+        """Удаляет все чанки документа по id из манифеста, возвращает их количество или None"""
+        with self.write_lock:
+            ids_to_delete = self.manifest.chunk_ids(document_name)
+            if not ids_to_delete:
+                return None
+            
+            self.collection.delete(ids=ids_to_delete)
+            self.manifest.remove_document(document_name)
+            self.manifest.save()
+            self.lexical.remove(ids_to_delete)
+            self.lexical.save()
+            self.sources.delete(document_name)
+            return len(ids_to_delete)
+
+    def list_documents(self) -> Dict[str, int]:
+        """Возвращает количество чанков для каждого документа (из манифеста)"""
+        return self.manifest.documents()
+
+    def create_shadow(self) -> "VectorStore":
+        """Новая пустая физическая коллекция для фоновой пересборки
+        
+        Запросы продолжают идти в текущую коллекцию, пока не вызван swap.
+        """
+        shadow = copy.copy(self)
+        shadow.physical_name = f"{self.collection_name}__{uuid.uuid4().hex[:8]}"
+        shadow._collection = None
+        shadow._manifest = None
+        shadow._lexical = None
+        return shadow
+
+    def copy_documents_from(self, source: "VectorStore", document_names: List[str]) -> int:
+        """Копирует чанки документов из другой коллекции вместе с эмбеддингами"""
+        copied = 0
+        with self.bulk_write():
+            for name in document_names:
+                ids = source.manifest.chunk_ids(name)
+                if not ids:
+                    continue
+                data = source.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+                self.collection.upsert(
+                    ids=data["ids"],
+                    documents=data["documents"],
+                    metadatas=data["metadatas"],
+                    embeddings=np.asarray(data["embeddings"], dtype=np.float32).tolist(),
+                )
+                self.manifest.add_chunks(name, data["ids"])
+                self.lexical.add(data["ids"], data["documents"])
+                copied += len(data["ids"])
+        self.manifest.save()
+        self.lexical.save()
+        return copied
+
+    def swap(self, shadow: "VectorStore") -> str:
+        """Атомарно переключает псевдоним на коллекцию shadow
+        
+        Прежняя коллекция не удаляется сразу: запросы, начатые до
+        переключения, еще читают ее. Она удаляется в drop_retired спустя
+        RETIRED_COLLECTION_GRACE секунд. Возвращает ее имя.
+        """
+        with self.write_lock:
+            old_name = self.physical_name
+            retired = self._read_retired()
+            retired[old_name] = time.time()
+            self._write_alias(shadow.physical_name, retired)
+            
+            collection, manifest, lexical = shadow.collection, shadow.manifest, shadow.lexical
+            self.physical_name = shadow.physical_name
+            self._collection, self._manifest, self._lexical = collection, manifest, lexical
+            return old_name
+
+    def drop_collection(self, physical_name: str):
+        """Удаляет физическую коллекцию вместе с ее манифестом и BM25 индексом"""
+        try:
+            self.client.delete_collection(physical_name)
+        except Exception:
+            pass
+        for suffix in (".manifest.json", ".lexical.npz"):
+            (Path(self.db_path) / f"{physical_name}{suffix}").unlink(missing_ok=True)
+
+    def drop_retired(self, grace: float = RETIRED_COLLECTION_GRACE) -> List[str]:
+        """Удаляет выведенные swap коллекции старше grace секунд"""
+        with self.write_lock:
+            retired = self._read_retired()
+            now = time.time()
+            expired = [
+                name for name, retired_at in retired.items()
+                if now - retired_at >= grace and name != self.physical_name
+            ]
+            for name in expired:
+                self.drop_collection(name)
+                del retired[name]
+            if expired:
+                self._write_alias(self.physical_name, retired)
+            return expired
+
+    def drop_stale_shadows(self) -> List[str]:
+        """Удаляет коллекции пересборок, прерванных перезапуском, и выведенные
+        swap коллекции старше RETIRED_COLLECTION_GRACE
+
+        Вызывается при старте, пока переиндексация не может выполняться:
+        теневая коллекция идущей пересборки неотличима от брошенной.
+        """
+        with self.reindex_lock:
+            retired = self._read_retired()
+            prefix = f"{self.collection_name}__"
+            stale = [
+                c.name for c in self.client.list_collections()
+                if c.name.startswith(prefix) and c.name != self.physical_name
+                and c.name not in retired
+            ]
+            for name in stale:
+                self.drop_collection(name)
+            return stale + self.drop_retired()
+
     def get_collection_stats(self) -> Dict:
         """Получает статистику коллекции"""
         return {
-            "name": self.collection.name,
+            "name": self.collection_name,
+            "physical_name": self.physical_name,
             "count": self.collection.count(),
+            "lexical_index": self.lexical.stats(),
         }
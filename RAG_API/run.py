@@ -22,7 +22,7 @@ os.environ.setdefault('PYTHONHASHSEED', '0')
 os.environ.setdefault('MALLOC_ARENA_MAX', '2')
 os.environ.setdefault('OMP_NUM_THREADS', '2')
 
-from RAG_API.app.core.config import PORT, DEBUG
+from RAG_API.app.core.config import PORT, DEBUG, LIMIT_CONCURRENCY
 
 if __name__ == "__main__":
     # Оптимизированные настройки для ограниченных ресурсов
@@ -32,7 +32,7 @@ if __name__ == "__main__":
         port=PORT,
         reload=DEBUG,
         workers=1,  # Один воркер для экономии памяти
-        limit_concurrency=10,  # Ограничение одновременных запросов
+        limit_concurrency=LIMIT_CONCURRENCY,  # Перегрузку по пулам отсекает app.core.executors (429)
         timeout_keep_alive=5,  # Короткий keep-alive
         log_level="info"
     )
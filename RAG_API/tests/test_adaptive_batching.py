@@ -0,0 +1,47 @@
+import numpy as np
+from RAG_API.rag.config import EmbeddingConfig
+from RAG_API.rag.embedding_service import EmbeddingService
+
+
+class LengthModel:
+    """Модель без токенизатора: эмбеддинг - длина текста; запоминает размеры батчей"""
+
+    max_seq_length = 128
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(len(texts))
+        return np.asarray([[float(len(t))] for t in texts], dtype=np.float32)
+
+
+def make_service(**overrides):
+    service = EmbeddingService(EmbeddingConfig(**overrides))
+    service._model = LengthModel()
+    return service
+
+
+def test_batch_size_counts_padding_to_longest_text():
+    lengths = np.array([10, 10, 20, 40])
+    # 1*10, 2*10, 3*20=60, 4*40=160
+    assert EmbeddingService._next_batch_size(lengths, 60, 64) == 3
+    assert EmbeddingService._next_batch_size(lengths, 60, 2) == 2
+    # Текст длиннее бюджета все равно кодируется отдельным батчем
+    assert EmbeddingService._next_batch_size(np.array([500]), 60, 64) == 1
+
+
+def test_encode_batch_keeps_input_order():
+    service = make_service(batch_token_budget=40, memory_limit_mb=10 ** 6)
+    texts = ["x" * 200, "y" * 8, "z" * 80, "w" * 20]
+    embeddings = service.encode_batch(texts)
+    assert embeddings[:, 0].tolist() == [200.0, 8.0, 80.0, 20.0]
+    assert len(service._model.batches) > 1
+    assert service.last_batch_stats["batches"] == len(service._model.batches)
+
+
+def test_budget_shrinks_over_memory_limit():
+    service = make_service(batch_token_budget=1000, memory_limit_mb=0)
+    service.encode_batch(["слово " * 5] * 40)
+    assert service.last_batch_stats["token_budget"] < 1000
+    assert service._token_budget == service.last_batch_stats["token_budget"]
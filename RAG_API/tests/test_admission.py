@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import json
+import pytest
+from RAG_API.app import main
+from RAG_API.app.api.routes import documents
+from RAG_API.app.core.executors import AdmissionLimit, BoundedExecutor, ExecutorSaturated
+from RAG_API.app.services.rag_service import rag_service
+
+
+def test_admission_rejects_beyond_active_plus_queued():
+    limit = AdmissionLimit("llm", max_active=1, max_queued=1, retry_after=7)
+    with limit.admit(), limit.admit():
+        with pytest.raises(ExecutorSaturated) as error:
+            with limit.admit():
+                pass
+        assert error.value.retry_after == 7
+        assert limit.stats()["pending"] == 2
+    assert limit.stats() == {"max_active": 1, "max_queued": 1, "pending": 0, "rejected": 1}
+    with limit.admit():
+        pass
+
+
+def test_bounded_executor_keeps_slot_until_thread_finishes():
+    executor = BoundedExecutor("inference", max_workers=1, max_queued=0)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        task = asyncio.create_task(executor.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(lambda: None)
+
+        # Отмена ожидания не освобождает поток: место занято, пока он работает
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(lambda: None)
+
+        release.set()
+        for _ in range(100):
+            if executor.stats()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await executor.run(lambda: "free")
+
+    try:
+        assert asyncio.run(scenario()) == "free"
+        assert executor.stats()["rejected"] == 2
+    finally:
+        executor.shutdown()
+
+
+def test_saturated_pool_returns_429_with_retry_after(monkeypatch):
+    async def saturated():
+        raise ExecutorSaturated("vector_store", 3)
+
+    monkeypatch.setattr(rag_service, "get_all_documents", saturated)
+    # Маршрут не превращает перегрузку в 500, а передает обработчику приложения
+    with pytest.raises(ExecutorSaturated) as error:
+        asyncio.run(documents.get_all_documents())
+    assert main.app.exception_handlers[ExecutorSaturated] is main.executor_saturated_handler
+
+    response = asyncio.run(main.executor_saturated_handler(None, error.value))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert "vector_store" in json.loads(response.body)["detail"]
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+import pytest
+from RAG_API.rag.bulk_ingest import collect_documents
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+def extraction_dirs():
+    return set(Path(tempfile.gettempdir()).glob("bulk_ingest_*"))
+
+
+def test_archive_is_extracted_without_hidden_files(tmp_path):
+    archive = make_zip(tmp_path / "docs.zip", {
+        "a.md": "a", "sub/b.md": "b", "__MACOSX/._a.md": "x", ".hidden/c.md": "c",
+    })
+    files, tmp_dir = collect_documents(str(archive))
+    try:
+        assert [f.relative_to(tmp_dir).as_posix() for f in files] == ["a.md", "sub/b.md"]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+@pytest.mark.parametrize("name", ["../evil.md", "sub/../../evil.md", "/etc/evil.md"])
+def test_zip_slip_is_rejected_before_extraction(tmp_path, name):
+    archive = make_zip(tmp_path / "docs.zip", {"ok.md": "ok", name: "evil"})
+    before = extraction_dirs()
+    with pytest.raises(ValueError, match="Недопустимый путь"):
+        collect_documents(str(archive))
+    assert extraction_dirs() == before
+    assert not (tmp_path / "evil.md").exists()
+
+
+def test_too_many_files_is_rejected(tmp_path):
+    archive = make_zip(tmp_path / "docs.zip", {f"{i}.md": "x" for i in range(5)})
+    before = extraction_dirs()
+    with pytest.raises(ValueError, match="5 файлов"):
+        collect_documents(str(archive), max_files=4)
+    assert extraction_dirs() == before
+
+
+def test_uncompressed_size_is_checked_from_directory(tmp_path):
+    # 2 МБ нулей сжимаются до нескольких КБ: проверяется размер после распаковки
+    archive = make_zip(tmp_path / "bomb.zip", {"a.md": b"\0" * (1024 * 1024), "b.md": b"\0" * (1024 * 1024)})
+    assert archive.stat().st_size < 64 * 1024
+    before = extraction_dirs()
+    with pytest.raises(ValueError, match="после распаковки"):
+        collect_documents(str(archive), max_uncompressed_bytes=2 * 1024 * 1024 - 1)
+    assert extraction_dirs() == before
+
+    files, tmp_dir = collect_documents(str(archive), max_files=2, max_uncompressed_bytes=2 * 1024 * 1024)
+    assert len(files) == 2
+    shutil.rmtree(tmp_dir)
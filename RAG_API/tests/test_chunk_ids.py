@@ -0,0 +1,60 @@
+from RAG_API.rag.config import ChunkingConfig
+from RAG_API.rag.document_processor import chunk_content_id, split_document
+
+CONFIG = ChunkingConfig(chunk_size=40, chunk_overlap=0)
+
+PARAGRAPHS = [
+    "Стоимость обучения 8 100 рублей.",
+    "Занятия проходят по субботам.",
+    "Адрес: ул. Ленина, 1.",
+]
+
+
+def ids_by_content(content, source="docs/price.md"):
+    return {c["content"]: c["id"] for c in split_document({"source": source, "content": content}, CONFIG)}
+
+
+def test_ids_are_stable_across_runs():
+    content = "\n\n".join(PARAGRAPHS)
+    assert ids_by_content(content) == ids_by_content(content)
+
+
+def test_editing_one_chunk_keeps_other_ids():
+    before = ids_by_content("\n\n".join(PARAGRAPHS))
+    after = ids_by_content("\n\n".join([PARAGRAPHS[0], "Занятия проходят по воскресеньям.", PARAGRAPHS[2]]))
+    assert after[PARAGRAPHS[0]] == before[PARAGRAPHS[0]]
+    assert after[PARAGRAPHS[2]] == before[PARAGRAPHS[2]]
+    assert set(after.values()) - set(before.values()) == {after["Занятия проходят по воскресеньям."]}
+
+
+def test_inserting_chunk_does_not_shift_ids():
+    before = ids_by_content("\n\n".join(PARAGRAPHS))
+    after = ids_by_content("\n\n".join(["Новый абзац в начале."] + PARAGRAPHS))
+    for paragraph in PARAGRAPHS:
+        assert after[paragraph] == before[paragraph]
+
+
+def test_same_text_in_other_document_gets_other_id():
+    content = "\n\n".join(PARAGRAPHS)
+    assert set(ids_by_content(content, "a.md").values()).isdisjoint(ids_by_content(content, "b.md").values())
+
+
+def test_id_depends_on_file_name_not_directory():
+    content = "\n\n".join(PARAGRAPHS)
+    assert ids_by_content(content, "/tmp/upload-1/a.md") == ids_by_content(content, "/data/a.md")
+
+
+def test_duplicate_chunks_get_occurrence_suffix():
+    seen = {}
+    first = chunk_content_id("a.md", "hash", seen)
+    second = chunk_content_id("a.md", "hash", seen)
+    third = chunk_content_id("a.md", "hash", seen)
+    assert second == f"{first}-1" and third == f"{first}-2"
+    assert chunk_content_id("a.md", "hash", {}) == first
+
+
+def test_metadata_carries_content_hash():
+    chunks = split_document({"source": "a.md", "content": PARAGRAPHS[0]}, CONFIG)
+    assert len(chunks) == 1
+    assert len(chunks[0]["metadata"]["content_hash"]) == 40
+    assert chunks[0]["metadata"]["document_name"] == "a.md"
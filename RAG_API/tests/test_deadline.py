@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from RAG_API.app.core import deadline as deadline_module
+from RAG_API.app.core.deadline import (
+    ClientDisconnected, DeadlineExceeded, check_deadline, parse_deadline, run_until_disconnect, time_left,
+)
+from RAG_API.app.services.rag_service import RAGService
+
+
+def in_loop(fn):
+    async def wrapper():
+        return fn(asyncio.get_running_loop())
+    return asyncio.run(wrapper())
+
+
+def test_missing_header_means_no_deadline():
+    assert in_loop(lambda loop: parse_deadline(None)) is None
+    assert in_loop(lambda loop: time_left(None)) is None
+
+
+def test_header_is_seconds_from_now():
+    def check(loop):
+        deadline = parse_deadline("2.5")
+        return deadline - loop.time()
+    assert in_loop(check) == pytest.approx(2.5, abs=0.05)
+
+
+@pytest.mark.parametrize("value", ["", "abc", "1,5"])
+def test_malformed_header_is_400(value):
+    with pytest.raises(HTTPException) as error:
+        in_loop(lambda loop: parse_deadline(value))
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_expired_header_is_deadline_exceeded(value):
+    with pytest.raises(DeadlineExceeded):
+        in_loop(lambda loop: parse_deadline(value))
+
+
+def test_check_deadline():
+    def check(loop):
+        check_deadline(None, "поиска")
+        check_deadline(loop.time() + 1, "поиска")
+        with pytest.raises(DeadlineExceeded, match="поиска"):
+            check_deadline(loop.time() - 0.01, "поиска")
+    in_loop(check)
+
+
+def test_stages_are_skipped_when_time_runs_out(monkeypatch):
+    monkeypatch.setattr("RAG_API.app.services.rag_service.DEADLINE_MIN_RERANK_SECONDS", 2)
+    monkeypatch.setattr("RAG_API.app.services.rag_service.DEADLINE_MIN_LLM_SECONDS", 5)
+    monkeypatch.setattr("RAG_API.app.services.rag_service.LLM_TIMEOUT", 20)
+
+    def check(loop):
+        now = loop.time()
+        assert RAGService._use_reranking(None) is None
+        assert RAGService._use_reranking(now + 3) is None
+        assert RAGService._use_reranking(now + 1) is False
+        assert RAGService._llm_fits(None) and RAGService._llm_fits(now + 6)
+        assert not RAGService._llm_fits(now + 4)
+        assert RAGService._llm_timeout(None) == 20
+        # Запас RESPONSE_MARGIN на ответ без LLM после таймаута
+        assert RAGService._llm_timeout(now + 8) == pytest.approx(8 - deadline_module.RESPONSE_MARGIN, abs=0.05)
+        assert RAGService._llm_timeout(now + 0.1) == 0.0
+    in_loop(check)
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after):
+        self.checks = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.checks > self.disconnect_after
+
+
+def test_disconnect_cancels_the_request(monkeypatch):
+    monkeypatch.setattr(deadline_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+    cancelled = asyncio.Event()
+
+    async def slow_answer():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def scenario():
+        with pytest.raises(ClientDisconnected):
+            await run_until_disconnect(FakeRequest(disconnect_after=2), slow_answer())
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    asyncio.run(scenario())
+
+
+def test_result_is_returned_while_client_is_connected(monkeypatch):
+    monkeypatch.setattr(deadline_module, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    async def answer():
+        await asyncio.sleep(0.03)
+        return "ответ"
+
+    request = FakeRequest(disconnect_after=100)
+    assert asyncio.run(run_until_disconnect(request, answer())) == "ответ"
+    assert request.checks >= 1
@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from RAG_API.rag.embedding_dispatcher import EmbeddingDispatcher
+
+
+class RecordingEncoder:
+    """Вектор текста - его длина; запоминает состав каждого батча"""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.threads = set()
+        self.error = error
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        if self.error:
+            raise self.error
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+
+def encode_concurrently(dispatcher, requests):
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(dispatcher.encode, requests))
+
+
+def test_concurrent_requests_are_encoded_in_one_batch():
+    encoder = RecordingEncoder()
+    dispatcher = EmbeddingDispatcher(encoder, max_wait_ms=300, max_batch=5)
+    requests = [["а"], ["бб", "ввв"], ["гггг"], ["ддддд"]]
+
+    results = encode_concurrently(dispatcher, requests)
+
+    assert len(encoder.batches) == 1
+    assert sorted(encoder.batches[0]) == sorted(t for r in requests for t in r)
+    # Каждый вызывающий получает свои строки в исходном порядке
+    for texts, embeddings in zip(requests, results):
+        assert embeddings[:, 0].tolist() == [len(t) for t in texts]
+    assert encoder.threads == {"embedding-dispatcher"}
+    stats = dispatcher.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 4 and stats["max_batch_size"] == 5
+
+
+def test_full_batch_is_sent_without_waiting():
+    encoder = RecordingEncoder()
+    dispatcher = EmbeddingDispatcher(encoder, max_wait_ms=10_000, max_batch=2)
+    started = time.monotonic()
+    dispatcher.encode(["один", "два"])
+    assert time.monotonic() - started < 1
+    assert encoder.batches == [["один", "два"]]
+
+
+def test_encoder_error_reaches_every_caller():
+    dispatcher = EmbeddingDispatcher(RecordingEncoder(error=RuntimeError("модель")), max_wait_ms=200, max_batch=3)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(dispatcher.encode, [f"q{i}"]) for i in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="модель"):
+                future.result()
+    # Диспетчер продолжает работать после ошибки
+    dispatcher._encode_fn = RecordingEncoder()
+    assert dispatcher.encode(["ok"]).shape == (1, 2)
+
+
+def test_thread_stops_when_idle_and_restarts():
+    encoder = RecordingEncoder()
+    dispatcher = EmbeddingDispatcher(encoder, max_wait_ms=0, idle_timeout=0.05)
+    dispatcher.encode(["первый"])
+    for _ in range(100):
+        if not dispatcher._running:
+            break
+        time.sleep(0.01)
+    assert not dispatcher._running
+    assert dispatcher.encode(["второй"])[0, 0] == len("второй")
+    assert encoder.batches == [["первый"], ["второй"]]
@@ -0,0 +1,40 @@
+from RAG_API.rag.config import RetrievalConfig
+from RAG_API.rag.query_processor import QueryProcessor
+
+
+def make_results(*lists):
+    """Результат векторной БД: по списку (id, дистанция) на каждый вариант запроса"""
+    return {
+        "ids": [[doc_id for doc_id, _ in items] for items in lists],
+        "documents": [[f"текст {doc_id}" for doc_id, _ in items] for items in lists],
+        "metadatas": [[{"document": f"{doc_id}.md"} for doc_id, _ in items] for items in lists],
+        "distances": [[distance for _, distance in items] for items in lists],
+    }
+
+
+def fuse(results, weights=None):
+    processor = QueryProcessor(None, None, None, RetrievalConfig(rrf_k=60))
+    variations = [f"вариант {i}" for i in range(len(results["ids"]))]
+    return processor._fuse_results(results, variations, weights)
+
+
+def test_chunk_found_by_several_variations_ranks_first_once():
+    fused = fuse(make_results([("a", 0.4), ("b", 0.5)], [("b", 0.3), ("c", 0.6)]))
+    assert [r["id"] for r in fused] == ["b", "a", "c"]
+    assert fused[0]["fusion_score"] == 1 / 61 + 1 / 62
+
+
+def test_duplicate_keeps_occurrence_with_smallest_distance():
+    fused = fuse(make_results([("a", 0.4), ("b", 0.5)], [("b", 0.3)]))
+    best = next(r for r in fused if r["id"] == "b")
+    assert best["distance"] == 0.3
+    assert best["query_variation"] == "вариант 1"
+
+
+def test_weights_scale_list_contribution():
+    fused = fuse(make_results([("a", 0.4)], [("b", 0.4)]), weights=[1.0, 2.0])
+    assert [r["id"] for r in fused] == ["b", "a"]
+
+
+def test_empty_results():
+    assert fuse(make_results([], [])) == []
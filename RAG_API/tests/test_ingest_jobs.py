@@ -0,0 +1,91 @@
+import json
+import threading
+from RAG_API.app.services.ingest_jobs import IngestJobManager
+
+
+class GatedRunner:
+    """Задача отчитывается о прогрессе и ждет разрешения завершиться"""
+
+    def __init__(self, steps=50):
+        self.steps = steps
+        self.release = threading.Event()
+
+    def __call__(self, job, progress):
+        progress("embedding", chunks_total=self.steps, chunks_embedded=0)
+        for done in range(1, self.steps + 1):
+            progress("embedding", chunks_total=self.steps, chunks_embedded=done)
+        assert self.release.wait(5)
+        return {"chunks_count": self.steps}
+
+
+def wait_finished(manager, job_id):
+    for _ in range(500):
+        job = manager.get(job_id)
+        if job and job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f"задача {job_id} не завершилась")
+
+
+def saved_jobs(manager):
+    return json.loads(manager.state_file.read_text(encoding="utf-8"))
+
+
+def test_progress_within_stage_is_throttled(tmp_path, monkeypatch):
+    runner = GatedRunner()
+    manager = IngestJobManager(tmp_path, runner, save_interval=3600)
+    saves = []
+    original_save = manager._save
+    monkeypatch.setattr(manager, "_save", lambda: (saves.append(1), original_save()))
+
+    job_id = manager.new_job_id()
+    manager.submit(job_id, None, kind="reindex")
+    for _ in range(500):
+        if manager.get(job_id)["chunks_embedded"] == runner.steps:
+            break
+        threading.Event().wait(0.01)
+    # submit, running, переход на этап embedding; 50 обновлений прогресса не записываются
+    assert len(saves) == 3
+    assert manager.get(job_id)["chunks_embedded"] == runner.steps
+    assert saved_jobs(manager)[job_id]["chunks_embedded"] == 0
+
+    runner.release.set()
+    wait_finished(manager, job_id)
+    assert saved_jobs(manager)[job_id]["status"] == "completed"
+    assert saved_jobs(manager)[job_id]["chunks_count"] == runner.steps
+    manager.shutdown()
+
+
+def test_finished_jobs_are_capped_with_their_files(tmp_path):
+    runner = GatedRunner(steps=1)
+    runner.release.set()
+    manager = IngestJobManager(tmp_path, runner, keep_finished=2)
+    job_ids = []
+    for i in range(4):
+        job_id = manager.new_job_id()
+        path = manager.job_file_path(job_id, f"doc{i}.md")
+        path.write_text("текст", encoding="utf-8")
+        manager.submit(job_id, path)
+        wait_finished(manager, job_id)
+        job_ids.append(job_id)
+
+    assert sorted(job["job_id"] for job in manager.list()) == sorted(job_ids[2:])
+    assert sorted(saved_jobs(manager)) == sorted(job_ids[2:])
+    manager._executor.shutdown(wait=True)
+    assert list(manager.files_dir.iterdir()) == []
+
+
+def test_restart_drops_orphaned_files_and_old_jobs(tmp_path):
+    jobs = {
+        f"old{i}": {
+            "job_id": f"old{i}", "status": "completed", "created_at": f"2026-01-0{i + 1}T00:00:00",
+        }
+        for i in range(3)
+    }
+    (tmp_path / "jobs.json").write_text(json.dumps(jobs), encoding="utf-8")
+    (tmp_path / "files" / "lost-upload").mkdir(parents=True)
+
+    manager = IngestJobManager(tmp_path, GatedRunner(), keep_finished=1)
+    assert [job["job_id"] for job in manager.list()] == ["old2"]
+    assert not (tmp_path / "files" / "lost-upload").exists()
+    manager.shutdown()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from RAG_API.rag.lexical_index import LexicalIndex, stem, tokenize
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("стоит", "стоит"),
+    ("сто", "сто"),
+    ("говорит", "говор"),
+    ("цены", "цен"),
+    ("ценами", "цен"),
+    ("занимаются", "занима"),
+    ("python", "python"),
+    ("2024", "2024"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_verb_form_does_not_collide_with_numeral():
+    assert tokenize("Сколько стоит") != tokenize("сто")
+
+
+def test_tokenize_normalizes_numbers_case_and_stop_words():
+    assert tokenize("Сколько стоит обучение? 8 100 рублей, а не 8 100,50") == [
+        "стоит", "обучен", "8100", "рубл", "8100,50",
+    ]
+    assert tokenize("Ёлка и ЕЛКА") == ["елк", "елк"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(tmp_path / "kb.lexical.npz")
+    index.add(
+        ["price", "schedule", "address"],
+        [
+            "Стоимость обучения 8 100 рублей в месяц",
+            "Расписание занятий: занятия по субботам",
+            "Адрес школы: улица Ленина",
+        ],
+    )
+    return index
+
+
+def test_search_ranks_and_reports_coverage(index):
+    hits = index.search("стоимость обучения в месяц")
+    assert hits[0]["id"] == "price"
+    assert hits[0]["coverage"] == pytest.approx(1.0)
+    assert [h["id"] for h in index.search("занятия по субботам")] == ["schedule"]
+    assert index.search("8100 рублей")[0]["id"] == "price"
+    assert index.search("неизвестное слово") == []
+
+
+def test_term_frequency_and_top_k(index):
+    index.add(["more"], ["занятия занятия занятия"])
+    hits = index.search("занятия", top_k=1)
+    assert [h["id"] for h in hits] == ["more"]
+
+
+def test_remove_and_replace(index):
+    index.remove(["price"])
+    assert index.search("стоимость") == []
+    index.add(["schedule"], ["Стоимость занятий"])
+    assert [h["id"] for h in index.search("стоимость")] == ["schedule"]
+    assert index.search("субботам") == []
+    assert index.stats()["documents"] == 2
+
+
+def test_save_and_reload(index, tmp_path):
+    index.save()
+    reloaded = LexicalIndex(tmp_path / "kb.lexical.npz")
+    assert reloaded.exists()
+    assert [h["id"] for h in reloaded.search("адрес школы")] == ["address"]
+
+
+def test_index_of_other_tokenizer_version_is_outdated(index, tmp_path):
+    path = tmp_path / "kb.lexical.npz"
+    index.save()
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files if k != "version"}
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+    outdated = LexicalIndex(path)
+    assert not outdated.exists()
+    assert outdated.search("адрес") == []
+    outdated.rebuild(["address"], ["Адрес школы"])
+    assert LexicalIndex(path).exists()
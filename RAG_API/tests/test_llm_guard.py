@@ -0,0 +1,172 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from RAG_API.rag import circuit_breaker
+from RAG_API.rag.circuit_breaker import CircuitBreaker
+from RAG_API.rag.config import SemanticCacheConfig
+from RAG_API.rag.giga_chat import LLMProvider, LLMUnavailable
+from RAG_API.rag.semantic_cache import SemanticCache
+from RAG_API.app.services import rag_service as rag_service_module
+from RAG_API.app.services.rag_service import RAGService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats() == {"state": "open", "consecutive_failures": 2, "times_opened": 1, "rejected": 1}
+
+
+def test_half_open_lets_one_probe_per_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # Неудачная проба размыкает автомат еще на cooldown, не считаясь новым размыканием
+    breaker.record_failure()
+    clock.now += 29
+    assert breaker.state == "open"
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.times_opened == 1
+
+
+class ScriptedGiga:
+    """achat по очереди: (задержка, ответ или исключение)"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.cancelled = 0
+
+    async def achat(self, chat):
+        delay, outcome = self.script.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))])
+
+
+def make_provider(giga, hedge_after=0.0, slow_call_seconds=10.0, breaker_failures=2):
+    # Без __init__: учетные данные и сеть не нужны
+    provider = LLMProvider.__new__(LLMProvider)
+    provider.giga = giga
+    provider._system_prompt = ""
+    provider.max_concurrency = 4
+    provider._in_flight = provider._waiting = 0
+    provider.slow_call_seconds = slow_call_seconds
+    provider.hedge_after = hedge_after
+    provider.breaker = CircuitBreaker(breaker_failures, cooldown=30)
+    provider.slow_calls = provider.failed_calls = provider.hedged_calls = 0
+    return provider
+
+
+def answer(provider):
+    async def scenario():
+        provider._limit = asyncio.Semaphore(provider.max_concurrency)
+        return await provider.aanswer("вопрос", "контекст")
+    return asyncio.run(scenario())
+
+
+def test_hedged_request_wins_and_slow_one_is_cancelled():
+    giga = ScriptedGiga((5, "медленный"), (0, "быстрый"))
+    provider = make_provider(giga, hedge_after=0.05)
+    assert answer(provider) == "быстрый"
+    assert provider.hedged_calls == 1
+    assert giga.cancelled == 1
+    # Учтен только использованный ответ, отмененный запрос автомат не трогает
+    assert provider.breaker.consecutive_failures == 0
+    assert provider.stats()["in_flight"] == 0
+
+
+def test_first_response_before_hedge_deadline_sends_one_request():
+    giga = ScriptedGiga((0, "сразу"))
+    provider = make_provider(giga, hedge_after=1)
+    assert answer(provider) == "сразу"
+    assert provider.hedged_calls == 0
+
+
+def test_hedge_falls_back_to_other_request_on_error():
+    giga = ScriptedGiga((0.1, RuntimeError("сбой")), (0.2, "второй"))
+    provider = make_provider(giga, hedge_after=0.05)
+    assert answer(provider) == "второй"
+    assert provider.failed_calls == 0
+
+
+def test_failures_open_breaker_and_reject_calls():
+    giga = ScriptedGiga((0, RuntimeError("сбой")), (0, RuntimeError("сбой")))
+    provider = make_provider(giga, breaker_failures=2)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            answer(provider)
+    assert provider.failed_calls == 2
+    with pytest.raises(LLMUnavailable):
+        answer(provider)
+    assert provider.breaker.rejected == 1
+
+
+def test_timeouts_count_only_when_not_shorter_than_slow_call():
+    provider = make_provider(ScriptedGiga(), slow_call_seconds=10, breaker_failures=1)
+    provider.record_timeout(3)
+    assert provider.breaker.state == "closed"
+    provider.record_timeout(10)
+    assert provider.slow_calls == 1
+    assert provider.breaker.state == "open"
+
+
+def test_service_answers_from_top_chunk_when_llm_times_out(monkeypatch):
+    monkeypatch.setattr(rag_service_module, "LLM_TIMEOUT", 0.05)
+    timeouts = []
+
+    class HangingProvider:
+        async def aanswer(self, question, context, system_prompt=None):
+            await asyncio.sleep(10)
+
+        def record_timeout(self, timeout):
+            timeouts.append(timeout)
+
+    class Pipeline:
+        def query(self, question, n_results, return_full_context, use_reranking):
+            content = "Стоимость обучения 8 100 рублей в месяц. Занятия по субботам."
+            return {"answer": content, "sources": [{"content": content}]}
+
+    service = RAGService.__new__(RAGService)
+    service.rag_pipeline = Pipeline()
+    service.llm_provider = HangingProvider()
+    service.answer_cache = SemanticCache(SemanticCacheConfig(enabled=False))
+    service._flights = {}
+    service.coalesced_requests = 0
+
+    result = asyncio.run(service.query("Сколько стоит обучение?"))
+    assert result["degraded"] is True
+    assert "8 100" in result["answer"]
+    assert "llm_answer" not in result
+    assert timeouts == [0.05]
@@ -0,0 +1,73 @@
+import numpy as np
+from RAG_API.rag.config import RetrievalConfig
+from RAG_API.rag.manifest import DocumentManifest
+from RAG_API.rag.vector_store import VectorStore
+
+
+def test_add_and_remove_chunks(tmp_path):
+    manifest = DocumentManifest(tmp_path / "kb.manifest.json")
+    manifest.add_chunks("a.md", ["a1", "a2"])
+    manifest.add_chunks("a.md", ["a2", "a3"])
+    manifest.add_chunks("b.md", ["b1"])
+    assert manifest.documents() == {"a.md": 3, "b.md": 1}
+
+    manifest.remove_chunks(["a1", "b1", "unknown"])
+    assert manifest.documents() == {"a.md": 2}
+    assert manifest.chunk_ids("a.md") == ["a2", "a3"]
+    assert manifest.chunk_ids("b.md") is None
+
+
+def test_remove_document_forgets_chunk_owners(tmp_path):
+    manifest = DocumentManifest(tmp_path / "kb.manifest.json")
+    manifest.add_chunks("a.md", ["a1"])
+    manifest.remove_document("a.md")
+    manifest.add_chunks("b.md", ["b1"])
+    # a1 больше не принадлежит a.md: его удаление не затрагивает другие документы
+    manifest.remove_chunks(["a1"])
+    assert manifest.documents() == {"b.md": 1}
+
+
+def test_save_and_reload(tmp_path):
+    path = tmp_path / "kb.manifest.json"
+    manifest = DocumentManifest(path)
+    manifest.add_chunks("цены.md", ["c1", "c2"])
+    manifest.save()
+
+    reloaded = DocumentManifest(path)
+    assert reloaded.documents() == {"цены.md": 2}
+    reloaded.remove_chunks(["c1"])
+    assert reloaded.chunk_ids("цены.md") == ["c2"]
+
+
+def test_rebuild_groups_by_document_metadata(tmp_path):
+    manifest = DocumentManifest(tmp_path / "kb.manifest.json")
+    manifest.rebuild(["x", "y", "z"], [{"document": "a.md"}, {"document": "b.md"}, None])
+    assert manifest.documents() == {"a.md": 1, "b.md": 1, "unknown": 1}
+    assert manifest.exists()
+
+
+def numpy_store(path):
+    return VectorStore(str(path), collection_name="kb", config=RetrievalConfig(vector_store_backend="numpy"))
+
+
+def upload(store, document_name, ids):
+    chunks = [{"id": i, "content": i, "source": f"/uploads/{document_name}", "chunk_id": n} for n, i in enumerate(ids)]
+    store.upload_documents([c["content"] for c in chunks], np.eye(len(ids), 4, dtype=np.float32), chunks)
+
+
+def test_vector_store_lists_and_deletes_through_manifest(tmp_path):
+    store = numpy_store(tmp_path)
+    upload(store, "a.md", ["a1", "a2"])
+    upload(store, "b.md", ["b1"])
+    assert store.list_documents() == {"a.md": 2, "b.md": 1}
+
+    assert store.delete_document("a.md") == 2
+    assert store.delete_document("a.md") is None
+    assert store.collection.get()["ids"] == ["b1"]
+    assert numpy_store(tmp_path).list_documents() == {"b.md": 1}
+
+
+def test_missing_manifest_is_rebuilt_from_collection(tmp_path):
+    upload(numpy_store(tmp_path), "a.md", ["a1", "a2"])
+    (tmp_path / "kb.manifest.json").unlink()
+    assert numpy_store(tmp_path).list_documents() == {"a.md": 2}
@@ -0,0 +1,72 @@
+import re
+import pytest
+from RAG_API.rag import document_processor
+from RAG_API.rag.config import ChunkingConfig
+from RAG_API.rag.document_processor import split_document, split_markdown_by_tokens
+
+
+class WordTokenizer:
+    """Токен - слово; модель добавляет два служебных токена"""
+
+    def tokenize(self, text):
+        return text.split()
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", text)]}
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    monkeypatch.setattr(document_processor, "get_tokenizer", lambda name: WordTokenizer())
+
+
+def config(max_tokens=12, overlap_tokens=0):
+    return ChunkingConfig(strategy="markdown_tokens", max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_chunks_fit_budget_and_keep_section_paths():
+    text = f"# Курсы\n\n{words(6, 'a')}\n\n## Цены\n\n{words(6, 'b')}\n\n{words(6, 'c')}\n\n# Контакты\n\n{words(3, 'd')}"
+    chunks = split_markdown_by_tokens(text, config())
+    assert [path for _, path in chunks] == ["Курсы", "Курсы > Цены", "Курсы > Цены", "Контакты"]
+    for chunk, _ in chunks:
+        assert len(chunk.split()) <= 12 - 2
+    # Заголовок остается только в первом чанке секции
+    assert chunks[1][0].startswith("## Цены\n\n")
+    assert chunks[2][0] == words(6, "c")
+
+
+def test_list_items_are_separate_blocks_with_continuation_lines():
+    text = "# Документы\n- паспорт\n  оригинал и копия\n- справка\n1. заявление"
+    chunks = split_markdown_by_tokens(text, config(max_tokens=9))
+    assert [chunk for chunk, _ in chunks] == [
+        "# Документы\n\n- паспорт\n  оригинал и копия",
+        "- справка\n\n1. заявление",
+    ]
+
+
+def test_overlap_repeats_tail_blocks_within_overlap_budget():
+    text = "\n\n".join([words(4, "a"), words(2, "b"), words(4, "c")])
+    chunks = [chunk for chunk, _ in split_markdown_by_tokens(text, config(max_tokens=8, overlap_tokens=2))]
+    assert chunks == [f"{words(4, 'a')}\n\n{words(2, 'b')}", f"{words(2, 'b')}\n\n{words(4, 'c')}"]
+
+
+def test_oversized_block_is_split_by_sentences_then_tokens():
+    long_sentence = words(25, "x")
+    text = f"Короткое предложение. {long_sentence}."
+    chunks = [chunk for chunk, _ in split_markdown_by_tokens(text, config())]
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_document_records_section_path():
+    chunks = split_document({"source": "/tmp/faq.md", "content": "# FAQ\n## Оплата\nМожно картой."}, config())
+    assert len(chunks) == 1
+    assert chunks[0]["metadata"]["section_path"] == "FAQ > Оплата"
+    assert chunks[0]["content"] == "## Оплата\n\nМожно картой."
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from RAG_API.rag.numpy_store import NumpyClient, NumpyCollection
+
+
+def generations(collection):
+    return sorted(p.name for p in collection.path.glob("gen-*"))
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = NumpyClient(str(tmp_path)).get_or_create_collection("kb")
+    collection.upsert(
+        ids=["a", "b", "c"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]],
+        documents=["цены", "расписание", "адрес"],
+        metadatas=[{"document": "x.md", "chunk_id": 0}, {"document": "x.md", "chunk_id": 1}, {"document": "y.md"}],
+    )
+    return collection
+
+
+def test_query_returns_exact_squared_l2_order(collection):
+    result = collection.query([[1.0, 0.0]], n_results=2)
+    assert result["ids"] == [["a", "c"]]
+    assert result["distances"][0] == pytest.approx([0.0, 0.8])
+    assert result["metadatas"][0][0] == {"document": "x.md", "chunk_id": 0}
+
+
+def test_where_filters(collection):
+    assert collection.get(where={"document": "x.md"})["ids"] == ["a", "b"]
+    assert collection.get(where={"chunk_id": {"$gte": 1}})["ids"] == ["b"]
+    assert collection.get(where={"$or": [{"chunk_id": 1}, {"document": "y.md"}]})["ids"] == ["b", "c"]
+    assert collection.get(where_document={"$contains": "адр"})["ids"] == ["c"]
+    assert collection.query([[1.0, 0.0]], n_results=5, where={"document": "y.md"})["ids"] == [["c"]]
+
+
+def test_upsert_replaces_by_id_and_update_skips_unknown(collection):
+    collection.upsert(ids=["a"], embeddings=[[0.0, 1.0]], documents=["новые цены"])
+    collection.update(ids=["a", "missing"], metadatas=[{"document": "z.md"}, {"document": "q.md"}])
+    result = collection.get(ids=["a", "missing"], include=["documents", "metadatas", "embeddings"])
+    assert result["ids"] == ["a"]
+    assert result["documents"] == ["новые цены"]
+    assert result["metadatas"] == [{"document": "z.md"}]
+    np.testing.assert_array_equal(result["embeddings"][0], [0.0, 1.0])
+    assert collection.count() == 3
+
+
+def test_delete_by_ids_and_where(collection):
+    collection.delete(ids=["a"])
+    collection.delete(where={"document": "y.md"})
+    assert collection.get()["ids"] == ["b"]
+
+
+def test_state_survives_reload(collection, tmp_path):
+    reopened = NumpyCollection(tmp_path / "kb", "kb")
+    assert reopened.get(include=["documents"])["documents"] == ["цены", "расписание", "адрес"]
+    assert reopened.query([[0.0, 1.0]], n_results=1)["ids"] == [["b"]]
+
+
+def test_every_write_leaves_single_generation(collection):
+    collection.upsert(ids=["d"], embeddings=[[1.0, 1.0]], documents=["d"])
+    collection.delete(ids=["b"])
+    assert len(generations(collection)) == 1
+    current = (collection.path / "CURRENT").read_text().strip()
+    assert generations(collection) == [current]
+
+
+def test_deferred_writes_one_generation_at_exit(collection):
+    before = generations(collection)
+    with collection.deferred():
+        for i in range(5):
+            collection.upsert(ids=[f"n{i}"], embeddings=[[float(i), 1.0]], documents=[f"n{i}"])
+        collection.delete(ids=["a"])
+        # Внутри блока изменения видны, но на диск не записаны
+        assert collection.count() == 7
+        assert generations(collection) == before
+    after = generations(collection)
+    assert len(after) == 1 and after != before
+    assert NumpyCollection(collection.path, "kb").count() == 7
+
+
+def test_float16_matrix(tmp_path):
+    collection = NumpyClient(str(tmp_path), dtype="float16").get_or_create_collection("kb")
+    collection.upsert(ids=["a"], embeddings=[[0.5, 0.25]], documents=["a"])
+    assert collection._embeddings.dtype == np.float16
+    assert collection.query([[0.5, 0.25]], n_results=1)["distances"][0][0] == pytest.approx(0.0)
+
+
+def test_new_record_requires_embedding(collection):
+    with pytest.raises(ValueError):
+        collection.upsert(ids=["new"], documents=["без вектора"])
+
+
+def test_client_lists_and_deletes_collections(tmp_path):
+    client = NumpyClient(str(tmp_path))
+    client.get_or_create_collection("kb")
+    client.get_or_create_collection("kb__shadow")
+    assert [c.name for c in client.list_collections()] == ["kb", "kb__shadow"]
+    client.delete_collection("kb__shadow")
+    assert [c.name for c in client.list_collections()] == ["kb"]
+    with pytest.raises(ValueError):
+        client.delete_collection("kb__shadow")
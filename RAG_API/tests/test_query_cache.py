@@ -0,0 +1,66 @@
+import numpy as np
+from RAG_API.rag.cache import LRUCache
+from RAG_API.rag.config import EmbeddingConfig
+from RAG_API.rag.embedding_service import EmbeddingService, normalize_query
+
+
+class RecordingModel:
+    """Модель, кодирующая текст его длиной, и список закодированных текстов"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return np.asarray([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+
+def make_service(cache_size=8):
+    service = EmbeddingService(EmbeddingConfig(query_cache_size=cache_size, query_batch_max_wait_ms=0))
+    service._model = RecordingModel()
+    return service
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 1, 1)
+
+
+def test_normalize_query_ignores_case_and_spacing():
+    assert normalize_query("  Сколько   СТОИТ\tобучение ") == "сколько стоит обучение"
+
+
+def test_query_variants_share_entry_but_model_sees_original_text():
+    service = make_service()
+    first = service.encode_query("Сколько стоит?")
+    second = service.encode_query("сколько  стоит?")
+    assert service._model.calls == [["Сколько стоит?"]]
+    np.testing.assert_array_equal(first, second)
+
+
+def test_batch_encodes_each_missing_key_once():
+    service = make_service()
+    service.encode_query("цена")
+    embeddings = service.encode_queries(["Цена", "адрес", "АДРЕС "])
+    assert service._model.calls == [["цена"], ["адрес"]]
+    assert embeddings.shape == (3, 2)
+
+
+def test_cached_embeddings_are_read_only():
+    service = make_service()
+    service.encode_query("цена")
+    cached = service._query_cache.get((service.config.model_name, "цена"))
+    assert not cached.flags.writeable
+
+
+def test_disabled_cache_encodes_every_call():
+    service = make_service(cache_size=0)
+    service.encode_query("цена")
+    service.encode_query("цена")
+    assert len(service._model.calls) == 2
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import numpy as np
+import pytest
+from RAG_API.rag.config import ChunkingConfig, RAGConfig, RetrievalConfig
+from RAG_API.rag.document_processor import split_document
+from RAG_API.rag.rag_pipeline import RAGPipeline
+from RAG_API.rag.vector_store import VectorStore
+
+
+class HashEmbeddings:
+    """Детерминированные нормированные векторы по тексту"""
+
+    def encode_batch(self, texts, batch_size=None, progress_callback=None):
+        vectors = np.array([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:16], dtype=np.uint8)
+            for text in texts
+        ], dtype=np.float32) + 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_pipeline(path, chunk_size=60):
+    config = RAGConfig(
+        chunking=ChunkingConfig(chunk_size=chunk_size, chunk_overlap=0),
+        retrieval=RetrievalConfig(vector_store_backend="numpy", use_reranking=False),
+    )
+    store = VectorStore(str(path), collection_name="kb", config=config.retrieval)
+    pipeline = RAGPipeline.__new__(RAGPipeline)
+    pipeline._assemble(config, HashEmbeddings(), store, None)
+    return pipeline
+
+
+def ingest(pipeline, name, paragraphs):
+    content = "\n\n".join(paragraphs)
+    chunks = split_document({"source": name, "content": content}, pipeline.config.chunking)
+    pipeline._commit_documents({name: (chunks, content)}, {})
+
+
+def stored_texts(store, name):
+    ids = store.manifest.chunk_ids(name) or []
+    return sorted(store.collection.get(ids=ids, include=["documents"])["documents"]) if ids else []
+
+
+PRICE = ["Стоимость обучения 8 100 рублей в месяц.", "Оплата картой или переводом."]
+SCHEDULE = ["Занятия по субботам с 10 до 14.", "Каникулы в январе."]
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    ingest(pipeline, "price.md", PRICE)
+    ingest(pipeline, "schedule.md", SCHEDULE)
+    # Новые настройки разбиения: по чанку на документ
+    pipeline.config.chunking = ChunkingConfig(chunk_size=500, chunk_overlap=0)
+    return pipeline
+
+
+def test_reindex_rechunks_and_swaps_alias(pipeline, tmp_path):
+    store = pipeline.vector_store
+    old_collection = store.physical_name
+    report = pipeline.reindex()
+
+    assert report["rechunked_documents"] == ["price.md", "schedule.md"]
+    assert store.physical_name == report["collection"] != old_collection
+    assert store.list_documents() == {"price.md": 1, "schedule.md": 1}
+    alias = json.loads((tmp_path / "kb.alias.json").read_text())
+    assert alias["collection"] == report["collection"]
+    assert list(alias["retired"]) == [old_collection]
+
+
+def test_document_reuploaded_after_shadow_built_it_is_refreshed(pipeline):
+    updated = ["Стоимость обучения 9 000 рублей в месяц.", "Оплата картой или переводом."]
+
+    def progress(stage, **info):
+        # price.md уже собран в теневой коллекции - загружаем новую версию
+        if stage == "reindexing" and info["documents_done"] == 1:
+            ingest(pipeline, "price.md", updated)
+
+    report = pipeline.reindex(progress=progress)
+    store = pipeline.vector_store
+    assert report["rechunked_documents"] == ["price.md", "schedule.md"]
+    assert stored_texts(store, "price.md") == ["\n\n".join(updated)]
+    assert store.collection.count() == 2
+
+
+def test_changes_before_swap_are_reconciled_under_lock(pipeline):
+    def progress(stage, **info):
+        if stage == "catching_up":
+            pipeline.vector_store.delete_document("schedule.md")
+            ingest(pipeline, "contacts.md", ["Адрес: улица Ленина, 1."])
+        elif stage == "swapping":
+            # Запись между сверками тоже попадает в новую коллекцию
+            ingest(pipeline, "faq.md", ["Можно ли заниматься онлайн? Да."])
+
+    pipeline.reindex(progress=progress)
+    store = pipeline.vector_store
+    assert store.list_documents() == {"price.md": 1, "contacts.md": 1, "faq.md": 1}
+    assert set(store.collection.get()["ids"]) == {
+        chunk_id for name in store.list_documents() for chunk_id in store.manifest.chunk_ids(name)
+    }
+
+
+def test_commit_rediffs_and_embeds_missing_chunks(pipeline):
+    store = pipeline.vector_store
+    content = "\n\n".join(PRICE)
+    chunks = split_document({"source": "price.md", "content": content}, pipeline.config.chunking)
+    # Сравнение выполнялось до удаления документа: эмбеддингов для "неизменных" чанков нет
+    store.delete_document("price.md")
+    written = pipeline._commit_documents({"price.md": (chunks, content)}, {})
+    assert written == {"new_chunks": 1, "kept_chunks": 0, "removed_chunks": 0}
+    assert stored_texts(store, "price.md") == [content]
+
+
+def test_failed_reindex_drops_its_shadow(pipeline, tmp_path):
+    def progress(stage, **info):
+        if stage == "catching_up":
+            raise RuntimeError("отмена")
+
+    store = pipeline.vector_store
+    live = store.physical_name
+    with pytest.raises(RuntimeError):
+        pipeline.reindex(progress=progress)
+    assert store.physical_name == live
+    assert [c.name for c in store.client.list_collections()] == [live]
+
+
+def test_retired_collection_is_dropped_after_grace(pipeline):
+    store = pipeline.vector_store
+    old_collection = store.physical_name
+    pipeline.reindex()
+
+    assert store.drop_retired() == []
+    assert store.drop_retired(grace=0) == [old_collection]
+    assert [c.name for c in store.client.list_collections()] == [store.physical_name]
+
+
+def test_startup_drops_abandoned_shadows_but_keeps_retired_within_grace(pipeline):
+    store = pipeline.vector_store
+    old_collection = store.physical_name
+    pipeline.reindex()
+    abandoned = store.create_shadow()
+    abandoned.collection.upsert(ids=["x"], embeddings=[[1.0] * 16], documents=["x"])
+
+    assert store.drop_stale_shadows() == [abandoned.physical_name]
+    names = {c.name for c in store.client.list_collections()}
+    assert names == {store.physical_name, old_collection}
+
+    assert store.drop_retired(grace=0) == [old_collection]
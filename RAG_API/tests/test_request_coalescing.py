@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+from RAG_API.app.core.deadline import DeadlineExceeded
+from RAG_API.app.services.rag_service import RAGService, normalize_question
+
+
+class GatedQuery:
+    """Подменяет RAGService._query: считает запуски и ждет разрешения ответить"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = None
+
+    async def __call__(self, question, n_results, flight):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"answer": f"ответ ({n_results})", "deadline": flight.deadline}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    # Без __init__: очередь загрузки и пайплайн для объединения запросов не нужны
+    service = RAGService.__new__(RAGService)
+    service._flights = {}
+    service.coalesced_requests = 0
+    service.fake = GatedQuery()
+    monkeypatch.setattr(service, "_query", service.fake)
+    return service
+
+
+def test_normalize_question():
+    assert normalize_question("  Сколько СТОИТ обучение?! ") == normalize_question("сколько стоит  обучение")
+    assert normalize_question("Ёлка.") == "елка"
+
+
+def test_identical_questions_share_one_query(service):
+    async def scenario():
+        service.fake.release = asyncio.Event()
+        first = asyncio.create_task(service.query("Сколько стоит обучение?"))
+        second = asyncio.create_task(service.query("сколько стоит обучение"))
+        other = asyncio.create_task(service.query("Сколько стоит обучение?", n_results=5))
+        await asyncio.sleep(0)
+        assert len(service._flights) == 2
+        service.fake.release.set()
+        return await asyncio.gather(first, second, other)
+
+    first, second, other = asyncio.run(scenario())
+    assert service.fake.calls == 2
+    assert service.coalesced_requests == 1
+    assert first["answer"] == second["answer"] == "ответ (3)"
+    # Каждый клиент получает свой текст вопроса
+    assert (first["question"], second["question"]) == ("Сколько стоит обучение?", "сколько стоит обучение")
+    assert other["answer"] == "ответ (5)"
+    assert service._flights == {}
+
+
+def test_flight_survives_while_one_client_waits(service):
+    async def scenario():
+        service.fake.release = asyncio.Event()
+        leaving = asyncio.create_task(service.query("вопрос"))
+        staying = asyncio.create_task(service.query("вопрос"))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        assert service.fake.cancelled == 0
+        service.fake.release.set()
+        return await staying
+
+    assert asyncio.run(scenario())["answer"] == "ответ (3)"
+    assert service.fake.calls == 1
+
+
+def test_flight_is_cancelled_when_all_clients_leave(service):
+    async def scenario():
+        service.fake.release = asyncio.Event()
+        clients = [asyncio.create_task(service.query("вопрос")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for client in clients:
+            client.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert service._flights == {}
+
+        # Следующий клиент запускает новый запрос
+        service.fake.release.set()
+        return await service.query("вопрос")
+
+    assert asyncio.run(scenario())["answer"] == "ответ (3)"
+    assert service.fake.cancelled == 1
+    assert service.fake.calls == 2
+
+
+def test_deadline_is_the_latest_among_clients(service):
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        service.fake.release = asyncio.Event()
+        short = asyncio.create_task(service.query("вопрос", deadline=loop.time() + 0.05))
+        long = asyncio.create_task(service.query("вопрос", deadline=loop.time() + 5))
+        await asyncio.sleep(0)
+        flight = next(iter(service._flights.values()))
+        assert flight.deadline == pytest.approx(loop.time() + 5, abs=0.1)
+
+        with pytest.raises(DeadlineExceeded):
+            await short
+        # Клиент с коротким сроком ушел, запрос продолжается для второго
+        assert not flight.task.done()
+        service.fake.release.set()
+        return await long
+
+    assert asyncio.run(scenario())["answer"] == "ответ (3)"
+    assert service.fake.calls == 1
+
+
+def test_client_without_deadline_lifts_flight_deadline(service):
+    async def scenario():
+        service.fake.release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        first = asyncio.create_task(service.query("вопрос", deadline=loop.time() + 5))
+        second = asyncio.create_task(service.query("вопрос"))
+        await asyncio.sleep(0)
+        service.fake.release.set()
+        return await asyncio.gather(first, second)
+
+    first, _ = asyncio.run(scenario())
+    assert first["deadline"] is None
+
+
+def test_stream_clients_share_one_generation(service, monkeypatch):
+    generations = []
+
+    async def fake_stream(question, n_results, flight):
+        generations.append(question)
+        yield {"event": "context"}
+        await service.fake.release.wait()
+        yield {"event": "delta", "text": "ответ"}
+        yield {"event": "done", "answer": "ответ"}
+
+    monkeypatch.setattr(service, "_query_stream", fake_stream)
+
+    async def collect(question):
+        return [event["event"] async for event in service.query_stream(question)]
+
+    async def scenario():
+        service.fake.release = asyncio.Event()
+        first = asyncio.create_task(collect("Вопрос?"))
+        await asyncio.sleep(0.01)
+        # Подключившийся позже получает и уже отданные события
+        late = asyncio.create_task(collect("вопрос"))
+        await asyncio.sleep(0.01)
+        service.fake.release.set()
+        return await asyncio.gather(first, late)
+
+    first, late = asyncio.run(scenario())
+    assert first == late == ["context", "delta", "done"]
+    assert generations == ["Вопрос?"]
+    assert service.coalesced_requests == 1
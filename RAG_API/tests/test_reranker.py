@@ -0,0 +1,38 @@
+import numpy as np
+from RAG_API.rag.reranker import Reranker
+
+
+class CountingEmbeddings:
+    """Эмбеддинги по словарю текстов с подсчетом вызовов модели"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.encoded = []
+
+    def encode_query(self, query):
+        return np.asarray(self.vectors[query], dtype=np.float32)
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.asarray([self.vectors[t] for t in texts], dtype=np.float32)
+
+
+VECTORS = {"q": [1.0, 0.0], "близко": [0.9, 0.1], "далеко": [0.0, 1.0]}
+
+
+def test_stored_embeddings_skip_document_encoding():
+    service = CountingEmbeddings(VECTORS)
+    results = Reranker(service).rerank(
+        "q", ["далеко", "близко"], [0.5, 0.6],
+        embeddings=[VECTORS["далеко"], VECTORS["близко"]],
+    )
+    assert service.encoded == []
+    assert [r["document"] for r in results] == ["близко", "далеко"]
+
+
+def test_documents_are_encoded_without_stored_embeddings():
+    service = CountingEmbeddings(VECTORS)
+    results = Reranker(service).rerank("q", ["далеко", "близко"], [0.5, 0.6], top_k=1)
+    assert service.encoded == ["далеко", "близко"]
+    assert [r["document"] for r in results] == ["близко"]
+    assert results[0]["original_distance"] == 0.6
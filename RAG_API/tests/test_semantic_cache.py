@@ -0,0 +1,66 @@
+import numpy as np
+from RAG_API.rag.config import SemanticCacheConfig
+from RAG_API.rag.semantic_cache import SemanticCache, numeric_terms
+
+# Эмбеддинги двух перефраз: косинусное расстояние около 0.005
+QUESTION = np.array([1.0, 0.1, 0.0])
+PARAPHRASE = np.array([1.0, 0.0, 0.0])
+ANSWER = {"answer": "Курс для детей 5 лет стоит 3000 рублей"}
+
+
+def make_cache(**overrides):
+    return SemanticCache(SemanticCacheConfig(**overrides))
+
+
+def test_paraphrase_with_same_numbers_hits():
+    cache = make_cache()
+    cache.store("Сколько стоит курс для 5 лет?", QUESTION, 3, ANSWER, cache.version)
+    cached = cache.lookup("Какова цена курса для 5 лет", PARAPHRASE, 3)
+    assert cached["answer"] == ANSWER["answer"]
+    assert cached["cache_distance"] < 0.05
+
+
+def test_question_with_other_number_misses():
+    cache = make_cache()
+    cache.store("Сколько стоит курс для 5 лет?", QUESTION, 3, ANSWER, cache.version)
+    assert cache.lookup("Сколько стоит курс для 7 лет?", QUESTION, 3) is None
+    assert cache.lookup("Сколько стоит курс?", QUESTION, 3) is None
+    assert cache.misses == 2
+
+
+def test_numeric_terms_join_digit_groups():
+    assert numeric_terms("Стоимость 8 100 рублей за 1,5 часа") == {"8100", "1,5"}
+    assert numeric_terms("Где находится школа?") == frozenset()
+
+
+def test_far_question_and_other_n_results_miss():
+    cache = make_cache()
+    cache.store("адрес школы", QUESTION, 3, ANSWER, cache.version)
+    assert cache.lookup("адрес школы", np.array([0.0, 1.0, 0.0]), 3) is None
+    assert cache.lookup("адрес школы", QUESTION, 5) is None
+
+
+def test_invalidate_drops_entries_and_rejects_stale_store():
+    cache = make_cache()
+    version = cache.version
+    cache.store("адрес школы", QUESTION, 3, ANSWER, version)
+    cache.invalidate()
+    assert cache.lookup("адрес школы", QUESTION, 3) is None
+    # Ответ, начатый до изменения базы знаний, не сохраняется
+    cache.store("адрес школы", QUESTION, 3, ANSWER, version)
+    assert cache.stats()["size"] == 0
+
+
+def test_expired_entries_are_dropped():
+    cache = make_cache(ttl_seconds=-1)
+    cache.store("адрес школы", QUESTION, 3, ANSWER, cache.version)
+    assert cache.lookup("адрес школы", QUESTION, 3) is None
+    assert cache.expirations == 1
+
+
+def test_max_size_evicts_oldest():
+    cache = make_cache(max_size=1)
+    cache.store("первый", QUESTION, 3, ANSWER, cache.version)
+    cache.store("второй", np.array([0.0, 0.0, 1.0]), 3, ANSWER, cache.version)
+    assert cache.lookup("первый", QUESTION, 3) is None
+    assert cache.evictions == 1
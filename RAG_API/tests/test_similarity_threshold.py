@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from RAG_API.rag.config import RetrievalConfig
+from RAG_API.rag.query_processor import QueryProcessor, cosine_from_distance
+from RAG_API.rag.reranker import Reranker
+
+QUERY = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# Чанки с косинусным сходством с запросом 0.9, 0.5, 0.2 и -0.1
+CHUNKS = {
+    "price": unit(0.9, np.sqrt(1 - 0.81), 0.0),
+    "schedule": unit(0.5, np.sqrt(1 - 0.25), 0.0),
+    "weather": unit(0.2, 0.0, np.sqrt(1 - 0.04)),
+    "history": unit(-0.1, 0.0, np.sqrt(1 - 0.01)),
+}
+
+
+class QueryEmbeddings:
+    def encode_queries(self, queries):
+        return np.vstack([QUERY for _ in queries])
+
+    def encode_query(self, query):
+        return QUERY
+
+
+class FlatStore:
+    """Точный поиск по квадрату L2, как ChromaDB с пространством по умолчанию"""
+
+    def search(self, query_embeddings, n_results):
+        ids = list(CHUNKS)
+        results = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = [float(np.sum((CHUNKS[i] - query) ** 2)) for i in ids]
+            order = np.argsort(distances)[:n_results]
+            results["ids"].append([ids[i] for i in order])
+            results["documents"].append([ids[i] for i in order])
+            results["metadatas"].append([{} for _ in order])
+            results["distances"].append([distances[i] for i in order])
+            results["embeddings"].append([CHUNKS[ids[i]] for i in order])
+        return results
+
+
+def make_processor():
+    config = RetrievalConfig(use_multi_query=False, use_hybrid_search=False, min_similarity_threshold=0.3)
+    embeddings = QueryEmbeddings()
+    return QueryProcessor(embeddings, FlatStore(), Reranker(embeddings), config)
+
+
+def test_cosine_from_squared_l2_distance():
+    for chunk in CHUNKS.values():
+        distance = float(np.sum((chunk - QUERY) ** 2))
+        assert cosine_from_distance(distance) == pytest.approx(float(chunk @ QUERY), abs=1e-6)
+
+
+@pytest.mark.parametrize("use_reranking", [True, False])
+def test_threshold_is_cosine_with_and_without_reranking(use_reranking):
+    results = make_processor().search("сколько стоит", n_results=4, use_reranking=use_reranking)
+    assert [r["id"] for r in results] == ["price", "schedule"]
+    assert [r["similarity"] for r in results] == pytest.approx([0.9, 0.5], abs=1e-6)
+
+
+def test_off_topic_question_gets_no_chunks():
+    processor = make_processor()
+    processor.config.min_similarity_threshold = 0.95
+    assert processor.search("погода", n_results=4, use_reranking=True) == []
+    assert processor.search("погода", n_results=4, use_reranking=False) == []
@@ -0,0 +1,38 @@
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+from RAG_API.app.api.routes import documents
+
+
+def upload(filename, data=b""):
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+@pytest.mark.parametrize("filename", [None, "", ".", ".."])
+def test_missing_filename_is_rejected_with_400(filename):
+    with pytest.raises(HTTPException) as error:
+        documents._upload_filename(upload(filename))
+    assert error.value.status_code == 400
+
+
+def test_filename_loses_directories():
+    assert documents._upload_filename(upload("../../etc/цены.md")) == "цены.md"
+
+
+def test_update_with_missing_filename_keeps_existing_document(monkeypatch):
+    deleted = []
+    monkeypatch.setattr(documents, "delete_document", lambda doc_id: deleted.append(doc_id))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(documents.update_document("цены.md", upload("")))
+    assert error.value.status_code == 400
+    assert deleted == []
+
+
+def test_save_upload_writes_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(documents, "UPLOAD_CHUNK_SIZE", 4)
+    target = tmp_path / "doc.md"
+    result = asyncio.run(documents._save_upload(upload("doc.md", b"0123456789"), target))
+    assert result["bytes"] == 10
+    assert target.read_bytes() == b"0123456789"
@@ -22,9 +22,7 @@ async def add_document(file: UploadFile = File(...)):
     
     try:
         logger.info(f"Получен файл для загрузки: {file.filename}, content_type: {file.content_type}")
-        content = await file.read()
-        logger.info(f"Прочитано байт: {len(content)}")
-        result = await rag_service.add_document(content, file.filename)
+        result = await rag_service.add_document(file, file.filename)
         logger.info(f"Документ успешно добавлен: {result}")
         return result
     except Exception as e:
@@ -32,6 +30,15 @@ async def add_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Статус задачи загрузки документа"""
+    try:
+        return await rag_service.get_ingest_job(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/{doc_id}")
 async def delete_document(doc_id: str):
     """Удаление документа"""
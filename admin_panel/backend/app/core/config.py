@@ -31,6 +31,7 @@ if not BOT_TOKEN:
 
 # RAG API
 RAG_API_URL = os.getenv("RAG_API_URL", "http://localhost:8000")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))  # Размер блока потоковой пересылки файлов
 
 # PostgreSQL
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -1,6 +1,6 @@
 import aiohttp
 from typing import Optional, Dict
-from app.core.config import RAG_API_URL
+from app.core.config import RAG_API_URL, UPLOAD_CHUNK_SIZE
 
 
 class RAGService:
@@ -16,21 +16,42 @@ class RAGService:
                     error = await response.json()
                     raise Exception(f"RAG API error: {error.get('detail', 'Unknown error')}")
     
-    async def add_document(self, file_content: bytes, filename: str) -> Dict:
-        """Добавление документа"""
+    async def add_document(self, file, filename: str) -> Dict:
+        """Добавление документа
+        
+        file - объект с асинхронным read(size) (например, UploadFile). Тело
+        пересылается в RAG API потоковым multipart без буферизации в памяти.
+        """
         import logging
+        import time
         logger = logging.getLogger(__name__)
         
+        stats = {"bytes": 0}
+        
+        async def _stream_file():
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                stats["bytes"] += len(chunk)
+                yield chunk
+        
         async with aiohttp.ClientSession() as session:
             data = aiohttp.FormData()
-            data.add_field('file', file_content, filename=filename, content_type='application/octet-stream')
+            data.add_field('file', _stream_file(), filename=filename, content_type='application/octet-stream')
             
-            logger.info(f"Отправка файла в RAG API: {filename}, размер: {len(file_content)} байт")
+            logger.info(f"Потоковая отправка файла в RAG API: {filename}")
+            started = time.monotonic()
             
             async with session.post(f"{RAG_API_URL}/documents", data=data) as response:
-                if response.status == 200:
+                # 202: документ поставлен в очередь фоновой загрузки
+                if response.status in (200, 202):
                     result = await response.json()
-                    logger.info(f"Файл успешно загружен в RAG API: {result}")
+                    elapsed = time.monotonic() - started
+                    logger.info(
+                        f"Файл успешно загружен в RAG API: {stats['bytes']} байт за {elapsed:.2f} с, {result}"
+                    )
+                    result["proxy_upload"] = {"bytes": stats["bytes"], "seconds": round(elapsed, 3)}
                     return result
                 else:
                     error_text = await response.text()
@@ -41,6 +62,16 @@ class RAGService:
                     except:
                         raise Exception(f"RAG API error: {error_text}")
     
+    async def get_ingest_job(self, job_id: str) -> Dict:
+        """Статус задачи загрузки документа"""
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{RAG_API_URL}/documents/jobs/{job_id}") as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    error = await response.json()
+                    raise Exception(f"RAG API error: {error.get('detail', 'Unknown error')}")
+    
     async def delete_document(self, doc_id: str) -> Dict:
         """Удаление документа"""
         async with aiohttp.ClientSession() as session:
@@ -29,10 +29,10 @@ function Documents() {
     formData.append('file', file)
 
     try {
-      await api.post('/documents', formData, {
+      const response = await api.post('/documents', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
       })
-      alert('Документ успешно добавлен!')
+      alert(response.data?.message || 'Документ успешно добавлен!')
       setFile(null)
       fetchDocuments()
     } catch (error) {
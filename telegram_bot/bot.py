@@ -1,4 +1,5 @@
 import asyncio
+import json
 import sys
 import aiohttp
 from pathlib import Path
@@ -7,6 +8,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from aiogram import Bot, Dispatcher, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
@@ -14,7 +16,7 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
-from config import BOT_TOKEN, RAG_API_URL
+from config import BOT_TOKEN, RAG_API_URL, STREAM_EDIT_INTERVAL, REQUEST_TIMEOUT
 from database import db
 
 
@@ -23,6 +25,9 @@ class RegistrationStates(StatesGroup):
     waiting_for_phone = State()
 
 
+# Максимальная длина текста сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
 # Инициализация бота
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(storage=MemoryStorage())
@@ -153,53 +158,116 @@ async def ask_question_prompt(message: types.Message):
     )
 
 
+async def iter_sse(response: aiohttp.ClientResponse):
+    """Разбирает поток Server-Sent Events: отдает пары (событие, данные)"""
+    event, data = "message", []
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+async def edit_answer(sent: types.Message, text: str):
+    """Обновляет отправленный ответ; ошибки редактирования не прерывают стриминг"""
+    try:
+        await bot.edit_message_text(text[:TELEGRAM_MESSAGE_LIMIT], chat_id=sent.chat.id, message_id=sent.message_id)
+    except (TelegramBadRequest, TelegramRetryAfter):
+        # "message is not modified" или превышен лимит частоты - следующее обновление догонит
+        pass
+
+
 @dp.message()
 async def handle_question(message: types.Message):
-    """Обработка вопросов пользователя"""
+    """Обработка вопросов пользователя
+    
+    Ответ запрашивается потоково (/query/stream): первое сообщение отправляется
+    с первыми фрагментами ответа и затем редактируется не чаще
+    STREAM_EDIT_INTERVAL секунд. Оставшееся из REQUEST_TIMEOUT время
+    передается API в X-Request-Timeout, чтобы оно не работало впустую.
+    """
     question = message.text.strip()
     
     # Пропускаем команды и кнопки
     if question.startswith("/") or question in ["📝 Записаться на занятие", "❓ Задать вопрос"]:
         return
     
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    
     # Отправляем индикатор печати
     await bot.send_chat_action(message.chat.id, "typing")
     
+    sent = None
+    answer = ""
+    last_edit = 0.0
+    
     try:
         # Отправляем запрос к RAG API
-        # Таймаут увеличен до 90 секунд на случай загрузки модели при первом запросе
+        # Таймаут с запасом на случай загрузки модели при первом запросе
         async with aiohttp.ClientSession() as session:
+            remaining = max(REQUEST_TIMEOUT - (loop.time() - started), 1.0)
             async with session.post(
-                f"{RAG_API_URL}/query",
+                f"{RAG_API_URL}/query/stream",
                 json={"question": question, "n_results": 3},
-                timeout=aiohttp.ClientTimeout(total=120)
+                headers={"X-Request-Timeout": f"{remaining:.1f}"},
+                timeout=aiohttp.ClientTimeout(total=remaining)
             ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    answer = data.get("answer", "К сожалению, не удалось получить ответ.")
-                    similarity_scores = data.get("similarity_scores", [])
-                    avg_similarity = data.get("avg_similarity", 0.0)
-                    
-                    # Сохраняем диалог в БД
-                    await db.save_conversation(
-                        user_id=message.from_user.id,
-                        question=question,
-                        answer=answer,
-                        similarity_scores=similarity_scores if similarity_scores else None,
-                        avg_similarity=avg_similarity
-                    )
-                    
-                    # Отправляем ответ
+                if response.status == 504:
+                    raise asyncio.TimeoutError()
+                if response.status == 429:
+                    retry_after = response.headers.get("Retry-After", "несколько")
                     await message.answer(
-                        answer,
+                        f"⏳ Сейчас много вопросов, повторите через {retry_after} с.",
                         reply_markup=get_main_keyboard()
                     )
-                else:
+                    return
+                if response.status != 200:
                     error_text = await response.text()
                     await message.answer(
                         f"❌ Ошибка при обращении к API: {response.status}\n{error_text}",
                         reply_markup=get_main_keyboard()
                     )
+                    return
+                
+                async for event, data in iter_sse(response):
+                    if event == "delta":
+                        answer += data["text"]
+                        if sent is None:
+                            sent = await message.answer(answer[:TELEGRAM_MESSAGE_LIMIT], reply_markup=get_main_keyboard())
+                            last_edit = loop.time()
+                        elif loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                            await edit_answer(sent, answer)
+                            last_edit = loop.time()
+                    
+                    elif event == "done":
+                        answer = data.get("answer") or answer or "К сожалению, не удалось получить ответ."
+                        if sent is None:
+                            sent = await message.answer(answer[:TELEGRAM_MESSAGE_LIMIT], reply_markup=get_main_keyboard())
+                        else:
+                            await edit_answer(sent, answer)
+                        
+                        similarity_scores = data.get("similarity_scores", [])
+                        
+                        # Сохраняем диалог в БД
+                        await db.save_conversation(
+                            user_id=message.from_user.id,
+                            question=question,
+                            answer=answer,
+                            similarity_scores=similarity_scores if similarity_scores else None,
+                            avg_similarity=data.get("avg_similarity", 0.0)
+                        )
+                        return
+                    
+                    elif event == "error":
+                        raise RuntimeError(data.get("detail", "ошибка генерации ответа"))
+                
+                raise RuntimeError("ответ прерван сервером")
     
     except asyncio.TimeoutError:
         await message.answer(
@@ -9,6 +9,12 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 # RAG API URL
 RAG_API_URL = os.getenv("RAG_API_URL", "http://localhost:8000")
 
+# Сколько секунд бот ждет ответ RAG API (остаток передается в заголовке X-Request-Timeout)
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 120))
+
+# Минимальный интервал (секунды) между обновлениями сообщения при потоковом ответе
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+
 # PostgreSQL
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = int(os.getenv("DB_PORT", 5432))